@@ -15,22 +15,31 @@ from app.routes.patient_routes import patient_bp
 from app.routes.staff_routes import staff_bp
 from app.routes.vitals_routes import vitals_bp
 from app.routes.lab_reports_routes import lab_reports_bp
+from app.routes.export_routes import export_bp
+from app.routes.fhir_routes import fhir_bp
+from app.utils.json_provider import OrjsonProvider
+from app.utils.http_cache import init_http_cache
+from app.utils.identity import init_identity
 
 def create_app():
     """Create and configure Flask application"""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     
     # Configuration
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # For development - set expiry in production
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes
     
     # Initialize extensions
     CORS(app, 
          origins=['http://localhost:5173', 'http://localhost:5174', 'http://127.0.0.1:5173', 'http://127.0.0.1:5174'],
-         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-         allow_headers=['Content-Type', 'Authorization', 'Access-Control-Allow-Credentials'],
+         methods=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'],
+         allow_headers=['Content-Type', 'Authorization', 'Access-Control-Allow-Credentials', 'If-None-Match',
+                        'Upload-Offset', 'Upload-Length', 'Idempotency-Key'],
          supports_credentials=True,
-         expose_headers=['Content-Type', 'Authorization'])
+         expose_headers=['Content-Type', 'Authorization', 'ETag', 'Upload-Offset', 'Upload-Length', 'Location',
+                         'Idempotent-Replayed'])
     
     # Additional CORS handling for preflight requests
     @app.before_request
@@ -44,6 +53,9 @@ def create_app():
     
     jwt = JWTManager(app)
     
+    # ETag/304 for list and detail endpoints, gzip/brotli above COMPRESS_MIN_SIZE
+    init_http_cache(app)
+    
     # JWT error handlers
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -57,6 +69,9 @@ def create_app():
     def missing_token_callback(error):
         return {'error': 'Authorization token is required'}, 401
     
+    # Token users come from a short-lived cache; stale or deactivated ones get 401
+    init_identity(jwt)
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(user_bp, url_prefix='/api/users')
@@ -64,6 +79,8 @@ def create_app():
     app.register_blueprint(staff_bp, url_prefix='/api/staff')
     app.register_blueprint(vitals_bp, url_prefix='/api/vitals')
     app.register_blueprint(lab_reports_bp, url_prefix='/api/lab-reports')
+    app.register_blueprint(export_bp, url_prefix='/api/exports')
+    app.register_blueprint(fhir_bp, url_prefix='/api/fhir')
     
     # Root endpoint
     @app.route('/')
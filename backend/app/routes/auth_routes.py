@@ -2,6 +2,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.services.auth_service import AuthService
+from app.utils.identity import get_current_user as current_token_user
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__)
@@ -140,11 +141,8 @@ def login():
 def get_current_user():
     """Get current user information"""
     try:
-        # Get user ID from JWT token
-        current_user_id = get_jwt_identity()
-        
-        # Get user from database
-        user = auth_service.get_user_by_id(current_user_id)
+        # Loaded with the token (user cache), no extra query
+        user = current_token_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -0,0 +1,121 @@
+# Export routes: background Parquet/Arrow exports of vitals and lab results
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app.services.export_service import ExportService, EXPORT_URL_TTL_SECONDS
+from app.services.vitals_history_service import parse_timestamp
+
+# Create blueprint
+export_bp = Blueprint('exports', __name__)
+
+# Initialize services
+export_service = ExportService()
+
+# Jobs queued or running in a process that has since exited can never finish
+export_service.fail_interrupted_jobs()
+
+@export_bp.route('', methods=['POST'])
+@jwt_required()
+def create_export():
+    """Queue an export of a dataset over a time range (admin only)"""
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+        
+        data = request.get_json() or {}
+        try:
+            start = parse_timestamp(data.get('start'))
+            end = parse_timestamp(data.get('end'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'start and end must be ISO 8601 timestamps'
+            }), 400
+        
+        patient_ids = data.get('patient_ids') or []
+        if not isinstance(patient_ids, list):
+            return jsonify({
+                'success': False,
+                'error': 'patient_ids must be a list'
+            }), 400
+        
+        success, message, job = export_service.create_job(
+            data.get('dataset'),
+            get_jwt_identity(),
+            file_format=data.get('format', 'parquet'),
+            start=start,
+            end=end,
+            patient_ids=patient_ids
+        )
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'export': job
+        }), 202
+        
+    except Exception as e:
+        print(f"Error in create_export: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to create export: {str(e)}'
+        }), 500
+
+@export_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_export(job_id):
+    """Status of an export job"""
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+        
+        success, message, job = export_service.get_job(job_id)
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 404 if message == 'Export not found' else 500
+        
+        return jsonify({
+            'success': True,
+            'export': job
+        }), 200
+        
+    except Exception as e:
+        print(f"Error in get_export: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get export: {str(e)}'
+        }), 500
+
+@export_bp.route('/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export(job_id):
+    """Signed URL for a completed export file"""
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+        
+        success, message, url = export_service.get_download_url(job_id)
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 404 if message == 'Export not found' else 409
+        
+        return jsonify({
+            'success': True,
+            'url': url,
+            'expires_in': EXPORT_URL_TTL_SECONDS
+        }), 200
+        
+    except Exception as e:
+        print(f"Error in download_export: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get export download: {str(e)}'
+        }), 500
@@ -0,0 +1,141 @@
+# FHIR R4 routes: bulk import and streaming export of patients, vitals and lab reports
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app.services.fhir_service import (
+    FhirService, FHIR_RESOURCE_TYPES, MAX_FHIR_EXPORT_PATIENTS, iter_bundle_resources, iter_ndjson_resources
+)
+from app.services.patient_service import UUID_PATTERN
+from app.services.vitals_history_service import parse_timestamp
+
+# Create blueprint
+fhir_bp = Blueprint('fhir', __name__)
+
+# Initialize services
+fhir_service = FhirService()
+
+NDJSON_MIMETYPES = ('application/fhir+ndjson', 'application/x-ndjson', 'application/ndjson')
+BUNDLE_MIMETYPES = ('application/fhir+json', 'application/json')
+
+@fhir_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_fhir():
+    """Import a FHIR bulk-data NDJSON file or a Bundle, streamed from the request body (admin only)"""
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+        
+        if request.mimetype in NDJSON_MIMETYPES:
+            resources = iter_ndjson_resources(request.stream)
+        elif request.mimetype in BUNDLE_MIMETYPES:
+            resources = iter_bundle_resources(request.stream)
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Content-Type must be application/fhir+ndjson or application/fhir+json'
+            }), 415
+        
+        summary = fhir_service.import_resources(resources, get_jwt_identity())
+        if summary.get('error'):
+            return jsonify({
+                'success': False,
+                **summary
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'message': 'FHIR import finished',
+            **summary
+        }), 200
+        
+    except Exception as e:
+        print(f"Error in import_fhir: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to import FHIR resources: {str(e)}'
+        }), 500
+
+@fhir_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_fhir():
+    """Stream resources as FHIR NDJSON (default) or a Bundle (admin only)
+    
+    Query: _type (comma-separated), patient (comma-separated ids), _since, _format=ndjson|bundle
+    """
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+        
+        resource_types = [t.strip() for t in request.args.get('_type', '').split(',') if t.strip()]
+        unknown = [t for t in resource_types if t not in FHIR_RESOURCE_TYPES]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"Unsupported _type: {', '.join(unknown)}"
+            }), 400
+        
+        patient_ids = [p.strip() for p in request.args.get('patient', '').split(',') if p.strip()]
+        if len(patient_ids) > MAX_FHIR_EXPORT_PATIENTS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_FHIR_EXPORT_PATIENTS} patients per export'
+            }), 400
+        if any(not UUID_PATTERN.match(p) for p in patient_ids):
+            return jsonify({
+                'success': False,
+                'error': 'patient must be a comma-separated list of patient ids'
+            }), 400
+        
+        try:
+            since = parse_timestamp(request.args.get('_since'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': '_since must be an ISO 8601 timestamp'
+            }), 400
+        
+        resources = fhir_service.iter_resources(resource_types, patient_ids, since)
+        if request.args.get('_format', 'ndjson') == 'bundle':
+            return Response(stream_with_context(fhir_service.stream_bundle(resources)),
+                            mimetype='application/fhir+json')
+        return Response(stream_with_context(fhir_service.stream_ndjson(resources)),
+                        mimetype='application/fhir+ndjson')
+        
+    except Exception as e:
+        print(f"Error in export_fhir: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export FHIR resources: {str(e)}'
+        }), 500
+
+@fhir_bp.route('/Patient/<patient_id>/$everything', methods=['GET'])
+@jwt_required()
+def patient_everything(patient_id):
+    """One patient with their vitals and lab reports as a FHIR searchset Bundle"""
+    try:
+        if not UUID_PATTERN.match(patient_id):
+            return jsonify({
+                'success': False,
+                'error': 'Patient not found'
+            }), 404
+        
+        resources = fhir_service.iter_resources(patient_ids=[patient_id])
+        first = next(resources, None)
+        if first is None:
+            return jsonify({
+                'success': False,
+                'error': 'Patient not found'
+            }), 404
+        
+        def with_first():
+            yield first
+            yield from resources
+        
+        return Response(stream_with_context(fhir_service.stream_bundle(with_first(), 'searchset')),
+                        mimetype='application/fhir+json')
+        
+    except Exception as e:
+        print(f"Error in patient_everything: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export patient: {str(e)}'
+        }), 500
@@ -1,20 +1,31 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.services.lab_reports_service import LabReportsService
+from flask import Blueprint, request, jsonify, make_response
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from app.services.lab_reports_service import LabReportsService, LAB_CSV_CHUNKED_THRESHOLD_BYTES
+from app.services.lab_results_service import LabResultsService
+from app.services.upload_service import ResumableUploadService
+from app.utils.idempotency import idempotent, idempotent_id
+from app.utils.json_provider import stream_json_list
 import pandas as pd
 import os
 from werkzeug.utils import secure_filename
 
 lab_reports_bp = Blueprint('lab_reports', __name__)
 lab_reports_service = LabReportsService()
+lab_results_service = LabResultsService()
+upload_service = ResumableUploadService(lab_reports_service)
 
 ALLOWED_EXTENSIONS = {'csv', 'pdf', 'jpg', 'jpeg', 'png'}
 
+# Page sizes for GET /list when paginating
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @lab_reports_bp.route('/create', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_lab_report():
     try:
         current_user_id = get_jwt_identity()
@@ -30,7 +41,7 @@ def create_lab_report():
                 return jsonify({'error': f'{field} is required'}), 400
 
         # Create lab report
-        result = lab_reports_service.create_lab_report(data, current_user_id)
+        result = lab_reports_service.create_lab_report(data, current_user_id, report_id=idempotent_id())
         
         if result['success']:
             return jsonify({
@@ -47,20 +58,113 @@ def create_lab_report():
 @lab_reports_bp.route('/list', methods=['GET'])
 @jwt_required()
 def get_lab_reports():
+    """List lab reports.
+
+    Paginated when limit or cursor is given: ?limit=50&cursor=<next_cursor>
+    with optional status, priority, test_type (comma-separated), date_from,
+    date_to and view=summary|full (summary by default when paginating).
+    """
     try:
         patient_id = request.args.get('patient_id')
+        filters = {
+            field: request.args.get(field)
+            for field in ('status', 'priority', 'test_type', 'date_from', 'date_to')
+        }
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
+        paginated = bool(limit or cursor)
+        if paginated:
+            limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+        view = request.args.get('view', 'summary' if paginated else 'full')
+        if view not in ('summary', 'full'):
+            return jsonify({'error': 'view must be summary or full'}), 400
         
-        result = lab_reports_service.get_lab_reports(patient_id)
+        result = lab_reports_service.get_lab_reports(
+            patient_id, filters=filters, cursor=cursor, limit=limit if paginated else None, view=view
+        )
         
+        if result['success']:
+            extra = {'next_cursor': result['next_cursor'], 'has_more': bool(result['next_cursor'])} if paginated else None
+            return stream_json_list('reports', result['reports'], extra=extra)
+        else:
+            return jsonify({'error': result['error']}), 400
+
+    except Exception as e:
+        print(f"Error in get_lab_reports: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/results', methods=['GET'])
+@jwt_required()
+def query_lab_results():
+    """Query normalised results of one parameter, e.g. ?parameter=potassium&min_value=5.5&start=2026-01-01"""
+    try:
+        parameter = request.args.get('parameter', '').strip()
+        if not parameter:
+            return jsonify({'error': 'parameter is required'}), 400
+
+        result = lab_results_service.query_results(
+            parameter,
+            patient_id=request.args.get('patient_id'),
+            min_value=request.args.get('min_value', type=float),
+            max_value=request.args.get('max_value', type=float),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', 1000, type=int)
+        )
+
+        if result['success']:
+            return stream_json_list('results', result['results'])
+        else:
+            return jsonify({'error': result['error']}), 400
+
+    except Exception as e:
+        print(f"Error in query_lab_results: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/patient/<patient_id>/results/<parameter>', methods=['GET'])
+@jwt_required()
+def get_parameter_trend(patient_id, parameter):
+    """Time-ordered results of one parameter for a patient"""
+    try:
+        result = lab_results_service.get_parameter_trend(
+            patient_id,
+            parameter,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', 1000, type=int)
+        )
+
         if result['success']:
             return jsonify({
-                'reports': result['reports']
+                'parameter': parameter,
+                'results': result['results']
             }), 200
         else:
             return jsonify({'error': result['error']}), 400
 
     except Exception as e:
-        print(f"Error in get_lab_reports: {str(e)}")
+        print(f"Error in get_parameter_trend: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/patient/<patient_id>/trends', methods=['GET'])
+@jwt_required()
+def get_patient_lab_trends(patient_id):
+    """Per-parameter lab series with flags and deltas, e.g. ?parameters=creatinine,potassium"""
+    try:
+        parameters = [p for p in request.args.get('parameters', '').split(',') if p.strip()]
+        
+        result = lab_results_service.get_patient_trends(patient_id, parameters or None)
+        
+        if result['success']:
+            return jsonify({
+                'patient_id': patient_id,
+                'series': result['series']
+            }), 200
+        else:
+            return jsonify({'error': result['error']}), 400
+
+    except Exception as e:
+        print(f"Error in get_patient_lab_trends: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @lab_reports_bp.route('/<report_id>', methods=['GET'])
@@ -139,7 +243,13 @@ def upload_lab_report_file():
         
         # Process CSV files - patient_id must be in CSV
         if file.filename.lower().endswith('.csv'):
-            result = lab_reports_service.process_csv_upload(file, current_user)
+            # Large exports (or resumes of a failed import) are ingested in chunks
+            import_id = request.form.get('import_id')
+            chunked = (request.form.get('chunked', '').lower() in ('1', 'true', 'yes')
+                       or (request.content_length or 0) > LAB_CSV_CHUNKED_THRESHOLD_BYTES)
+            result = lab_reports_service.process_csv_upload(
+                file, current_user, chunked=chunked, import_id=import_id
+            )
         else:
             # For PDF/image files, patient_id is required as form data
             if not patient_id:
@@ -152,8 +262,146 @@ def upload_lab_report_file():
                 'data': result.get('data', {})
             }), 201
         else:
-            return jsonify({'error': result['error']}), 400
+            return jsonify({
+                'error': result['error'],
+                'data': result.get('data', {})
+            }), 400
 
     except Exception as e:
         print(f"Error in upload_lab_report_file: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/imports/<import_id>', methods=['GET'])
+@jwt_required()
+def get_csv_import(import_id):
+    """Progress of a chunked CSV import"""
+    try:
+        result = lab_reports_service.get_csv_import(import_id)
+        
+        if result['success']:
+            return jsonify({
+                'import': result['import']
+            }), 200
+        else:
+            return jsonify({'error': result['error']}), 404
+
+    except Exception as e:
+        print(f"Error in get_csv_import: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _upload_headers(upload):
+    return {
+        'Upload-Offset': str(upload['offset']),
+        'Upload-Length': str(upload['length']),
+        'Cache-Control': 'no-store'
+    }
+
+@lab_reports_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_resumable_upload():
+    """Start a resumable upload; the body is sent afterwards with PATCH /uploads/<id>"""
+    try:
+        current_user = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        
+        patient_id = data.get('patient_id')
+        filename = data.get('filename', '')
+        if not patient_id:
+            return jsonify({'error': 'patient_id is required'}), 400
+        if not filename or not allowed_file(filename):
+            return jsonify({'error': 'File type not allowed. Supported: CSV, PDF, JPG, PNG'}), 400
+        if filename.lower().endswith('.csv'):
+            return jsonify({'error': 'CSV files are imported with POST /upload'}), 400
+        
+        try:
+            length = int(request.headers.get('Upload-Length', data.get('length', 0)))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Upload-Length must be a positive integer'}), 400
+        
+        result = upload_service.create_session(
+            patient_id, filename, data.get('content_type'), length, current_user
+        )
+        
+        if result['success']:
+            upload = result['upload']
+            response = jsonify({'upload': upload})
+            response.headers.update(_upload_headers(upload))
+            response.headers['Location'] = f"{request.base_url.rstrip('/')}/{upload['id']}"
+            return response, 201
+        else:
+            return jsonify({'error': result['error']}), 400
+
+    except Exception as e:
+        print(f"Error in create_resumable_upload: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/uploads/<upload_id>', methods=['GET', 'HEAD'])
+@jwt_required()
+def get_resumable_upload(upload_id):
+    """Current offset of a resumable upload, used by clients to resume after a dropped connection"""
+    try:
+        result = upload_service.get_session(upload_id, get_jwt_identity(), get_jwt().get('role') == 'admin')
+        
+        if result['success']:
+            upload = result['upload']
+            response = jsonify({'upload': upload})
+            response.headers.update(_upload_headers(upload))
+            return response, 200
+        else:
+            return jsonify({'error': result['error']}), 404
+
+    except Exception as e:
+        print(f"Error in get_resumable_upload: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@jwt_required()
+def append_resumable_upload(upload_id):
+    """Append the raw request body at Upload-Offset; the final chunk creates the lab report"""
+    try:
+        current_user = get_jwt_identity()
+        
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+        
+        result = upload_service.append_chunk(upload_id, offset, request.stream, current_user,
+                                             get_jwt().get('role') == 'admin')
+        
+        if result['success'] and result.get('complete'):
+            response = jsonify({
+                'message': 'File processed successfully',
+                'data': result.get('data', {})
+            })
+            response.headers.update(_upload_headers(result['upload']))
+            return response, 201
+        elif result['success']:
+            response = make_response('', 204)
+            response.headers.update(_upload_headers(result['upload']))
+            return response
+        else:
+            response = jsonify({'error': result['error']})
+            if result.get('upload'):
+                response.headers.update(_upload_headers(result['upload']))
+            return response, result.get('status', 400)
+
+    except Exception as e:
+        print(f"Error in append_resumable_upload: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@lab_reports_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def delete_resumable_upload(upload_id):
+    """Abandon a resumable upload and discard the staged bytes"""
+    try:
+        result = upload_service.delete_session(upload_id, get_jwt_identity(), get_jwt().get('role') == 'admin')
+        
+        if result['success']:
+            return '', 204
+        else:
+            return jsonify({'error': result['error']}), 404
+
+    except Exception as e:
+        print(f"Error in delete_resumable_upload: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -1,8 +1,11 @@
 # Patient routes for patient management operations
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timezone
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.services.patient_service import PatientService
 from app.services.ai_insight_service import AIInsightsService
+from app.services.patient_record_export_service import PatientRecordExportService
+from app.utils.json_provider import stream_json_list
 
 # Create blueprint
 patient_bp = Blueprint('patients', __name__)
@@ -10,6 +13,11 @@ patient_bp = Blueprint('patients', __name__)
 # Initialize service
 patient_service = PatientService()
 ai_insights_service = AIInsightsService()
+record_export_service = PatientRecordExportService(
+    patient_service=patient_service,
+    vitals_service=ai_insights_service.vitals_service,
+    ai_insights_service=ai_insights_service
+)
 
 @patient_bp.route('/register', methods=['POST'])
 @jwt_required()
@@ -59,16 +67,17 @@ def get_all_patients():
         success, message, patients = patient_service.get_all_patients()
         
         if success:
-            patients_data = []
-            if patients:
-                patients_data = [patient.to_dict() for patient in patients]
+            patients = patients or []
             
-            return jsonify({
-                'success': True,
-                'message': message,
-                'patients': patients_data,
-                'count': len(patients_data)
-            }), 200
+            return stream_json_list(
+                'patients',
+                (patient.to_dict() for patient in patients),
+                extra={
+                    'success': True,
+                    'message': message,
+                    'count': len(patients)
+                }
+            )
         else:
             return jsonify({
                 'success': False,
@@ -107,6 +116,51 @@ def get_patient_by_id(patient_id):
             'error': f'Failed to get patient: {str(e)}'
         }), 500
 
+@patient_bp.route('/<patient_id>/export', methods=['GET'])
+@jwt_required()
+def export_patient_record(patient_id):
+    """Stream everything held on a patient as a ZIP or NDJSON bundle (admin only)"""
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+        
+        bundle_format = request.args.get('format', 'zip')
+        if bundle_format not in ('zip', 'ndjson'):
+            return jsonify({
+                'success': False,
+                'error': 'format must be zip or ndjson'
+            }), 400
+        include_documents = request.args.get('documents', 'true').lower() not in ('0', 'false', 'no')
+        
+        success, message, patient = patient_service.get_patient_by_id(patient_id)
+        if not success or not patient:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 404
+        
+        current_app.logger.info(f"Patient record export of {patient_id} ({bundle_format}) by {get_jwt_identity()}")
+        
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        if bundle_format == 'zip':
+            chunks = record_export_service.stream_zip(patient, include_documents)
+            mimetype = 'application/zip'
+        else:
+            chunks = record_export_service.stream_ndjson(patient, include_documents)
+            mimetype = 'application/x-ndjson'
+        
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="patient-{patient_id}-{stamp}.{bundle_format}"'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+        
+    except Exception as e:
+        print(f"Error in export_patient_record: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export patient record: {str(e)}'
+        }), 500
+
 @patient_bp.route('/mrn/<mrn>', methods=['GET'])
 @jwt_required()
 def get_patient_by_mrn(mrn):
@@ -263,10 +317,17 @@ def get_patient_ai_insights(patient_id):
 @patient_bp.route('/<patient_id>/insights/refresh', methods=['POST'])
 @jwt_required()
 def refresh_patient_ai_insights(patient_id):
-    """Trigger OCR + AI analysis for the latest patient PDF"""
+    """Trigger OCR + AI analysis for the latest patient PDF (or every PDF with ?mode=all)"""
     try:
         current_user_id = get_jwt_identity()
-        success, message, insight = ai_insights_service.generate_patient_insight(patient_id, current_user_id)
+        mode = request.args.get('mode', 'latest')
+        if mode not in ('latest', 'all'):
+            return jsonify({
+                'success': False,
+                'error': "mode must be 'latest' or 'all'"
+            }), 400
+
+        success, message, insight = ai_insights_service.generate_patient_insight(patient_id, current_user_id, mode)
         status_code = 201 if success else 400
         return jsonify({
             'success': success,
@@ -279,6 +340,54 @@ def refresh_patient_ai_insights(patient_id):
             'error': f'Failed to refresh AI insight: {str(e)}'
         }), 500
 
+@patient_bp.route('/<patient_id>/documents', methods=['POST'])
+@jwt_required()
+def register_patient_document(patient_id):
+    """Queue text extraction for a PDF the client just uploaded to the documents bucket"""
+    try:
+        data = request.get_json() or {}
+        if not data.get('path'):
+            return jsonify({
+                'success': False,
+                'error': 'path is required'
+            }), 400
+
+        success, message, document = ai_insights_service.queue_document_extraction(
+            patient_id, data['path'], data.get('size')
+        )
+        status_code = 202 if success else 400
+        return jsonify({
+            'success': success,
+            'message': message,
+            'document': document
+        }), status_code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to queue document extraction: {str(e)}'
+        }), 500
+
+@patient_bp.route('/documents/reconcile', methods=['POST'])
+@jwt_required()
+def reconcile_patient_documents():
+    """Re-sync the patient document index with the storage bucket (admin only)"""
+    try:
+        if get_jwt().get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
+
+        success, message, stats = ai_insights_service.reconcile_document_index()
+        status_code = 200 if success else 500
+        return jsonify({
+            'success': success,
+            'message': message,
+            'stats': stats
+        }), status_code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to reconcile documents: {str(e)}'
+        }), 500
+
 @patient_bp.route('/insights/summary', methods=['GET'])
 @jwt_required()
 def list_latest_ai_insights():
@@ -310,6 +419,7 @@ def patient_health():
             'POST /api/patients/register',
             'GET /api/patients/',
             'GET /api/patients/<id>',
+            'GET /api/patients/<id>/export',
             'GET /api/patients/mrn/<mrn>',
             'PUT /api/patients/<id>',
             'GET /api/patients/search?q=<search_term>',
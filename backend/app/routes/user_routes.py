@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.services.auth_service import AuthService
 from app.utils.database import get_supabase_client
+from app.utils.identity import get_current_user
 
 # Create blueprint
 user_bp = Blueprint('users', __name__)
@@ -56,8 +57,8 @@ def get_user(user_id):
         if user_id != current_user_id and user_role != 'admin':
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Get user from database
-        user = auth_service.get_user_by_id(user_id)
+        # Own profile was loaded with the token; others come from the user cache
+        user = get_current_user() if user_id == current_user_id else auth_service.get_user_by_id(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -102,14 +103,14 @@ def update_user(user_id):
         if not update_data:
             return jsonify({'error': 'No valid fields to update'}), 400
         
-        # Update user in database
-        result = supabase.table('users').update(update_data).eq('id', user_id).execute()
+        # Update user in database (drops the cached copy)
+        updated = auth_service.update_user(user_id, update_data)
         
-        if result.data and len(result.data) > 0:
+        if updated:
             return jsonify({
                 'success': True,
                 'message': 'User updated successfully',
-                'user': result.data[0]
+                'user': updated
             }), 200
         else:
             return jsonify({'error': 'User not found or update failed'}), 404
@@ -133,10 +134,8 @@ def delete_user(user_id):
         if user_role != 'admin':
             return jsonify({'error': 'Unauthorized. Admin access required.'}), 403
         
-        # Soft delete by setting is_active to False
-        result = supabase.table('users').update({'is_active': False}).eq('id', user_id).execute()
-        
-        if result.data and len(result.data) > 0:
+        # Soft delete by setting is_active to False; the user's tokens stop working
+        if auth_service.deactivate_user(user_id):
             return jsonify({
                 'success': True,
                 'message': 'User deactivated successfully'
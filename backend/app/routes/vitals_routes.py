@@ -3,6 +3,12 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.vitals_service import VitalsService
 from app.services.patient_service import PatientService
+from app.services.early_warning_service import EarlyWarningService
+from app.services.monitor_stream_service import MonitorStreamService, iter_ndjson_lines
+from app.services.vitals_anomaly_service import VitalsAnomalyService
+from app.services.vitals_history_service import VitalsHistoryService, parse_timestamp, DEFAULT_HISTORY_POINTS
+from app.utils.idempotency import idempotent, idempotent_id
+from app.utils.json_provider import stream_json_list
 
 # Create blueprint
 vitals_bp = Blueprint('vitals', __name__)
@@ -10,30 +16,37 @@ vitals_bp = Blueprint('vitals', __name__)
 # Initialize services
 vitals_service = VitalsService()
 patient_service = PatientService()
+early_warning_service = EarlyWarningService()
+monitor_stream_service = MonitorStreamService()
+vitals_history_service = VitalsHistoryService()
+vitals_anomaly_service = VitalsAnomalyService()
+
+# Largest page of the vitals list endpoints
+MAX_VITALS_PAGE_SIZE = 500
+
+def _vitals_filters():
+    return {
+        'since': request.args.get('since'),
+        'until': request.args.get('until')
+    }
 
 @vitals_bp.route('/upload', methods=['POST'])
 @jwt_required()
+@idempotent
 def upload_vitals():
     """Upload vital signs for a patient"""
     try:
-        print("=== DEBUG: Starting upload_vitals ===")
-        
         # Get JSON data
         data = request.get_json()
-        print(f"=== DEBUG: Received data: {data}")
         
         if not data:
-            print("=== DEBUG: No data provided")
             return jsonify({'error': 'No data provided'}), 400
         
         # Get current user ID from JWT token
         current_user_id = get_jwt_identity()
-        print(f"=== DEBUG: Current user ID: {current_user_id}")
         
         # Upload vitals
-        print("=== DEBUG: Calling vitals_service.create_vital_upload")
-        success, message, vital_id = vitals_service.create_vital_upload(data, current_user_id)
-        print(f"=== DEBUG: create_vital_upload returned: success={success}, message={message}, vital_id={vital_id}")
+        success, message, vital_id = vitals_service.create_vital_upload(data, current_user_id, vital_id=idempotent_id())
         
         if success:
             return jsonify({
@@ -42,35 +55,125 @@ def upload_vitals():
                 'vital_id': vital_id
             }), 201
         else:
-            print(f"=== DEBUG: Upload failed: {message}")
             return jsonify({
                 'success': False,
                 'error': message
             }), 400
             
     except Exception as e:
-        print(f"=== DEBUG: Exception in upload_vitals: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error in upload_vitals: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Upload failed: {str(e)}'
         }), 500
 
+@vitals_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def upload_vitals_batch():
+    """Upload vital signs for many patients at once (e.g. a ward round)"""
+    try:
+        data = request.get_json()
+        records = data.get('vitals') if isinstance(data, dict) else data
+        
+        if not records or not isinstance(records, list):
+            return jsonify({
+                'success': False,
+                'error': 'Provide a non-empty list of vital records in "vitals"'
+            }), 400
+        
+        current_user_id = get_jwt_identity()
+        success, message, results = vitals_service.create_vital_uploads(records, current_user_id)
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 400
+        
+        created = sum(1 for result in results if result['success'])
+        if created == len(results):
+            status_code = 201
+        elif created:
+            status_code = 207  # some records failed, see results
+        else:
+            status_code = 400
+        
+        return jsonify({
+            'success': created > 0,
+            'message': message,
+            'created': created,
+            'failed': len(results) - created,
+            'results': results
+        }), status_code
+            
+    except Exception as e:
+        print(f"Error in upload_vitals_batch: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Upload failed: {str(e)}'
+        }), 500
+
+@vitals_bp.route('/stream', methods=['POST'])
+@jwt_required()
+def ingest_monitor_stream():
+    """Ingest bedside monitor readings sent as NDJSON (one reading per line, chunked upload welcome)"""
+    try:
+        # Read straight off the socket; while the sample buffer is full we stop
+        # reading, which pushes back on the sender
+        result = monitor_stream_service.ingest(iter_ndjson_lines(request.stream))
+        
+        if result['backpressure']:
+            response = jsonify({
+                'success': False,
+                'error': 'Ingest buffer is full, resend the remaining readings later',
+                **result
+            })
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        return jsonify({
+            'success': True,
+            **result
+        }), 200
+            
+    except Exception as e:
+        print(f"Error in ingest_monitor_stream: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Stream ingest failed: {str(e)}'
+        }), 500
+
+@vitals_bp.route('/stream/stats', methods=['GET'])
+@jwt_required()
+def get_monitor_stream_stats():
+    """Buffer depth and write counters of the monitor ingest pipeline on this node"""
+    return jsonify({
+        'success': True,
+        'stats': monitor_stream_service.writer.snapshot()
+    }), 200
+
 @vitals_bp.route('/patient/<patient_id>', methods=['GET'])
 @jwt_required()
 def get_patient_vitals(patient_id):
-    """Get vital signs for a specific patient"""
+    """Get vital signs for a specific patient (?limit=&cursor=&since=&until=)"""
     try:
-        limit = request.args.get('limit', 10, type=int)
+        limit = max(1, min(request.args.get('limit', 10, type=int), MAX_VITALS_PAGE_SIZE))
         
-        success, message, vitals = vitals_service.get_patient_vitals(patient_id, limit)
+        success, message, page = vitals_service.get_patient_vitals(
+            patient_id, limit, cursor=request.args.get('cursor'), filters=_vitals_filters()
+        )
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 400
         
-        return jsonify({
+        return stream_json_list('vitals', page['vitals'], extra={
             'success': True,
             'message': message,
-            'vitals': vitals or []
-        }), 200
+            'next_cursor': page['next_cursor'],
+            'has_more': bool(page['next_cursor'])
+        })
             
     except Exception as e:
         print(f"Error in get_patient_vitals: {str(e)}")
@@ -80,31 +183,109 @@ def get_patient_vitals(patient_id):
             'vitals': []
         }), 200
 
-@vitals_bp.route('/recent', methods=['GET'])
+@vitals_bp.route('/patient/<patient_id>/history', methods=['GET'])
 @jwt_required()
-def get_recent_vitals():
-    """Get recent vital signs across all patients"""
+def get_patient_vitals_history(patient_id):
+    """Downsampled vitals trend (min/max/mean per bucket) for a time window"""
+    try:
+        try:
+            start = parse_timestamp(request.args.get('start'))
+            end = parse_timestamp(request.args.get('end'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'start and end must be ISO 8601 timestamps'
+            }), 400
+        
+        success, message, history = vitals_history_service.get_history(
+            patient_id,
+            start=start,
+            end=end,
+            resolution=request.args.get('resolution') or None,
+            max_points=request.args.get('max_points', DEFAULT_HISTORY_POINTS, type=int)
+        )
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            **history
+        }), 200
+            
+    except Exception as e:
+        print(f"Error in get_patient_vitals_history: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get vitals history: {str(e)}'
+        }), 500
+
+@vitals_bp.route('/latest', methods=['GET', 'POST'])
+@jwt_required()
+def get_latest_vitals():
+    """Newest vitals for many patients in one call (?patient_ids=a,b,c or JSON {"patient_ids": [...]})"""
     try:
-        print("=== DEBUG: Starting get_recent_vitals route ===")
-        limit = request.args.get('limit', 20, type=int)
-        print(f"=== DEBUG: Limit requested: {limit} ===")
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            patient_ids = data.get('patient_ids') or []
+        else:
+            patient_ids = [pid for pid in request.args.get('patient_ids', '').split(',') if pid]
         
-        success, message, vitals = vitals_service.get_recent_vitals(limit)
-        print(f"=== DEBUG: Service returned: success={success}, message={message}, vitals_count={len(vitals or [])} ===")
+        if not patient_ids or not isinstance(patient_ids, list):
+            return jsonify({
+                'success': False,
+                'error': 'Provide patient_ids'
+            }), 400
         
-        if vitals:
-            print(f"=== DEBUG: First vital example: {vitals[0] if vitals else 'None'} ===")
+        success, message, latest = vitals_service.get_latest_vitals(patient_ids)
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 400
         
         return jsonify({
             'success': True,
             'message': message,
-            'vitals': vitals or []
+            'vitals': latest
         }), 200
             
     except Exception as e:
-        print(f"=== DEBUG: Exception in get_recent_vitals route: {str(e)} ===")
-        import traceback
-        traceback.print_exc()
+        print(f"Error in get_latest_vitals: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get latest vitals: {str(e)}'
+        }), 500
+
+@vitals_bp.route('/recent', methods=['GET'])
+@jwt_required()
+def get_recent_vitals():
+    """Get recent vital signs across all patients (?limit=&cursor=&since=&until=&patient_ids=a,b)"""
+    try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), MAX_VITALS_PAGE_SIZE))
+        patient_ids = [pid for pid in request.args.get('patient_ids', '').split(',') if pid]
+        
+        success, message, page = vitals_service.get_recent_vitals(
+            limit, cursor=request.args.get('cursor'), filters=_vitals_filters(), patient_ids=patient_ids or None
+        )
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 400
+        
+        return stream_json_list('vitals', page['vitals'], extra={
+            'success': True,
+            'message': message,
+            'next_cursor': page['next_cursor'],
+            'has_more': bool(page['next_cursor'])
+        })
+            
+    except Exception as e:
+        print(f"Error in get_recent_vitals: {str(e)}")
         return jsonify({
             'success': True,
             'message': 'No vitals found (vitals table may not exist yet)',
@@ -188,6 +369,90 @@ def get_all_patients():
             'error': f'Failed to get patients: {str(e)}'
         }), 500
 
+@vitals_bp.route('/early-warning/ward', methods=['GET'])
+@jwt_required()
+def get_ward_early_warning():
+    """Latest NEWS2 score per patient, highest risk first"""
+    try:
+        since = request.args.get('since')
+        patient_ids = [pid for pid in request.args.get('patient_ids', '').split(',') if pid]
+        
+        success, message, scores = early_warning_service.get_ward_scores(since, patient_ids or None)
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 500
+        
+        return stream_json_list('patients', scores, extra={
+            'success': True,
+            'message': message,
+            'high_risk': sum(1 for entry in scores if entry['risk'] == 'high')
+        })
+            
+    except Exception as e:
+        print(f"Error in get_ward_early_warning: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to compute early warning scores: {str(e)}'
+        }), 500
+
+@vitals_bp.route('/early-warning/patient/<patient_id>', methods=['GET'])
+@jwt_required()
+def get_patient_early_warning(patient_id):
+    """NEWS2 score series for one patient"""
+    try:
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        
+        success, message, scores = early_warning_service.get_patient_scores(patient_id, limit)
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'scores': scores
+        }), 200
+            
+    except Exception as e:
+        print(f"Error in get_patient_early_warning: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to compute early warning scores: {str(e)}'
+        }), 500
+
+@vitals_bp.route('/alerts', methods=['GET'])
+@jwt_required()
+def get_vital_alerts():
+    """Readings that deviated from the patient's own baseline, newest first"""
+    try:
+        patient_id = request.args.get('patient_id')
+        since = request.args.get('since')
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        
+        success, message, alerts = vitals_anomaly_service.get_alerts(patient_id, since, limit)
+        if not success:
+            return jsonify({
+                'success': False,
+                'error': message
+            }), 500
+        
+        extra = {'success': True, 'message': message}
+        if patient_id:
+            # Baseline as learned by this worker (empty until it has seen readings)
+            extra['baseline'] = vitals_anomaly_service.baselines.baseline(patient_id)
+        return stream_json_list('alerts', alerts, extra=extra)
+            
+    except Exception as e:
+        print(f"Error in get_vital_alerts: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get vital alerts: {str(e)}'
+        }), 500
+
 # Health check for vitals routes
 @vitals_bp.route('/health', methods=['GET'])
 def vitals_health():
@@ -197,9 +462,16 @@ def vitals_health():
         'service': 'vitals',
         'endpoints': [
             'POST /api/vitals/upload',
+            'POST /api/vitals/batch',
+            'POST /api/vitals/stream',
             'GET /api/vitals/patient/<patient_id>',
+            'GET /api/vitals/patient/<patient_id>/history',
             'GET /api/vitals/recent',
-            'GET /api/vitals/patients'
+            'GET|POST /api/vitals/latest',
+            'GET /api/vitals/patients',
+            'GET /api/vitals/early-warning/ward',
+            'GET /api/vitals/early-warning/patient/<patient_id>',
+            'GET /api/vitals/alerts'
         ]
     }), 200
 
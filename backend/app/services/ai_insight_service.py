@@ -1,17 +1,16 @@
-import io
 import json
 import logging
 import os
 import re
 from collections import Counter
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-import fitz  # PyMuPDF
-import pytesseract
 import requests
-from PIL import Image
 
+from app.services.document_extraction_service import DocumentExtractionService
+from app.services.document_index_service import DocumentIndexService
+from app.services.vitals_service import VitalsService
 from app.utils.database import get_supabase_client
 
 logger = logging.getLogger(__name__)
@@ -43,6 +42,82 @@ STOPWORDS = {
 
 MAX_MODEL_INPUT_CHARS = 4000
 
+# Objects per storage list call when walking a patient's folder
+STORAGE_LIST_PAGE_SIZE = 100
+
+# Multi-document insights: weight of the worst document's risk against the
+# average document risk, and how many factors/terms/recommendations to report
+MULTI_DOCUMENT_MAX_RISK_WEIGHT = 0.6
+MULTI_DOCUMENT_TOP_ITEMS = 6
+
+
+def empty_document_summary(patient_id: str) -> Dict[str, Any]:
+    return {
+        'patient_id': patient_id,
+        'document_count': 0,
+        'risk_sum': 0,
+        'risk_max': 0,
+        'confidence_sum': 0.0,
+        'factor_counts': {},
+        'term_counts': {},
+        'recommendation_counts': {},
+        'latest_document_path': None,
+        'latest_document_at': None,
+        'latest_summary': None
+    }
+
+
+def merge_document_analyses(summary: Dict[str, Any], analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold per-document analyses into a patient summary of running totals and counts.
+
+    Merging is additive, so new documents are folded into the stored summary
+    without revisiting the documents already counted.
+    """
+    for analysis in analyses:
+        risk = int(analysis.get('risk_score') or 0)
+        summary['document_count'] += 1
+        summary['risk_sum'] += risk
+        summary['risk_max'] = max(summary['risk_max'], risk)
+        summary['confidence_sum'] += float(analysis.get('confidence_score') or 0)
+
+        for field, counts_key in (('risk_factors', 'factor_counts'),
+                                  ('key_terms', 'term_counts'),
+                                  ('recommendations', 'recommendation_counts')):
+            counts = summary[counts_key]
+            for item in set(analysis.get(field) or []):
+                counts[item] = counts.get(item, 0) + 1
+
+        document_at = analysis.get('document_created_at') or ''
+        if document_at >= (summary['latest_document_at'] or ''):
+            summary['latest_document_at'] = document_at or summary['latest_document_at']
+            summary['latest_document_path'] = analysis.get('storage_path')
+            summary['latest_summary'] = analysis.get('ai_summary')
+    return summary
+
+
+def _top_items(counts: Dict[str, int], limit: int = MULTI_DOCUMENT_TOP_ITEMS) -> List[str]:
+    return [item for item, _ in sorted(counts.items(), key=lambda pair: (-pair[1], pair[0]))[:limit]]
+
+
+def summarize_documents(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Patient-level analysis (same keys as a single-document analysis) from a merged summary."""
+    count = summary['document_count']
+    mean_risk = summary['risk_sum'] / count
+    risk_score = MULTI_DOCUMENT_MAX_RISK_WEIGHT * summary['risk_max'] + (1 - MULTI_DOCUMENT_MAX_RISK_WEIGHT) * mean_risk
+    # More corroborating documents -> somewhat more confidence
+    confidence = min(0.95, summary['confidence_sum'] / count + min(0.1, 0.01 * (count - 1)))
+    latest = summary.get('latest_summary') or 'No structured summary available from document.'
+
+    return {
+        'ai_summary': f'{latest} (Merged across {count} document{"s" if count != 1 else ""}.)',
+        'risk_score': int(round(risk_score)),
+        'risk_factors': _top_items(summary['factor_counts']),
+        'recommendations': _top_items(summary['recommendation_counts']),
+        'key_terms': _top_items(summary['term_counts'], 5),
+        'confidence_score': round(confidence, 2),
+        'model_version': 'ocr-v1-multi'
+    }
+
 
 class AIInsightsService:
     """Service that converts nurse-uploaded PDFs into AI insights stored in ai_insights table."""
@@ -53,10 +128,9 @@ class AIInsightsService:
         self.patient_path_template = os.getenv('SUPABASE_PDF_PATH_TEMPLATE', '{patient_id}')
         self.hf_api_url = os.getenv('HF_INFERENCE_URL', 'https://api-inference.huggingface.co/models/google/flan-t5-small')
         self.hf_api_token = os.getenv('HF_API_TOKEN')
-        self.ocr_language = os.getenv('OCR_LANGUAGE', 'eng')
-        tesseract_cmd = os.getenv('TESSERACT_CMD')
-        if tesseract_cmd:
-            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        self.extraction_service = DocumentExtractionService()
+        self.document_index = DocumentIndexService()
+        self.vitals_service = VitalsService()
 
     # ------------------------------------------------------------------
     # Public API
@@ -64,18 +138,31 @@ class AIInsightsService:
     def generate_patient_insight(
         self,
         patient_id: str,
-        created_by: Optional[str] = None
+        created_by: Optional[str] = None,
+        mode: str = 'latest'
     ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
-        """Pull latest PDF for patient, run OCR/LLM analysis, store and return insight."""
+        """Analyse the latest patient PDF (text pre-extracted on upload), store and return insight.
+
+        mode='all' merges every document of the patient instead; see
+        generate_multi_document_insight.
+        """
+        if mode == 'all':
+            return self.generate_multi_document_insight(patient_id, created_by)
+
         document = self._get_latest_patient_document(patient_id)
         if not document:
             return False, 'No PDF found for this patient in storage bucket', None
 
-        pdf_bytes = self._download_document(document['path'])
-        if not pdf_bytes:
-            return False, 'Unable to download PDF from Supabase storage', None
+        extraction = self.extraction_service.get_or_extract(self.bucket_name, document['path'], patient_id)
+        if not extraction:
+            return False, 'Unable to read the PDF text extraction', None
+        if extraction.get('status') == 'failed':
+            return False, f"Text extraction failed: {extraction.get('error') or 'unknown error'}", None
+        if extraction.get('status') in ('pending', 'processing'):
+            return False, 'The PDF is still being processed, try again shortly', None
 
-        extracted_text, extraction_mode = self._extract_text_from_pdf(pdf_bytes)
+        extracted_text = extraction.get('text') or ''
+        extraction_mode = extraction.get('extraction_mode')
         if not extracted_text.strip():
             return False, 'OCR engine did not detect any readable text inside PDF', None
 
@@ -83,6 +170,140 @@ class AIInsightsService:
         analysis = self._analyze_text(extracted_text, latest_vitals)
         analysis['model_version'] = analysis.get('model_version') or 'ocr-v1'
 
+        success, message, saved_row = self._save_insight(patient_id, analysis, created_by)
+        if success:
+            saved_row['sourceDocument'] = {
+                'storagePath': document['path'],
+                'fileName': document['name'],
+                'extractionMode': extraction_mode,
+                'pageCount': extraction.get('page_count'),
+                'extractedAt': extraction.get('extracted_at') or datetime.now(timezone.utc).isoformat()
+            }
+            saved_row['latestVitals'] = latest_vitals
+            saved_row['sourceExcerpt'] = analysis.get('source_excerpt', '')
+        return success, message, saved_row
+
+    def generate_multi_document_insight(
+        self,
+        patient_id: str,
+        created_by: Optional[str] = None
+    ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """Insight merged across all of a patient's documents.
+
+        Each document is extracted and analysed once (document_analyses); the
+        patient-level totals (patient_document_insights) only absorb documents
+        that arrived since the last refresh.
+        """
+        documents = self._list_patient_documents(patient_id)
+        if not documents:
+            return False, 'No PDF found for this patient in storage bucket', None
+
+        try:
+            analysed = self.supabase.table('document_analyses') \
+                .select('storage_path') \
+                .eq('patient_id', patient_id) \
+                .eq('bucket', self.bucket_name) \
+                .execute()
+            analysed_paths = {row['storage_path'] for row in analysed.data or []}
+
+            stored = self.supabase.table('patient_document_insights') \
+                .select('*') \
+                .eq('patient_id', patient_id) \
+                .limit(1) \
+                .execute()
+            summary = stored.data[0] if stored.data else None
+        except Exception as exc:
+            logger.exception('Failed to load document analyses: %s', exc)
+            return False, f'Failed to load document analyses: {exc}', None
+
+        new_documents = [document for document in documents if document['path'] not in analysed_paths]
+        new_analyses = self._analyze_documents(patient_id, new_documents)
+
+        try:
+            if new_analyses:
+                self.supabase.table('document_analyses') \
+                    .upsert(new_analyses, on_conflict='bucket,storage_path') \
+                    .execute()
+
+            if summary is None or summary.get('document_count') != len(analysed_paths):
+                # First run, or the totals drifted from the stored analyses
+                # (e.g. an interrupted refresh): rebuild from every analysis
+                rows = self.supabase.table('document_analyses') \
+                    .select('*') \
+                    .eq('patient_id', patient_id) \
+                    .eq('bucket', self.bucket_name) \
+                    .execute()
+                summary = merge_document_analyses(empty_document_summary(patient_id), rows.data or [])
+            elif new_analyses:
+                summary = merge_document_analyses(summary, new_analyses)
+
+            if not summary['document_count']:
+                return False, 'OCR engine did not detect any readable text inside PDF', None
+
+            summary['updated_at'] = datetime.now(timezone.utc).isoformat()
+            self.supabase.table('patient_document_insights') \
+                .upsert(summary, on_conflict='patient_id') \
+                .execute()
+        except Exception as exc:
+            logger.exception('Failed to merge document analyses: %s', exc)
+            return False, f'Failed to merge document analyses: {exc}', None
+
+        analysis = summarize_documents(summary)
+        latest_vitals = self._get_latest_vitals(patient_id)
+        if latest_vitals:
+            analysis['risk_score'] = max(0, min(100, analysis['risk_score'] + self._score_from_vitals(
+                latest_vitals, analysis['risk_factors'], analysis['recommendations']
+            )))
+
+        success, message, saved_row = self._save_insight(patient_id, analysis, created_by)
+        if success:
+            saved_row['sourceDocuments'] = {
+                'documentCount': summary['document_count'],
+                'newlyAnalysed': len(new_analyses),
+                'latestStoragePath': summary.get('latest_document_path')
+            }
+            saved_row['latestVitals'] = latest_vitals
+        return success, message, saved_row
+
+    def _analyze_documents(self, patient_id: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per-document analysis rows (without vitals, so they stay valid as vitals change)."""
+        if not documents:
+            return []
+
+        extractions = self.extraction_service.extract_many(
+            self.bucket_name, [document['path'] for document in documents], patient_id
+        )
+        now = datetime.now(timezone.utc).isoformat()
+        rows = []
+        for document in documents:
+            extraction = extractions.get(document['path'])
+            text = (extraction or {}).get('text') or ''
+            if not text.strip():
+                continue
+            analysis = self._analyze_text(text, None)
+            rows.append({
+                'patient_id': patient_id,
+                'bucket': self.bucket_name,
+                'storage_path': document['path'],
+                'content_hash': extraction.get('content_hash'),
+                'document_created_at': document.get('created_at'),
+                'risk_score': analysis['risk_score'],
+                'ai_summary': analysis['ai_summary'],
+                'risk_factors': analysis['risk_factors'],
+                'recommendations': analysis['recommendations'],
+                'key_terms': analysis['key_terms'],
+                'confidence_score': analysis['confidence_score'],
+                'model_version': analysis.get('model_version') or 'ocr-v1',
+                'analysed_at': now
+            })
+        return rows
+
+    def _save_insight(
+        self,
+        patient_id: str,
+        analysis: Dict[str, Any],
+        created_by: Optional[str]
+    ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
         payload = {
             'patient_id': patient_id,
             'risk_score': analysis['risk_score'],
@@ -100,20 +321,43 @@ class AIInsightsService:
             if not result.data:
                 return False, 'Supabase did not return the stored insight', None
 
-            saved_row = result.data[0]
-            saved_row['sourceDocument'] = {
-                'storagePath': document['path'],
-                'fileName': document['name'],
-                'extractionMode': extraction_mode,
-                'extractedAt': datetime.now(timezone.utc).isoformat()
-            }
-            saved_row['latestVitals'] = latest_vitals
-            saved_row['sourceExcerpt'] = analysis.get('source_excerpt', '')
-            return True, 'AI insight generated successfully', saved_row
+            return True, 'AI insight generated successfully', result.data[0]
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.exception('Failed to insert AI insight: %s', exc)
             return False, f'Failed to persist AI insight: {exc}', None
 
+    def queue_document_extraction(
+        self,
+        patient_id: str,
+        storage_path: str,
+        size_bytes: Optional[int] = None
+    ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """Index and start extracting a PDF just written to the patient documents bucket."""
+        path_prefix = self.patient_path_template.format(patient_id=patient_id).strip('/')
+        storage_path = storage_path.strip('/')
+        if path_prefix and not storage_path.startswith(f'{path_prefix}/'):
+            return False, 'Document path does not belong to this patient', None
+
+        if not self.extraction_service.enqueue(self.bucket_name, storage_path, patient_id):
+            return False, 'Unsupported document type', None
+
+        self.document_index.register(self.bucket_name, storage_path, patient_id, size_bytes=size_bytes)
+
+        return True, 'Document extraction queued', {
+            'bucket': self.bucket_name,
+            'storagePath': storage_path,
+            'status': 'pending'
+        }
+
+    def reconcile_document_index(self) -> Tuple[bool, str, Dict[str, int]]:
+        """Re-sync the patient document index with the documents bucket."""
+        try:
+            stats = self.document_index.reconcile(self.bucket_name, self.patient_path_template)
+            return True, 'Document index reconciled', stats
+        except Exception as exc:  # pragma: no cover - defensive logging
+            logger.exception('Failed to reconcile document index: %s', exc)
+            return False, f'Failed to reconcile document index: {exc}', {}
+
     def get_patient_insights(self, patient_id: str, limit: int = 5) -> Tuple[bool, str, List[Dict[str, Any]]]:
         """Return recent AI insights for a patient."""
         try:
@@ -129,6 +373,26 @@ class AIInsightsService:
             logger.exception('Failed to fetch insights: %s', exc)
             return False, f'Failed to fetch insights: {exc}', []
 
+    def iter_patient_insights(self, patient_id: str, page_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
+        """Every insight of a patient, newest first, in keyset pages on (created_at, id)."""
+        after: Optional[Tuple[str, str]] = None
+        while True:
+            query = self.supabase.table('ai_insights') \
+                .select('*') \
+                .eq('patient_id', patient_id)
+            if after:
+                created_at, insight_id = after
+                query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{insight_id})')
+            rows = query.order('created_at', desc=True) \
+                .order('id', desc=True) \
+                .limit(page_size) \
+                .execute().data or []
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after = (rows[-1]['created_at'], rows[-1]['id'])
+
     def list_latest_insights(self, limit: int = 100) -> Tuple[bool, str, List[Dict[str, Any]]]:
         """Return latest insight per patient with minimal patient metadata."""
         try:
@@ -191,94 +455,87 @@ class AIInsightsService:
             logger.exception('Failed to fetch patient metadata: %s', exc)
             return {}
 
+    def _list_patient_documents(self, patient_id: str) -> List[Dict[str, Any]]:
+        """Every PDF of the patient, newest first, from the document index."""
+        try:
+            rows = self.document_index.list_documents(self.bucket_name, patient_id, 'pdf')
+        except Exception as exc:
+            logger.error('Failed to read document index: %s', exc)
+            rows = []
+        if rows:
+            return [self._document_from_index(row) for row in rows]
+        return self._index_patient_folder(patient_id)
+
     def _get_latest_patient_document(self, patient_id: str) -> Optional[Dict[str, Any]]:
-        path_prefix = self.patient_path_template.format(patient_id=patient_id).strip('/')
         try:
-            listing = self.supabase.storage.from_(self.bucket_name).list(
-                path_prefix or '',
-                {
-                    'limit': 100,
-                    'offset': 0,
-                    'sortBy': {
-                        'column': 'created_at',
-                        'order': 'desc'
-                    }
-                }
-            )
+            row = self.document_index.get_latest_document(self.bucket_name, patient_id, 'pdf')
         except Exception as exc:
-            logger.error('Failed to list Supabase storage objects: %s', exc)
-            return None
+            logger.error('Failed to read document index: %s', exc)
+            row = None
+        if row:
+            return self._document_from_index(row)
 
-        if not listing:
-            return None
+        documents = self._index_patient_folder(patient_id)
+        return documents[0] if documents else None
 
-        pdf_files = [item for item in listing if item.get('name', '').lower().endswith('.pdf')]
-        if not pdf_files:
-            return None
+    def _document_from_index(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'path': row['storage_path'],
+            'name': row['file_name'],
+            'created_at': row.get('created_at'),
+            'size': row.get('size_bytes')
+        }
 
-        pdf_files.sort(key=lambda item: item.get('created_at') or '', reverse=True)
-        latest = pdf_files[0]
-        latest['path'] = f"{path_prefix}/{latest['name']}" if path_prefix else latest['name']
-        return latest
+    def _index_patient_folder(self, patient_id: str) -> List[Dict[str, Any]]:
+        """Index miss (nothing indexed for this patient yet): list the folder once and index it."""
+        documents = self._list_storage_documents(patient_id)
+        for document in documents:
+            self.document_index.register(
+                self.bucket_name,
+                document['path'],
+                patient_id,
+                size_bytes=(document.get('metadata') or {}).get('size'),
+                created_at=document.get('created_at')
+            )
+        return documents
 
-    def _download_document(self, storage_path: str) -> Optional[bytes]:
-        try:
-            return self.supabase.storage.from_(self.bucket_name).download(storage_path)
-        except Exception as exc:
-            logger.error('Failed to download %s from storage: %s', storage_path, exc)
-            return None
+    def _list_storage_documents(self, patient_id: str) -> List[Dict[str, Any]]:
+        """Every PDF in the patient's folder, newest first, paging through the listing."""
+        path_prefix = self.patient_path_template.format(patient_id=patient_id).strip('/')
+        documents: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            try:
+                listing = self.supabase.storage.from_(self.bucket_name).list(
+                    path_prefix or '',
+                    {
+                        'limit': STORAGE_LIST_PAGE_SIZE,
+                        'offset': offset,
+                        'sortBy': {
+                            'column': 'created_at',
+                            'order': 'desc'
+                        }
+                    }
+                ) or []
+            except Exception as exc:
+                logger.error('Failed to list Supabase storage objects: %s', exc)
+                break
 
-    def _extract_text_from_pdf(self, pdf_bytes: bytes) -> Tuple[str, str]:
-        try:
-            document = fitz.open(stream=pdf_bytes, filetype='pdf')
-        except Exception as exc:
-            logger.error('Unable to open PDF bytes: %s', exc)
-            return '', 'unreadable'
+            for item in listing:
+                if item.get('name', '').lower().endswith('.pdf'):
+                    item['path'] = f"{path_prefix}/{item['name']}" if path_prefix else item['name']
+                    documents.append(item)
 
-        try:
-            text_chunks: List[str] = []
-            for page in document:
-                text = page.get_text('text') or ''
-                if text.strip():
-                    text_chunks.append(text)
-
-            if text_chunks:
-                return '\n'.join(text_chunks), 'digital'
-        finally:
-            document.close()
-
-        # Second pass with OCR
-        try:
-            document = fitz.open(stream=pdf_bytes, filetype='pdf')
-            ocr_chunks: List[str] = []
-            for page_index, page in enumerate(document):
-                pix = page.get_pixmap(dpi=300)
-                mode = 'RGB' if pix.samples_per_pixel == 3 else 'RGBA'
-                image = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-                ocr_text = pytesseract.image_to_string(image, lang=self.ocr_language)
-                if ocr_text.strip():
-                    ocr_chunks.append(ocr_text)
-                logger.debug('OCR ran for patient PDF page %s (%s chars)', page_index, len(ocr_text))
-
-            return '\n'.join(ocr_chunks), 'ocr'
-        except Exception as exc:
-            logger.error('OCR processing failed: %s', exc)
-            return '', 'ocr-error'
-        finally:
-            document.close()
+            if len(listing) < STORAGE_LIST_PAGE_SIZE:
+                break
+            offset += STORAGE_LIST_PAGE_SIZE
 
-    def _get_latest_vitals(self, patient_id: str) -> Optional[Dict[str, Any]]:
-        try:
-            result = self.supabase.table('vital_uploads') \
-                .select('*') \
-                .eq('patient_id', patient_id) \
-                .order('recorded_at', desc=True) \
-                .limit(1) \
-                .execute()
+        documents.sort(key=lambda item: item.get('created_at') or '', reverse=True)
+        return documents
 
-            return result.data[0] if result.data else None
-        except Exception:
-            return None
+    def _get_latest_vitals(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        success, _, latest = self.vitals_service.get_latest_vitals([patient_id])
+        return latest.get(patient_id) if success else None
 
     def _analyze_text(self, text: str, vitals: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         trimmed_text = text.strip()
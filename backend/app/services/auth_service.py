@@ -1,10 +1,24 @@
 # Authentication service for user registration and login
 import bcrypt
+import os
 from typing import Optional, Dict, Any, Tuple
 from app.models.user import User
+from app.utils.cache import TTLCache
 from app.utils.database import get_supabase_client
 import re
 
+# User rows resolved from JWT identities, per worker. Updates and
+# deactivations made here drop the entry at once; other workers see them
+# within the TTL
+USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+_users = TTLCache(maxsize=10000, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def forget_user(user_id):
+    """Drop a cached user after it was changed."""
+    _users.pop(str(user_id))
+
+
 class AuthService:
     """Service class for authentication operations"""
     
@@ -149,16 +163,35 @@ class AuthService:
         except Exception as e:
             return False, f"Login failed: {str(e)}", None
     
-    def get_user_by_id(self, user_id: str) -> Optional[User]:
-        """Get user by ID"""
+    def get_user_by_id(self, user_id: str, strict: bool = False) -> Optional[User]:
+        """Get user by ID (served from the user cache when possible)
+        
+        None means the user does not exist; with strict=True a failed lookup
+        raises instead of also returning None.
+        """
         try:
-            result = self.supabase.table('users').select('*').eq('id', user_id).execute()
+            user_data = _users.get(str(user_id))
+            if user_data is None:
+                result = self.supabase.table('users').select('*').eq('id', user_id).execute()
+                if not result.data:
+                    return None
+                user_data = result.data[0]
+                _users.set(str(user_id), user_data)
             
-            if result.data and len(result.data) > 0:
-                return User.from_dict(result.data[0])
-            
-            return None
+            return User.from_dict(user_data)
             
         except Exception as e:
             print(f"Error getting user by ID: {str(e)}")
-            return None
\ No newline at end of file
+            if strict:
+                raise
+            return None
+    
+    def update_user(self, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a user row and drop it from the user cache; returns the updated row"""
+        result = self.supabase.table('users').update(update_data).eq('id', user_id).execute()
+        forget_user(user_id)
+        return result.data[0] if result.data else None
+    
+    def deactivate_user(self, user_id: str) -> bool:
+        """Soft delete a user; their tokens stop working once the cache entry is gone"""
+        return self.update_user(user_id, {'is_active': False}) is not None
@@ -0,0 +1,368 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from app.utils.database import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Background workers for text extraction; OCR is CPU bound, so keep this small
+DOCUMENT_EXTRACTION_WORKERS = int(os.getenv('DOCUMENT_EXTRACTION_WORKERS', 2))
+
+EXTRACTABLE_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg'}
+
+# Paths per IN (...) lookup of stored extractions
+EXTRACTION_LOOKUP_BATCH_SIZE = 200
+
+# A 'pending'/'processing' row untouched for this long belongs to a job that
+# died with its worker (restart, crash) and is extracted again; a fresher one
+# is being extracted by another worker, and get_or_extract waits for it
+EXTRACTION_STALE_AFTER = timedelta(minutes=10)
+EXTRACTION_WAIT_SECONDS = 120
+EXTRACTION_POLL_SECONDS = 1.0
+
+# A failed extraction is retried after EXTRACTION_RETRY_BASE, doubling with
+# every further failure up to EXTRACTION_RETRY_MAX; until then refreshes skip it
+EXTRACTION_RETRY_BASE = timedelta(minutes=5)
+EXTRACTION_RETRY_MAX = timedelta(hours=24)
+
+_executor = ThreadPoolExecutor(max_workers=DOCUMENT_EXTRACTION_WORKERS, thread_name_prefix='doc-extract')
+
+# (bucket, path) -> Future of the extraction running in this process, so a
+# refresh waits for the queued job instead of running OCR a second time
+_in_flight: Dict[Tuple[str, str], Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+def is_extractable(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in EXTRACTABLE_EXTENSIONS
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _in_progress_elsewhere(extraction: Optional[Dict[str, Any]]) -> bool:
+    """A queued or running extraction whose row was touched recently."""
+    if not extraction or extraction.get('status') not in ('pending', 'processing'):
+        return False
+    updated_at = _parse_time(extraction.get('updated_at'))
+    return updated_at is not None and datetime.now(timezone.utc) - updated_at < EXTRACTION_STALE_AFTER
+
+
+def _in_backoff(extraction: Optional[Dict[str, Any]]) -> bool:
+    """A failed extraction that is not due for another attempt yet."""
+    if not extraction or extraction.get('status') != 'failed':
+        return False
+    next_attempt_at = _parse_time(extraction.get('next_attempt_at'))
+    return next_attempt_at is not None and datetime.now(timezone.utc) < next_attempt_at
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Wait before the next attempt after this many consecutive failures."""
+    return min(EXTRACTION_RETRY_BASE * 2 ** max(attempts - 1, 0), EXTRACTION_RETRY_MAX)
+
+
+class DocumentExtractionService:
+    """Extracts text from stored PDFs/scans once, right after upload, into document_extractions.
+
+    Insight generation reads the stored text instead of downloading and OCRing
+    the file on every refresh. Files with the same content hash share one
+    extraction.
+    """
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+        self.ocr_language = os.getenv('OCR_LANGUAGE', 'eng')
+        tesseract_cmd = os.getenv('TESSERACT_CMD')
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def enqueue(
+        self,
+        bucket: str,
+        path: str,
+        patient_id: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Optional[Future]:
+        """Queue extraction of a stored file; returns None for unsupported file types."""
+        if not is_extractable(path):
+            return None
+
+        key = (bucket, path)
+        with _in_flight_lock:
+            future = _in_flight.get(key)
+            if future is not None:
+                return future
+            # Claimed here; the job is submitted once the row is written, so
+            # its 'processing' can never be overwritten by this 'pending'
+            future = Future()
+            _in_flight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+
+        self._save(bucket, path, {
+            'patient_id': patient_id,
+            'content_hash': content_hash,
+            'status': 'pending',
+            'error': None
+        })
+        _executor.submit(self._complete, future, bucket, path, patient_id, content_hash)
+        return future
+
+    def get_extraction(self, bucket: str, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            result = self.supabase.table('document_extractions') \
+                .select('*') \
+                .eq('bucket', bucket) \
+                .eq('storage_path', path) \
+                .limit(1) \
+                .execute()
+            return result.data[0] if result.data else None
+        except Exception as exc:
+            logger.error('Failed to read extraction for %s/%s: %s', bucket, path, exc)
+            return None
+
+    def get_or_extract(
+        self,
+        bucket: str,
+        path: str,
+        patient_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Stored extraction for a file, waiting for a running job or extracting now if there is none."""
+        extraction = self.get_extraction(bucket, path)
+        if (extraction and extraction.get('status') in ('completed', 'empty')) or _in_backoff(extraction):
+            return extraction
+
+        with _in_flight_lock:
+            future = _in_flight.get((bucket, path))
+        if future is None and _in_progress_elsewhere(extraction):
+            extraction = self._wait_for_extraction(bucket, path, extraction)
+            if _in_progress_elsewhere(extraction) or extraction.get('status') in ('completed', 'empty'):
+                return extraction
+
+        # Never extracted (e.g. uploaded before the pipeline existed), a
+        # previous attempt failed and is due again, or its job died: extract it
+        # now on the pool (one job per file in this process) and store it
+        if future is None:
+            future = self.enqueue(bucket, path, patient_id, extraction.get('content_hash') if extraction else None)
+        if future is None:
+            return extraction
+        try:
+            return future.result(timeout=EXTRACTION_WAIT_SECONDS)
+        except FutureTimeoutError:
+            # Still running; the caller reports the row as pending
+            return self.get_extraction(bucket, path) or extraction
+
+    def extract_many(
+        self,
+        bucket: str,
+        paths: List[str],
+        patient_id: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Extractions for many files: stored ones are read in one query, the rest run on the pool.
+
+        Files whose last extraction failed are skipped until their retry is
+        due, and the wait for new extractions is capped at
+        EXTRACTION_WAIT_SECONDS; files still running then are left out.
+        """
+        extractions: Dict[str, Dict[str, Any]] = {}
+        backing_off = set()
+        for start in range(0, len(paths), EXTRACTION_LOOKUP_BATCH_SIZE):
+            batch = paths[start:start + EXTRACTION_LOOKUP_BATCH_SIZE]
+            try:
+                result = self.supabase.table('document_extractions') \
+                    .select('*') \
+                    .eq('bucket', bucket) \
+                    .in_('storage_path', batch) \
+                    .execute()
+            except Exception as exc:
+                logger.error('Failed to read extractions for %s: %s', bucket, exc)
+                continue
+            for row in result.data or []:
+                if row.get('status') in ('completed', 'empty'):
+                    extractions[row['storage_path']] = row
+                elif _in_backoff(row):
+                    backing_off.add(row['storage_path'])
+
+        futures = {}
+        for path in paths:
+            if path not in extractions and path not in backing_off:
+                future = self.enqueue(bucket, path, patient_id)
+                if future is not None:
+                    futures[path] = future
+
+        deadline = time.monotonic() + EXTRACTION_WAIT_SECONDS
+        for path, future in futures.items():
+            try:
+                extraction = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                logger.warning('Extraction of %s/%s still running after %ss; leaving it out',
+                               bucket, path, EXTRACTION_WAIT_SECONDS)
+                continue
+            if extraction:
+                extractions[path] = extraction
+        return extractions
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _forget(self, key: Tuple[str, str]) -> None:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+    def _complete(self, future: Future, *args: Any) -> None:
+        try:
+            future.set_result(self._run(*args))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    def _wait_for_extraction(self, bucket: str, path: str, extraction: Dict[str, Any]) -> Dict[str, Any]:
+        """Poll a row another worker is extracting until it settles or EXTRACTION_WAIT_SECONDS pass."""
+        deadline = time.monotonic() + EXTRACTION_WAIT_SECONDS
+        while _in_progress_elsewhere(extraction) and time.monotonic() < deadline:
+            time.sleep(EXTRACTION_POLL_SECONDS)
+            extraction = self.get_extraction(bucket, path) or extraction
+        return extraction
+
+    def _run(
+        self,
+        bucket: str,
+        path: str,
+        patient_id: Optional[str],
+        content_hash: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        try:
+            self._save(bucket, path, {'patient_id': patient_id, 'status': 'processing'})
+
+            try:
+                data = self.supabase.storage.from_(bucket).download(path)
+            except Exception as exc:
+                raise RuntimeError(f'Unable to download {path} from storage: {exc}') from exc
+            content_hash = content_hash or hashlib.sha256(data).hexdigest()
+
+            fields = self._reuse_extraction(content_hash)
+            if fields is None:
+                text, mode, pages = self._extract_text(data, path)
+                fields = {
+                    'text': text,
+                    'extraction_mode': mode,
+                    'page_count': len(pages),
+                    'pages': pages
+                }
+
+            fields.update({
+                'patient_id': patient_id,
+                'content_hash': content_hash,
+                'size_bytes': len(data),
+                'status': 'completed' if fields['text'].strip() else 'empty',
+                'error': None,
+                'attempts': 0,
+                'next_attempt_at': None,
+                'extracted_at': datetime.now(timezone.utc).isoformat()
+            })
+            return self._save(bucket, path, fields)
+        except Exception as exc:
+            logger.exception('Extraction failed for %s/%s: %s', bucket, path, exc)
+            attempts = ((self.get_extraction(bucket, path) or {}).get('attempts') or 0) + 1
+            return self._save(bucket, path, {
+                'patient_id': patient_id,
+                'status': 'failed',
+                'error': str(exc)[:500],
+                'attempts': attempts,
+                'next_attempt_at': (datetime.now(timezone.utc) + retry_delay(attempts)).isoformat()
+            })
+
+    def _reuse_extraction(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Text from an earlier extraction of identical bytes, if any."""
+        try:
+            result = self.supabase.table('document_extractions') \
+                .select('text, extraction_mode, page_count, pages') \
+                .eq('content_hash', content_hash) \
+                .in_('status', ['completed', 'empty']) \
+                .limit(1) \
+                .execute()
+            return dict(result.data[0]) if result.data else None
+        except Exception:
+            return None
+
+    def _save(self, bucket: str, path: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        row = {key: value for key, value in fields.items() if value is not None or key in ('error', 'next_attempt_at')}
+        row.update({
+            'bucket': bucket,
+            'storage_path': path,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        })
+        try:
+            result = self.supabase.table('document_extractions') \
+                .upsert(row, on_conflict='bucket,storage_path') \
+                .execute()
+            return result.data[0] if result.data else row
+        except Exception as exc:
+            logger.error('Failed to store extraction for %s/%s: %s', bucket, path, exc)
+            return row
+
+    def _extract_text(self, data: bytes, path: str) -> Tuple[str, str, List[Dict[str, Any]]]:
+        """Text, overall mode ('digital', 'ocr', 'mixed', ...) and per-page metadata."""
+        if os.path.splitext(path)[1].lower() != '.pdf':
+            try:
+                text = pytesseract.image_to_string(Image.open(io.BytesIO(data)), lang=self.ocr_language)
+            except Exception as exc:
+                logger.error('OCR processing failed: %s', exc)
+                return '', 'ocr-error', []
+            return text, 'ocr', [{'page': 1, 'mode': 'ocr', 'chars': len(text)}]
+
+        try:
+            document = fitz.open(stream=data, filetype='pdf')
+        except Exception as exc:
+            logger.error('Unable to open PDF bytes: %s', exc)
+            return '', 'unreadable', []
+
+        text_chunks: List[str] = []
+        pages: List[Dict[str, Any]] = []
+        try:
+            for page_index, page in enumerate(document):
+                text = page.get_text('text') or ''
+                mode = 'digital'
+                if not text.strip():
+                    # Scanned page: fall back to OCR for this page only
+                    text, mode = self._ocr_page(page), 'ocr'
+                    logger.debug('OCR ran for PDF page %s (%s chars)', page_index, len(text))
+                if text.strip():
+                    text_chunks.append(text)
+                pages.append({'page': page_index + 1, 'mode': mode, 'chars': len(text)})
+        finally:
+            document.close()
+
+        modes = {page['mode'] for page in pages if page['chars']}
+        if not modes:
+            overall = 'ocr' if pages else 'unreadable'
+        else:
+            overall = modes.pop() if len(modes) == 1 else 'mixed'
+        return '\n'.join(text_chunks), overall, pages
+
+    def _ocr_page(self, page: Any) -> str:
+        try:
+            pix = page.get_pixmap(dpi=300)
+            mode = 'RGB' if pix.samples_per_pixel == 3 else 'RGBA'
+            image = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
+            return pytesseract.image_to_string(image, lang=self.ocr_language)
+        except Exception as exc:
+            logger.error('OCR processing failed: %s', exc)
+            return ''
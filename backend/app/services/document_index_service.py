@@ -0,0 +1,186 @@
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.utils.database import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Objects per storage list call while reconciling, and rows per index upsert
+RECONCILE_LIST_PAGE_SIZE = 100
+INDEX_UPSERT_BATCH_SIZE = 500
+# Index rows per read; stays under PostgREST's max-rows cap so no page is silently cut
+INDEX_READ_PAGE_SIZE = 1000
+
+DOCUMENT_INDEX_COLUMNS = ('bucket, storage_path, patient_id, file_name, file_extension, size_bytes, '
+                          'content_hash, extraction_state, created_at, indexed_at')
+
+
+def _index_row(bucket: str, path: str, patient_id: str, **fields: Any) -> Dict[str, Any]:
+    file_name = path.rsplit('/', 1)[-1]
+    row = {
+        'bucket': bucket,
+        'storage_path': path,
+        'patient_id': patient_id,
+        'file_name': file_name,
+        'file_extension': os.path.splitext(file_name)[1].lower().lstrip('.') or None,
+        'indexed_at': datetime.now(timezone.utc).isoformat(),
+        'deleted_at': None
+    }
+    # Passed fields are kept even when None: every row of a multi-row upsert
+    # must have the same keys, or PostgREST rejects the whole batch
+    row.update(fields)
+    return row
+
+
+def patient_path_pattern(path_template: str) -> 're.Pattern[str]':
+    """Regex matching object paths under a folder template such as '{patient_id}' or 'patients/{patient_id}/pdfs'."""
+    folder = re.escape(path_template.strip('/')).replace(r'\{patient_id\}', r'(?P<patient_id>[^/]+)')
+    return re.compile(rf'^{folder}/[^/]+$' if folder else r'^(?P<patient_id>)[^/]+$')
+
+
+class DocumentIndexService:
+    """Index of stored patient files (patient_documents), so lookups avoid listing the bucket.
+
+    Rows are written when a file is uploaded; reconcile() pages through a
+    bucket to pick up files written elsewhere and to mark removed ones.
+    extraction_state is kept in step with document_extractions by a trigger.
+    """
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+
+    def register(
+        self,
+        bucket: str,
+        path: str,
+        patient_id: str,
+        size_bytes: Optional[int] = None,
+        content_hash: Optional[str] = None,
+        created_at: Optional[str] = None
+    ) -> None:
+        row = _index_row(bucket, path, patient_id, size_bytes=size_bytes, content_hash=content_hash,
+                         created_at=created_at or datetime.now(timezone.utc).isoformat())
+        try:
+            self.supabase.table('patient_documents').upsert(row, on_conflict='bucket,storage_path').execute()
+        except Exception as exc:
+            logger.error('Failed to index %s/%s: %s', bucket, path, exc)
+
+    def list_documents(
+        self,
+        bucket: str,
+        patient_id: str,
+        extension: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Indexed files of a patient, newest first (served by the (patient_id, bucket, created_at) index).
+
+        Without a limit every row is returned, read in INDEX_READ_PAGE_SIZE pages.
+        """
+        documents: List[Dict[str, Any]] = []
+        while True:
+            page_size = min(INDEX_READ_PAGE_SIZE, limit - len(documents)) if limit else INDEX_READ_PAGE_SIZE
+            query = self.supabase.table('patient_documents') \
+                .select(DOCUMENT_INDEX_COLUMNS) \
+                .eq('patient_id', patient_id) \
+                .eq('bucket', bucket) \
+                .is_('deleted_at', 'null')
+            if extension:
+                query = query.eq('file_extension', extension)
+            rows = query.order('created_at', desc=True) \
+                .order('storage_path') \
+                .range(len(documents), len(documents) + page_size - 1) \
+                .execute().data or []
+            documents.extend(rows)
+            if len(rows) < page_size or (limit and len(documents) >= limit):
+                return documents
+
+    def get_latest_document(self, bucket: str, patient_id: str, extension: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        rows = self.list_documents(bucket, patient_id, extension, limit=1)
+        return rows[0] if rows else None
+
+    def reconcile(self, bucket: str, path_template: str = '{patient_id}') -> Dict[str, int]:
+        """Bring the index in line with the bucket contents.
+
+        Walks the bucket page by page, upserts every object found under a
+        patient folder and marks indexed objects that no longer exist as deleted.
+        """
+        pattern = patient_path_pattern(path_template)
+        root = path_template.split('{patient_id}', 1)[0].strip('/')
+        seen = set()
+        batch: List[Dict[str, Any]] = []
+        stats = {'indexed': 0, 'deleted': 0}
+
+        for path, item in self._walk(bucket, root):
+            match = pattern.match(path)
+            if not match or not match.group('patient_id'):
+                continue
+            seen.add(path)
+            metadata = item.get('metadata') or {}
+            batch.append(_index_row(bucket, path, match.group('patient_id'),
+                                    size_bytes=metadata.get('size'),
+                                    created_at=item.get('created_at')))
+            if len(batch) >= INDEX_UPSERT_BATCH_SIZE:
+                stats['indexed'] += self._flush(batch)
+                batch = []
+        stats['indexed'] += self._flush(batch)
+
+        # Anything indexed but not seen in the walk was removed from the bucket
+        removed = [path for path in self._iter_indexed_paths(bucket) if path not in seen]
+        now = datetime.now(timezone.utc).isoformat()
+        for start in range(0, len(removed), INDEX_UPSERT_BATCH_SIZE):
+            self.supabase.table('patient_documents') \
+                .update({'deleted_at': now}) \
+                .eq('bucket', bucket) \
+                .in_('storage_path', removed[start:start + INDEX_UPSERT_BATCH_SIZE]) \
+                .execute()
+        stats['deleted'] = len(removed)
+
+        logger.info('Reconciled %s: %s', bucket, stats)
+        return stats
+
+    def _iter_indexed_paths(self, bucket: str):
+        """storage_path of every live index row in the bucket, keyset-paged on storage_path."""
+        last_path = None
+        while True:
+            query = self.supabase.table('patient_documents') \
+                .select('storage_path') \
+                .eq('bucket', bucket) \
+                .is_('deleted_at', 'null')
+            if last_path is not None:
+                query = query.gt('storage_path', last_path)
+            rows = query.order('storage_path').limit(INDEX_READ_PAGE_SIZE).execute().data or []
+            for row in rows:
+                yield row['storage_path']
+            if len(rows) < INDEX_READ_PAGE_SIZE:
+                return
+            last_path = rows[-1]['storage_path']
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> int:
+        if rows:
+            self.supabase.table('patient_documents').upsert(rows, on_conflict='bucket,storage_path').execute()
+        return len(rows)
+
+    def _walk(self, bucket: str, prefix: str):
+        """Yield (path, item) for every object under prefix, paging each folder listing."""
+        folders = [prefix]
+        while folders:
+            folder = folders.pop()
+            offset = 0
+            while True:
+                listing = self.supabase.storage.from_(bucket).list(
+                    folder,
+                    {'limit': RECONCILE_LIST_PAGE_SIZE, 'offset': offset, 'sortBy': {'column': 'name', 'order': 'asc'}}
+                ) or []
+                for item in listing:
+                    path = f"{folder}/{item['name']}" if folder else item['name']
+                    # Folders come back as placeholder entries without an id
+                    if item.get('id') is None and not item.get('metadata'):
+                        folders.append(path)
+                    else:
+                        yield path, item
+                if len(listing) < RECONCILE_LIST_PAGE_SIZE:
+                    break
+                offset += RECONCILE_LIST_PAGE_SIZE
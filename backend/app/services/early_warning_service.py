@@ -0,0 +1,240 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.database import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# NEWS2 (Royal College of Physicians, 2017) parameter bands. Each entry is
+# (upper bin edges, inclusive, and the score of each bin); a value v falls into
+# the first bin whose edge is >= v, or the last bin when above every edge.
+NEWS2_BANDS: Dict[str, Tuple[List[float], List[int]]] = {
+    'respiratory_rate': ([8, 11, 20, 24], [3, 1, 0, 2, 3]),
+    'oxygen_saturation': ([91, 93, 95], [3, 2, 1, 0]),  # SpO2 scale 1
+    'blood_pressure_systolic': ([90, 100, 110, 219], [3, 2, 1, 0, 3]),
+    'heart_rate': ([40, 50, 90, 110, 130], [3, 1, 0, 1, 2, 3]),
+    'temperature': ([35.0, 36.0, 38.0, 39.0], [3, 1, 0, 1, 2]),  # degrees Celsius
+}
+SUPPLEMENTAL_OXYGEN_SCORE = 2
+NOT_ALERT_SCORE = 3  # new confusion, or responds only to voice/pain, or unresponsive
+
+VITALS_COLUMNS = ('id, patient_id, heart_rate, blood_pressure_systolic, temperature, respiratory_rate, '
+                  'oxygen_saturation, consciousness, supplemental_oxygen, recorded_at')
+
+# Ward view: default look-back window and an upper bound on rows read
+DEFAULT_WARD_WINDOW_HOURS = 24
+MAX_WARD_VITALS_ROWS = 50000
+
+
+def fahrenheit_to_celsius(values: np.ndarray) -> np.ndarray:
+    # vital_uploads.temperature is recorded in Fahrenheit (85-115 check constraint).
+    # Rounded to the 0.1 degree NEWS2 bands are charted in, so 100.4F is 38.0C
+    # rather than 38.00000000000001C
+    return np.round((values - 32.0) * (5.0 / 9.0), 1)
+
+
+def compute_news2(
+    respiratory_rate: np.ndarray,
+    oxygen_saturation: np.ndarray,
+    blood_pressure_systolic: np.ndarray,
+    heart_rate: np.ndarray,
+    temperature_c: np.ndarray,
+    not_alert: np.ndarray,
+    supplemental_oxygen: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """NEWS2 component scores, aggregate and clinical risk band for arrays of observations.
+
+    Numeric inputs are float arrays with NaN for missing values (which score 0
+    and are counted in 'missing'); not_alert and supplemental_oxygen are bool
+    arrays. Everything is computed column-wise, so cost grows with the number of
+    parameters, not the number of observations.
+    """
+    measured = {
+        'respiratory_rate': respiratory_rate,
+        'oxygen_saturation': oxygen_saturation,
+        'blood_pressure_systolic': blood_pressure_systolic,
+        'heart_rate': heart_rate,
+        'temperature': temperature_c,
+    }
+
+    components: Dict[str, np.ndarray] = {}
+    missing = np.zeros(len(respiratory_rate), dtype=np.int8)
+    for name, values in measured.items():
+        edges, scores = NEWS2_BANDS[name]
+        absent = np.isnan(values)
+        bins = np.digitize(np.where(absent, 0, values), edges, right=True)
+        components[name] = np.where(absent, 0, np.asarray(scores, dtype=np.int8)[bins]).astype(np.int8)
+        missing += absent
+
+    components['supplemental_oxygen'] = np.where(supplemental_oxygen, SUPPLEMENTAL_OXYGEN_SCORE, 0).astype(np.int8)
+    components['consciousness'] = np.where(not_alert, NOT_ALERT_SCORE, 0).astype(np.int8)
+
+    stacked = np.vstack(list(components.values()))
+    total = stacked.sum(axis=0)
+    red_flag = (stacked == 3).any(axis=0)
+
+    # 0-4 low (a 3 in any single parameter makes it low-medium), 5-6 medium, 7+ high
+    risk = np.full(total.shape, 'low', dtype=object)
+    risk[red_flag] = 'low-medium'
+    risk[total >= 5] = 'medium'
+    risk[total >= 7] = 'high'
+
+    return {
+        'total': total,
+        'risk': risk,
+        'red_flag': red_flag,
+        'missing': missing,
+        'components': components
+    }
+
+
+def _column(rows: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.fromiter(
+        (np.nan if row.get(key) is None else row[key] for row in rows),
+        dtype=float,
+        count=len(rows)
+    )
+
+
+def score_vitals_rows(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """compute_news2 over vital_uploads rows (consciousness 'A' and room air when not recorded)."""
+    consciousness = np.array([(row.get('consciousness') or 'A') for row in rows], dtype=object)
+    return compute_news2(
+        _column(rows, 'respiratory_rate'),
+        _column(rows, 'oxygen_saturation'),
+        _column(rows, 'blood_pressure_systolic'),
+        _column(rows, 'heart_rate'),
+        fahrenheit_to_celsius(_column(rows, 'temperature')),
+        consciousness != 'A',
+        np.fromiter((bool(row.get('supplemental_oxygen')) for row in rows), dtype=bool, count=len(rows))
+    )
+
+
+def take_scores(scores: Dict[str, np.ndarray], index: np.ndarray) -> Dict[str, np.ndarray]:
+    """The scores of a subset of observations."""
+    taken = {key: value[index] for key, value in scores.items() if key != 'components'}
+    taken['components'] = {name: values[index] for name, values in scores['components'].items()}
+    return taken
+
+
+def scored_observations(
+    rows: List[Dict[str, Any]],
+    scores: Optional[Dict[str, np.ndarray]] = None
+) -> List[Dict[str, Any]]:
+    """Rows annotated with their NEWS2 score, band and component scores."""
+    if not rows:
+        return []
+    if scores is None:
+        scores = score_vitals_rows(rows)
+    totals = scores['total'].tolist()
+    risks = scores['risk'].tolist()
+    missing = scores['missing'].tolist()
+    components = {name: values.tolist() for name, values in scores['components'].items()}
+
+    return [
+        {
+            'vital_id': row.get('id'),
+            'patient_id': row.get('patient_id'),
+            'recorded_at': row.get('recorded_at'),
+            'score': totals[i],
+            'risk': risks[i],
+            'missing_parameters': missing[i],
+            'components': {name: values[i] for name, values in components.items()}
+        }
+        for i, row in enumerate(rows)
+    ]
+
+
+class EarlyWarningService:
+    """NEWS2 early-warning scores over vital_uploads for single patients and whole wards."""
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+
+    def get_ward_scores(
+        self,
+        since: Optional[str] = None,
+        patient_ids: Optional[List[str]] = None
+    ) -> Tuple[bool, str, List[Dict[str, Any]]]:
+        """Latest score per patient observed since `since`, highest risk first, with the change from the previous score."""
+        try:
+            since = since or (datetime.now(timezone.utc) - timedelta(hours=DEFAULT_WARD_WINDOW_HOURS)).isoformat()
+            query = self.supabase.table('vital_uploads') \
+                .select(VITALS_COLUMNS) \
+                .gte('recorded_at', since)
+            if patient_ids:
+                query = query.in_('patient_id', patient_ids)
+            rows = query.order('recorded_at', desc=True).limit(MAX_WARD_VITALS_ROWS).execute().data or []
+
+            if not rows:
+                return True, 'No vitals recorded in this window', []
+
+            scores = score_vitals_rows(rows)
+
+            # Rows are newest first: the first occurrence of each patient is its
+            # latest observation, the second its previous one
+            patients = np.array([row['patient_id'] for row in rows], dtype=object)
+            _, first = np.unique(patients, return_index=True)
+            seen_once = np.zeros(len(rows), dtype=bool)
+            seen_once[first] = True
+            remaining = np.flatnonzero(~seen_once)
+            _, second_in_remaining = np.unique(patients[remaining], return_index=True)
+            previous_index = dict(zip(patients[remaining[second_in_remaining]].tolist(),
+                                      remaining[second_in_remaining].tolist()))
+            observation_counts = dict(zip(*np.unique(patients, return_counts=True)))
+
+            totals = scores['total']
+            ward = scored_observations([rows[index] for index in first.tolist()], take_scores(scores, first))
+            for index, entry in zip(first.tolist(), ward):
+                patient_id = entry['patient_id']
+                previous = previous_index.get(patient_id)
+                entry['previous_score'] = int(totals[previous]) if previous is not None else None
+                entry['score_change'] = int(totals[index] - totals[previous]) if previous is not None else None
+                entry['observations'] = int(observation_counts[patient_id])
+
+            metadata = self._fetch_patient_metadata([entry['patient_id'] for entry in ward])
+            for entry in ward:
+                entry['patient'] = metadata.get(entry['patient_id'], {})
+
+            ward.sort(key=lambda entry: (-entry['score'], str(entry['recorded_at'])))
+            return True, 'Early warning scores computed', ward
+        except Exception as exc:
+            logger.exception('Failed to compute ward early warning scores: %s', exc)
+            return False, f'Failed to compute early warning scores: {exc}', []
+
+    def get_patient_scores(self, patient_id: str, limit: int = 100) -> Tuple[bool, str, List[Dict[str, Any]]]:
+        """Score series for one patient, oldest first."""
+        try:
+            rows = self.supabase.table('vital_uploads') \
+                .select(VITALS_COLUMNS) \
+                .eq('patient_id', patient_id) \
+                .order('recorded_at', desc=True) \
+                .limit(limit) \
+                .execute().data or []
+            rows.reverse()
+            return True, 'Early warning scores computed', scored_observations(rows)
+        except Exception as exc:
+            logger.exception('Failed to compute early warning scores: %s', exc)
+            return False, f'Failed to compute early warning scores: {exc}', []
+
+    def _fetch_patient_metadata(self, patient_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not patient_ids:
+            return {}
+        try:
+            result = self.supabase.table('patients') \
+                .select('id, first_name, last_name, medical_record_number') \
+                .in_('id', patient_ids) \
+                .execute()
+        except Exception as exc:
+            logger.error('Failed to fetch patient metadata: %s', exc)
+            return {}
+        return {
+            row['id']: {
+                'fullName': f"{row.get('first_name', '')} {row.get('last_name', '')}".strip(),
+                'medicalRecordNumber': row.get('medical_record_number')
+            }
+            for row in result.data or []
+        }
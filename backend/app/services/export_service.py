@@ -0,0 +1,428 @@
+import logging
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.database import get_supabase_client
+from app.services.vitals_history_service import parse_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # exports report themselves unavailable
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Column specs per exportable dataset. Every export pages through its table
+# in (patient_id, time column, id) order one time window at a time, with the
+# window, patient list and column list pushed down into the query.
+EXPORT_DATASETS: Dict[str, Dict[str, Any]] = {
+    'vitals': {
+        'table': 'vital_uploads',
+        'time_column': 'recorded_at',
+        'columns': [
+            ('id', 'string'),
+            ('patient_id', 'string'),
+            ('recorded_at', 'timestamp'),
+            ('heart_rate', 'int32'),
+            ('blood_pressure_systolic', 'int32'),
+            ('blood_pressure_diastolic', 'int32'),
+            ('temperature', 'float64'),
+            ('respiratory_rate', 'int32'),
+            ('oxygen_saturation', 'float64'),
+            ('consciousness', 'string'),
+            ('supplemental_oxygen', 'bool'),
+            ('notes', 'string'),
+            ('uploaded_by', 'string'),
+            ('uploaded_at', 'timestamp'),
+        ],
+    },
+    'lab_results': {
+        'table': 'lab_results',
+        'time_column': 'collected_at',
+        'columns': [
+            ('id', 'int64'),
+            ('report_id', 'string'),
+            ('patient_id', 'string'),
+            ('parameter', 'string'),
+            ('parameter_key', 'string'),
+            ('value_text', 'string'),
+            ('value_numeric', 'float64'),
+            ('unit', 'string'),
+            ('normal_range', 'string'),
+            ('ref_low', 'float64'),
+            ('ref_high', 'float64'),
+            ('status', 'string'),
+            ('collected_at', 'date'),
+            ('created_at', 'timestamp'),
+        ],
+    },
+}
+
+EXPORT_FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+}
+
+# Finished files are uploaded here and handed out as signed URLs
+EXPORT_BUCKET = os.getenv('EXPORT_BUCKET', 'exports')
+EXPORT_URL_TTL_SECONDS = int(os.getenv('EXPORT_URL_TTL_SECONDS', 3600))
+# Files are written here before upload; needs room for the largest export
+EXPORT_STAGING_DIR = os.getenv('EXPORT_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'healthcare-exports'))
+
+# Exports run one at a time per worker so a year-long export does not starve
+# the request threads of database connections
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 1))
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+
+# Rows per source query (one PostgREST page)
+EXPORT_PAGE_SIZE = 1000
+# Rows buffered before a row group / record batch is written; with the page
+# size this bounds an export's memory regardless of its time range
+EXPORT_ROW_GROUP_ROWS = 50000
+# Time range read per pass. Row groups end on window boundaries, so readers
+# filtering on time can skip whole row groups using their min/max statistics;
+# windows of sparse data are merged until a row group has at least
+# EXPORT_MIN_ROW_GROUP_ROWS rows
+EXPORT_WINDOW = timedelta(days=7)
+EXPORT_MIN_ROW_GROUP_ROWS = 10000
+DEFAULT_EXPORT_RANGE = timedelta(days=30)
+MAX_EXPORT_PATIENTS = 1000
+
+# A running job touches its row after every window; a pending or running job
+# left untouched this long lost its worker (restart, crash) and never finishes
+EXPORT_STALE_AFTER = timedelta(minutes=15)
+
+
+def arrow_schema(dataset: str) -> 'pa.Schema':
+    types = {
+        'string': pa.string(),
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'bool': pa.bool_(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_DATASETS[dataset]['columns']])
+
+
+def _convert(value: Any, kind: str) -> Any:
+    """PostgREST JSON value -> Python value pyarrow accepts for the column type."""
+    if value is None:
+        return None
+    if kind == 'timestamp':
+        return parse_timestamp(value)
+    if kind == 'date':
+        return date.fromisoformat(value[:10])
+    if kind in ('int32', 'int64'):
+        return int(value)
+    if kind == 'float64':
+        return float(value)
+    return value
+
+
+def export_windows(start: datetime, end: datetime, width: timedelta = EXPORT_WINDOW) -> Iterator[Tuple[datetime, datetime]]:
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + width, end)
+        yield window_start, window_end
+        window_start = window_end
+
+
+class _ColumnBuffer:
+    """Rows held column-wise until there are enough for a row group."""
+
+    def __init__(self, columns: List[Tuple[str, str]], schema: 'pa.Schema') -> None:
+        self.columns = columns
+        self.schema = schema
+        self.clear()
+
+    def clear(self) -> None:
+        self.values: Dict[str, List[Any]] = {name: [] for name, _ in self.columns}
+        self.rows = 0
+
+    def extend(self, rows: List[Dict[str, Any]]) -> None:
+        for name, kind in self.columns:
+            self.values[name].extend(_convert(row.get(name), kind) for row in rows)
+        self.rows += len(rows)
+
+    def take_table(self) -> 'pa.Table':
+        table = pa.Table.from_pydict(self.values, schema=self.schema)
+        self.clear()
+        return table
+
+
+class _ExportWriter:
+    """Parquet (one row group per write) or Arrow IPC file (one record batch per write)."""
+
+    def __init__(self, path: str, file_format: str, schema: 'pa.Schema') -> None:
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, schema)
+        self.file_format = file_format
+        self.row_groups = 0
+
+    def write(self, table: 'pa.Table') -> None:
+        if self.file_format == 'parquet':
+            self._writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            for batch in table.combine_chunks().to_batches():
+                self._writer.write_batch(batch)
+        self.row_groups += 1
+
+    def close(self) -> None:
+        self._writer.close()
+        if self.file_format != 'parquet':
+            self._sink.close()
+
+
+class ExportService:
+    """Background exports of vitals and lab results to Parquet or Arrow IPC files.
+
+    A job is recorded in export_jobs and runs on a small executor. It reads
+    its time range one EXPORT_WINDOW at a time with keyset pagination,
+    buffers at most EXPORT_ROW_GROUP_ROWS rows column-wise, writes them as a
+    row group, and uploads the finished file to EXPORT_BUCKET. Clients poll
+    the job and download the file through a signed URL.
+    """
+
+    def __init__(self, staging_dir: str = EXPORT_STAGING_DIR) -> None:
+        self.supabase = get_supabase_client()
+        self.staging_dir = staging_dir
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def create_job(
+        self,
+        dataset: str,
+        requested_by: str,
+        file_format: str = 'parquet',
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        patient_ids: Optional[List[str]] = None
+    ) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """Record an export job and queue it; returns the pending job row."""
+        if pa is None:
+            return False, 'Exports are unavailable: pyarrow is not installed', None
+        if dataset not in EXPORT_DATASETS:
+            return False, f"dataset must be one of {', '.join(EXPORT_DATASETS)}", None
+        if file_format not in EXPORT_FORMATS:
+            return False, f"format must be one of {', '.join(EXPORT_FORMATS)}", None
+
+        end = end or datetime.now(timezone.utc)
+        start = start or end - DEFAULT_EXPORT_RANGE
+        if start >= end:
+            return False, 'start must be before end', None
+        patient_ids = list(dict.fromkeys(patient_ids or []))
+        if len(patient_ids) > MAX_EXPORT_PATIENTS:
+            return False, f'At most {MAX_EXPORT_PATIENTS} patients per export', None
+
+        job = {
+            'id': str(uuid.uuid4()),
+            'dataset': dataset,
+            'format': file_format,
+            'status': 'pending',
+            'range_start': start.isoformat(),
+            'range_end': end.isoformat(),
+            'patient_ids': patient_ids or None,
+            'requested_by': requested_by,
+        }
+        try:
+            result = self.supabase.table('export_jobs').insert(job).execute()
+        except Exception as exc:
+            logger.exception('Failed to create export job: %s', exc)
+            return False, f'Failed to create export job: {exc}', None
+
+        job = result.data[0] if result.data else job
+        _executor.submit(self._run, job['id'], dataset, file_format, start, end, patient_ids)
+        return True, 'Export queued', job
+
+    def get_job(self, job_id: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        try:
+            result = self.supabase.table('export_jobs').select('*').eq('id', job_id).execute()
+        except Exception as exc:
+            logger.exception('Failed to read export job %s: %s', job_id, exc)
+            return False, f'Failed to read export job: {exc}', None
+        if not result.data:
+            return False, 'Export not found', None
+        return True, 'Export retrieved', result.data[0]
+
+    def fail_interrupted_jobs(self) -> int:
+        """Mark jobs whose worker went away as failed, so clients stop polling them; returns how many."""
+        cutoff = (datetime.now(timezone.utc) - EXPORT_STALE_AFTER).isoformat()
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            result = self.supabase.table('export_jobs').update({
+                'status': 'failed',
+                'error': 'Export was interrupted (server restarted); request it again',
+                'completed_at': now,
+                'updated_at': now
+            }).in_('status', ['pending', 'running']).lt('updated_at', cutoff).execute()
+        except Exception as exc:
+            logger.error('Failed to mark interrupted export jobs: %s', exc)
+            return 0
+        interrupted = len(result.data or [])
+        if interrupted:
+            logger.warning('Marked %s interrupted export jobs as failed', interrupted)
+        return interrupted
+
+    def get_download_url(self, job_id: str) -> Tuple[bool, str, Optional[str]]:
+        """Signed URL for a completed export, valid for EXPORT_URL_TTL_SECONDS."""
+        success, message, job = self.get_job(job_id)
+        if not success:
+            return False, message, None
+        if job['status'] != 'completed':
+            return False, f"Export is {job['status']}", None
+        try:
+            signed = self.supabase.storage.from_(EXPORT_BUCKET).create_signed_url(
+                job['storage_path'], EXPORT_URL_TTL_SECONDS
+            )
+        except Exception as exc:
+            logger.exception('Failed to sign export %s: %s', job_id, exc)
+            return False, f'Failed to create download URL: {exc}', None
+        return True, 'Download URL created', signed.get('signedURL') or signed.get('signedUrl')
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _run(
+        self,
+        job_id: str,
+        dataset: str,
+        file_format: str,
+        start: datetime,
+        end: datetime,
+        patient_ids: List[str]
+    ) -> None:
+        extension, content_type = EXPORT_FORMATS[file_format]
+        local_path = os.path.join(self.staging_dir, f'{job_id}{extension}')
+        try:
+            self._update(job_id, {'status': 'running', 'started_at': datetime.now(timezone.utc).isoformat()})
+            os.makedirs(self.staging_dir, exist_ok=True)
+
+            rows_written, row_groups = self._write_file(job_id, local_path, dataset, file_format, start, end, patient_ids)
+
+            storage_path = f'{dataset}/{job_id}{extension}'
+            with open(local_path, 'rb') as file_data:
+                self.supabase.storage.from_(EXPORT_BUCKET).upload(
+                    storage_path,
+                    file_data,
+                    file_options={'content-type': content_type, 'x-upsert': 'true'}
+                )
+
+            self._update(job_id, {
+                'status': 'completed',
+                'rows_written': rows_written,
+                'row_groups': row_groups,
+                'size_bytes': os.path.getsize(local_path),
+                'storage_path': storage_path,
+                'error': None,
+                'completed_at': datetime.now(timezone.utc).isoformat()
+            })
+        except Exception as exc:
+            logger.exception('Export %s failed: %s', job_id, exc)
+            self._update(job_id, {
+                'status': 'failed',
+                'error': str(exc)[:500],
+                'completed_at': datetime.now(timezone.utc).isoformat()
+            })
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    def _write_file(
+        self,
+        job_id: str,
+        path: str,
+        dataset: str,
+        file_format: str,
+        start: datetime,
+        end: datetime,
+        patient_ids: List[str]
+    ) -> Tuple[int, int]:
+        spec = EXPORT_DATASETS[dataset]
+        schema = arrow_schema(dataset)
+        buffer = _ColumnBuffer(spec['columns'], schema)
+        writer = _ExportWriter(path, file_format, schema)
+        rows_written = 0
+        try:
+            for window_start, window_end in export_windows(start, end):
+                for page in self._iter_pages(spec, window_start, window_end, patient_ids, window_end >= end):
+                    buffer.extend(page)
+                    if buffer.rows >= EXPORT_ROW_GROUP_ROWS:
+                        rows_written += buffer.rows
+                        writer.write(buffer.take_table())
+                if buffer.rows >= EXPORT_MIN_ROW_GROUP_ROWS:
+                    rows_written += buffer.rows
+                    writer.write(buffer.take_table())
+                # Progress, and proof of life for fail_interrupted_jobs
+                self._update(job_id, {'rows_written': rows_written})
+            if buffer.rows or not writer.row_groups:
+                rows_written += buffer.rows
+                writer.write(buffer.take_table())
+        finally:
+            writer.close()
+        return rows_written, writer.row_groups
+
+    def _iter_pages(
+        self,
+        spec: Dict[str, Any],
+        window_start: datetime,
+        window_end: datetime,
+        patient_ids: List[str],
+        last_window: bool = False
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Pages of one window in (patient_id, time, id) order, via keyset pagination."""
+        time_column = spec['time_column']
+        is_date = dict(spec['columns'])[time_column] == 'date'
+        lower = window_start.date().isoformat() if is_date else window_start.isoformat()
+        upper = window_end.date().isoformat() if is_date else window_end.isoformat()
+        if is_date and last_window:
+            # Dates have no time of day: the export's last day is included whole
+            upper = (window_end.date() + timedelta(days=1)).isoformat()
+        if is_date and lower == upper:
+            return
+        columns = ', '.join(name for name, _ in spec['columns'])
+
+        after: Optional[Tuple[str, str, Any]] = None
+        while True:
+            query = self.supabase.table(spec['table']) \
+                .select(columns) \
+                .gte(time_column, lower) \
+                .lt(time_column, upper)
+            if patient_ids:
+                query = query.in_('patient_id', patient_ids)
+            if after:
+                patient_id, moment, row_id = after
+                query = query.or_(
+                    f'patient_id.gt.{patient_id},'
+                    f'and(patient_id.eq.{patient_id},{time_column}.gt."{moment}"),'
+                    f'and(patient_id.eq.{patient_id},{time_column}.eq."{moment}",id.gt.{row_id})'
+                )
+            rows = query.order('patient_id') \
+                .order(time_column) \
+                .order('id') \
+                .limit(EXPORT_PAGE_SIZE) \
+                .execute().data or []
+            if rows:
+                yield rows
+            if len(rows) < EXPORT_PAGE_SIZE:
+                return
+            last = rows[-1]
+            after = (last['patient_id'], last[time_column], last['id'])
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+        try:
+            self.supabase.table('export_jobs').update(fields).eq('id', job_id).execute()
+        except Exception as exc:
+            logger.error('Failed to update export job %s: %s', job_id, exc)
@@ -0,0 +1,803 @@
+import logging
+import re
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+
+from app.services.lab_reports_service import LabReportsService
+from app.services.monitor_stream_service import SAMPLE_CONFLICT_COLUMNS, SAMPLE_FIELDS, iter_ndjson_lines
+from app.services.patient_service import PatientService, UUID_PATTERN
+from app.services.vitals_history_service import parse_timestamp
+from app.services.vitals_service import VitalsService
+from app.utils.database import get_supabase_client
+from app.utils.idempotency import is_data_error
+from app.utils.json_provider import dumps_bytes
+from app.utils.json_stream import JSONStreamReader, iter_array_values, iter_object_items
+
+logger = logging.getLogger(__name__)
+
+FHIR_RESOURCE_TYPES = ('Patient', 'Observation', 'DiagnosticReport')
+
+LOINC_SYSTEM = 'http://loinc.org'
+UCUM_SYSTEM = 'http://unitsofmeasure.org'
+PATIENT_MRN_SYSTEM = 'urn:healthcare-ai:medical-record-number'
+IDENTIFIER_TYPE_SYSTEM = 'http://terminology.hl7.org/CodeSystem/v2-0203'
+OBSERVATION_CATEGORY_SYSTEM = 'http://terminology.hl7.org/CodeSystem/observation-category'
+DIAGNOSTIC_SERVICE_SYSTEM = 'http://terminology.hl7.org/CodeSystem/v2-0074'
+INTERPRETATION_SYSTEM = 'http://terminology.hl7.org/CodeSystem/v3-ObservationInterpretation'
+
+VITAL_SIGNS_PANEL = ('85353-1', 'Vital signs panel')
+
+# vital_uploads column -> (LOINC code, display, unit, UCUM code). Temperature is
+# charted in Fahrenheit; Celsius observations are converted on import.
+VITAL_SIGN_CODES: Dict[str, Tuple[str, str, str, str]] = {
+    'heart_rate': ('8867-4', 'Heart rate', 'beats/minute', '/min'),
+    'respiratory_rate': ('9279-1', 'Respiratory rate', 'breaths/minute', '/min'),
+    'oxygen_saturation': ('59408-5', 'Oxygen saturation in Arterial blood by Pulse oximetry', '%', '%'),
+    'temperature': ('8310-5', 'Body temperature', 'degF', '[degF]'),
+    'blood_pressure_systolic': ('8480-6', 'Systolic blood pressure', 'mmHg', 'mm[Hg]'),
+    'blood_pressure_diastolic': ('8462-4', 'Diastolic blood pressure', 'mmHg', 'mm[Hg]'),
+}
+# LOINC code -> column, including codes we accept but never write
+LOINC_VITAL_FIELDS = {code: field for field, (code, _, _, _) in VITAL_SIGN_CODES.items()}
+LOINC_VITAL_FIELDS['2708-6'] = 'oxygen_saturation'
+CELSIUS_UNITS = {'Cel', 'C', '°C', 'degC'}
+
+# lab_reports.status <-> DiagnosticReport.status
+REPORT_STATUS_TO_FHIR = {'pending': 'registered', 'in-progress': 'preliminary',
+                         'completed': 'final', 'cancelled': 'cancelled'}
+REPORT_STATUS_FROM_FHIR = {'registered': 'pending', 'partial': 'in-progress', 'preliminary': 'in-progress',
+                           'final': 'completed', 'amended': 'completed', 'corrected': 'completed',
+                           'appended': 'completed', 'cancelled': 'cancelled', 'entered-in-error': 'cancelled'}
+# test_results[].status <-> Observation.interpretation
+RESULT_STATUS_TO_FHIR = {'normal': 'N', 'high': 'H', 'low': 'L', 'abnormal': 'A', 'critical': 'AA'}
+RESULT_STATUS_FROM_FHIR = {'N': 'normal', 'H': 'high', 'HH': 'critical', 'HU': 'critical', 'L': 'low',
+                           'LL': 'critical', 'LU': 'critical', 'A': 'abnormal', 'AA': 'critical'}
+
+GENDER_TO_FHIR = {'male': 'male', 'female': 'female', 'other': 'other'}
+
+# FHIR date: YYYY, YYYY-MM or YYYY-MM-DD. Only full dates fit patients.date_of_birth
+FHIR_DATE_PATTERN = re.compile(r'^\d{4}(-\d{2}(-\d{2})?)?$')
+# patients column widths (database.py); longer free text is cut, longer keys rejected
+PATIENT_TEXT_LIMITS = {'first_name': 100, 'last_name': 100, 'phone': 20, 'gender': 20,
+                       'emergency_contact_name': 200, 'emergency_contact_phone': 20}
+MAX_MRN_LENGTH = 50
+MAX_FHIR_ID_LENGTH = 64
+MAX_EMAIL_LENGTH = 255
+
+# Resources per import round: patients are upserted, references resolved and
+# vitals/reports written with one multi-row statement per table per round
+FHIR_IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_IMPORT_ERRORS = 100
+# Device id recorded on vital_samples rows built from partial observation sets
+FHIR_IMPORT_DEVICE_ID = 'fhir-import'
+
+# Rows per export query and resources per streamed chunk
+FHIR_EXPORT_PAGE_SIZE = 1000
+MAX_FHIR_EXPORT_PATIENTS = 1000
+
+# Namespace for row ids derived from foreign FHIR ids, so importing the same
+# file twice hits the primary key instead of creating duplicates
+FHIR_ID_NAMESPACE = uuid.UUID('0f6a4c8e-2b1d-4e8a-9c3f-7d5e1b2a6f48')
+
+
+class FhirError(ValueError):
+    pass
+
+
+def record_id(resource_type: str, fhir_id: Optional[str]) -> str:
+    """Row id for an imported resource: its own id if it is a UUID (our exports), else derived from it."""
+    if fhir_id and UUID_PATTERN.match(fhir_id):
+        return fhir_id.lower()
+    if not fhir_id:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(FHIR_ID_NAMESPACE, f'{resource_type}/{fhir_id}'))
+
+
+def _codes(concept: Optional[Dict[str, Any]], system: Optional[str] = None) -> List[str]:
+    return [coding.get('code') for coding in (concept or {}).get('coding') or []
+            if coding.get('code') and (system is None or coding.get('system') == system)]
+
+
+def _concept_text(concept: Optional[Dict[str, Any]]) -> Optional[str]:
+    concept = concept or {}
+    if concept.get('text'):
+        return concept['text']
+    for coding in concept.get('coding') or []:
+        if coding.get('display') or coding.get('code'):
+            return coding.get('display') or coding.get('code')
+    return None
+
+
+def _reference_id(reference: Optional[Dict[str, Any]], resource_type: str = 'Patient') -> Optional[str]:
+    """'Patient/123' -> '123'; a logical reference falls back to its identifier value."""
+    reference = reference or {}
+    target = reference.get('reference') or ''
+    if target.startswith('urn:uuid:'):
+        return target[len('urn:uuid:'):]
+    if '/' in target:
+        kind, _, ref_id = target.rstrip('/').rpartition('/')
+        if kind.rsplit('/', 1)[-1] == resource_type:
+            return ref_id
+    if target:
+        return target
+    return (reference.get('identifier') or {}).get('value')
+
+
+def _effective_time(resource: Dict[str, Any]) -> Optional[str]:
+    return (resource.get('effectiveDateTime') or resource.get('effectiveInstant')
+            or (resource.get('effectivePeriod') or {}).get('start'))
+
+
+def _quantity(field: str, quantity: Dict[str, Any]) -> float:
+    value = float(quantity['value'])
+    if field == 'temperature' and (quantity.get('code') in CELSIUS_UNITS or quantity.get('unit') in CELSIUS_UNITS):
+        value = value * 9 / 5 + 32
+    return value
+
+
+# ----------------------------------------------------------------------
+# Resource <-> row mapping
+# ----------------------------------------------------------------------
+def patient_to_fhir(row: Dict[str, Any]) -> Dict[str, Any]:
+    """patients row -> FHIR R4 Patient."""
+    resource: Dict[str, Any] = {'resourceType': 'Patient', 'id': row['id']}
+    if row.get('medical_record_number'):
+        resource['identifier'] = [{
+            'type': {'coding': [{'system': IDENTIFIER_TYPE_SYSTEM, 'code': 'MR'}]},
+            'system': PATIENT_MRN_SYSTEM,
+            'value': row['medical_record_number']
+        }]
+    resource['name'] = [{'use': 'official', 'family': row.get('last_name'),
+                         'given': [row['first_name']] if row.get('first_name') else []}]
+    telecom = [{'system': 'phone', 'value': row['phone']}] if row.get('phone') else []
+    if row.get('email'):
+        telecom.append({'system': 'email', 'value': row['email']})
+    if telecom:
+        resource['telecom'] = telecom
+    resource['gender'] = GENDER_TO_FHIR.get((row.get('gender') or '').lower(), 'unknown')
+    if row.get('date_of_birth'):
+        resource['birthDate'] = str(row['date_of_birth'])[:10]
+    if row.get('address'):
+        resource['address'] = [{'text': row['address']}]
+    if row.get('emergency_contact_name') or row.get('emergency_contact_phone'):
+        contact: Dict[str, Any] = {'name': {'text': row.get('emergency_contact_name')}}
+        if row.get('emergency_contact_phone'):
+            contact['telecom'] = [{'system': 'phone', 'value': row['emergency_contact_phone']}]
+        resource['contact'] = [contact]
+    if row.get('updated_at'):
+        resource['meta'] = {'lastUpdated': row['updated_at']}
+    return resource
+
+
+def patient_from_fhir(resource: Dict[str, Any], created_by: str) -> Dict[str, Any]:
+    """FHIR Patient -> patients row (keyed by medical_record_number; fhir_id links references)."""
+    identifiers = resource.get('identifier') or []
+    mrn = next((ident.get('value') for ident in identifiers if ident.get('system') == PATIENT_MRN_SYSTEM), None) \
+        or next((ident.get('value') for ident in identifiers if 'MR' in _codes(ident.get('type'))), None) \
+        or next((ident.get('value') for ident in identifiers if ident.get('value')), None) \
+        or resource.get('id')
+    if not mrn:
+        raise FhirError('Patient has neither an identifier nor an id')
+
+    names = resource.get('name') or [{}]
+    name = next((n for n in names if n.get('use') == 'official'), names[0])
+    telecom = resource.get('telecom') or []
+    phone = next((t.get('value') for t in telecom if t.get('system') == 'phone'), None)
+    email = next((t.get('value') for t in telecom if t.get('system') == 'email'), None)
+    contact = (resource.get('contact') or [{}])[0]
+    contact_phone = next((t.get('value') for t in contact.get('telecom') or [] if t.get('system') == 'phone'), None)
+    address = (resource.get('address') or [{}])[0]
+    address_text = address.get('text') or ', '.join(
+        part for part in (address.get('line') or []) + [address.get('city'), address.get('state'),
+                                                         address.get('postalCode'), address.get('country')]
+        if part
+    )
+
+    if len(str(mrn)) > MAX_MRN_LENGTH:
+        raise FhirError(f'Patient identifier longer than {MAX_MRN_LENGTH} characters')
+    if resource.get('id') and len(str(resource['id'])) > MAX_FHIR_ID_LENGTH:
+        raise FhirError(f'Patient id longer than {MAX_FHIR_ID_LENGTH} characters')
+
+    # Empty columns are left alone on patients that already exist (see
+    # PatientService.import_patients), so nothing here is a placeholder
+    row = {
+        'fhir_id': resource.get('id'),
+        'medical_record_number': str(mrn),
+        'first_name': ' '.join(name.get('given') or []) or None,
+        'last_name': name.get('family') or None,
+        'email': email if email and len(email) <= MAX_EMAIL_LENGTH else None,
+        'phone': phone,
+        'date_of_birth': _birth_date(resource.get('birthDate')),
+        'gender': resource.get('gender').capitalize() if resource.get('gender') else None,
+        'address': address_text or None,
+        'emergency_contact_name': (contact.get('name') or {}).get('text') or None,
+        'emergency_contact_phone': contact_phone,
+        'created_by': created_by
+    }
+    for column, limit in PATIENT_TEXT_LIMITS.items():
+        if row[column]:
+            row[column] = str(row[column])[:limit]
+    return row
+
+
+def _birth_date(value: Any) -> Optional[str]:
+    """FHIR birthDate -> DATE value; partial dates (1980, 1980-05) are dropped, invalid ones raise FhirError."""
+    if not value:
+        return None
+    if not isinstance(value, str) or not FHIR_DATE_PATTERN.match(value):
+        raise FhirError(f'Invalid birthDate: {value!r}')
+    if len(value) < 10:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise FhirError(f'Invalid birthDate: {value!r}')
+
+
+def vitals_to_fhir(row: Dict[str, Any]) -> Dict[str, Any]:
+    """vital_uploads row -> vital-signs panel Observation with one component per vital sign."""
+    components = []
+    for field, (code, display, unit, ucum) in VITAL_SIGN_CODES.items():
+        if row.get(field) is None:
+            continue
+        components.append({
+            'code': {'coding': [{'system': LOINC_SYSTEM, 'code': code, 'display': display}]},
+            'valueQuantity': {'value': row[field], 'unit': unit, 'system': UCUM_SYSTEM, 'code': ucum}
+        })
+    resource = {
+        'resourceType': 'Observation',
+        'id': row['id'],
+        'status': 'final',
+        'category': [{'coding': [{'system': OBSERVATION_CATEGORY_SYSTEM, 'code': 'vital-signs'}]}],
+        'code': {'coding': [{'system': LOINC_SYSTEM, 'code': VITAL_SIGNS_PANEL[0], 'display': VITAL_SIGNS_PANEL[1]}]},
+        'subject': {'reference': f"Patient/{row['patient_id']}"},
+        'effectiveDateTime': row['recorded_at'],
+        'component': components
+    }
+    if row.get('uploaded_by'):
+        resource['performer'] = [{'reference': f"Practitioner/{row['uploaded_by']}"}]
+    if row.get('notes'):
+        resource['note'] = [{'text': row['notes']}]
+    if row.get('updated_at'):
+        resource['meta'] = {'lastUpdated': row['updated_at']}
+    return resource
+
+
+def observation_vitals(resource: Dict[str, Any]) -> Dict[str, float]:
+    """Vital signs carried by an Observation, from its own value and its components."""
+    values = {}
+    for part in [resource] + (resource.get('component') or []):
+        quantity = part.get('valueQuantity')
+        if not quantity or quantity.get('value') is None:
+            continue
+        for code in _codes(part.get('code'), LOINC_SYSTEM) or _codes(part.get('code')):
+            field = LOINC_VITAL_FIELDS.get(code)
+            if field:
+                values[field] = _quantity(field, quantity)
+                break
+    return values
+
+
+def lab_report_to_fhir(row: Dict[str, Any]) -> Dict[str, Any]:
+    """lab_reports row -> DiagnosticReport with its results as contained Observations."""
+    contained = []
+    for index, result in enumerate(row.get('test_results') or []):
+        observation: Dict[str, Any] = {
+            'resourceType': 'Observation',
+            'id': f'r{index}',
+            'status': 'final',
+            'category': [{'coding': [{'system': OBSERVATION_CATEGORY_SYSTEM, 'code': 'laboratory'}]}],
+            'code': {'text': result.get('parameter')}
+        }
+        value = result.get('value')
+        try:
+            observation['valueQuantity'] = {'value': float(str(value).replace(',', ''))}
+            if result.get('unit'):
+                observation['valueQuantity']['unit'] = result['unit']
+        except (TypeError, ValueError):
+            observation['valueString'] = value
+        if result.get('normalRange'):
+            observation['referenceRange'] = [{'text': result['normalRange']}]
+        interpretation = RESULT_STATUS_TO_FHIR.get((result.get('status') or '').lower())
+        if interpretation:
+            observation['interpretation'] = [{'coding': [{'system': INTERPRETATION_SYSTEM, 'code': interpretation}]}]
+        contained.append(observation)
+
+    resource = {
+        'resourceType': 'DiagnosticReport',
+        'id': row['id'],
+        'status': REPORT_STATUS_TO_FHIR.get(row.get('status'), 'unknown'),
+        'category': [
+            {'coding': [{'system': DIAGNOSTIC_SERVICE_SYSTEM, 'code': 'LAB'}]},
+            {'text': row.get('test_type')}
+        ],
+        'code': {'text': row.get('test_name')},
+        'subject': {'reference': f"Patient/{row['patient_id']}"},
+        'effectiveDateTime': str(row['collection_date']),
+        'result': [{'reference': f"#{observation['id']}"} for observation in contained]
+    }
+    if row.get('result_date'):
+        resource['issued'] = f"{str(row['result_date'])[:10]}T00:00:00Z"
+    if row.get('notes'):
+        resource['conclusion'] = row['notes']
+    if contained:
+        resource['contained'] = contained
+    if row.get('updated_at'):
+        resource['meta'] = {'lastUpdated': row['updated_at']}
+    return resource
+
+
+def lab_report_from_fhir(resource: Dict[str, Any]) -> Dict[str, Any]:
+    """DiagnosticReport -> lab report payload (the shape create_lab_report takes).
+
+    Results are read from contained Observations; references to Observations
+    elsewhere in the file are not followed.
+    """
+    collected = _effective_time(resource)
+    if not collected:
+        raise FhirError('DiagnosticReport has no effective date')
+    test_type = next((category.get('text') for category in resource.get('category') or []
+                      if category.get('text')), None) or 'Laboratory'
+
+    results = []
+    for observation in resource.get('contained') or []:
+        if observation.get('resourceType') != 'Observation':
+            continue
+        quantity = observation.get('valueQuantity') or {}
+        if quantity.get('value') is not None:
+            value, unit = str(quantity['value']), quantity.get('unit') or quantity.get('code') or ''
+        else:
+            value = observation.get('valueString') or _concept_text(observation.get('valueCodeableConcept'))
+            unit = ''
+        if value is None:
+            continue
+        reference = (observation.get('referenceRange') or [{}])[0]
+        normal_range = reference.get('text') or ''
+        if not normal_range and (reference.get('low') or reference.get('high')):
+            normal_range = f"{(reference.get('low') or {}).get('value', '')}-{(reference.get('high') or {}).get('value', '')}"
+        interpretation = next(iter(_codes((observation.get('interpretation') or [{}])[0])), None)
+        results.append({
+            'parameter': _concept_text(observation.get('code')) or 'Result',
+            'value': value,
+            'unit': unit,
+            'normalRange': normal_range,
+            'status': RESULT_STATUS_FROM_FHIR.get(interpretation, 'normal')
+        })
+
+    return {
+        'testType': test_type[:100],
+        'testName': (_concept_text(resource.get('code')) or 'Lab report')[:150],
+        'collectionDate': collected[:10],
+        'resultDate': (resource.get('issued') or collected)[:10],
+        'status': REPORT_STATUS_FROM_FHIR.get(resource.get('status'), 'completed'),
+        'priority': 'normal',
+        'notes': resource.get('conclusion') or '',
+        'results': results
+    }
+
+
+# ----------------------------------------------------------------------
+# Streaming input
+# ----------------------------------------------------------------------
+def iter_ndjson_resources(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Resources of a FHIR bulk-data NDJSON file, one line at a time."""
+    for number, line in enumerate(iter_ndjson_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as exc:
+            raise FhirError(f'Line {number}: invalid JSON ({exc})')
+
+
+def iter_bundle_resources(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Resources of a FHIR Bundle, decoded one entry at a time whatever the Bundle's size."""
+    reader = JSONStreamReader(stream)
+    for key in iter_object_items(reader):
+        if key == 'entry':
+            for entry in iter_array_values(reader):
+                if isinstance(entry, dict) and isinstance(entry.get('resource'), dict):
+                    yield entry['resource']
+        elif key == 'resourceType':
+            if reader.value() != 'Bundle':
+                raise FhirError('Expected a FHIR Bundle')
+        else:
+            reader.value()
+
+
+class _ImportStats:
+    def __init__(self) -> None:
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.errors: List[str] = []
+
+    def add(self, resource_type: str, outcome: str, count: int = 1) -> None:
+        bucket = self.counts.setdefault(resource_type, {'received': 0, 'imported': 0, 'duplicates': 0,
+                                                        'skipped': 0, 'failed': 0})
+        bucket[outcome] += count
+
+    def fail(self, resource_type: str, message: str) -> None:
+        self.add(resource_type, 'failed')
+        if len(self.errors) < MAX_REPORTED_IMPORT_ERRORS:
+            self.errors.append(f'{resource_type}: {message}')
+
+    def summary(self) -> Dict[str, Any]:
+        return {'resources': self.counts, 'errors': self.errors}
+
+
+class FhirService:
+    """FHIR R4 import and export of patients, vital signs and lab reports.
+
+    Patient maps to patients, vital-sign Observations to vital_uploads (a
+    complete set of the six charted vitals) or vital_samples (anything less),
+    and DiagnosticReport with contained result Observations to lab_reports.
+    Imports read NDJSON or a Bundle incrementally and write each round of
+    FHIR_IMPORT_BATCH_SIZE resources through the services' batched inserts;
+    exports page through the tables and stream one resource at a time.
+    """
+
+    def __init__(
+        self,
+        patient_service: Optional[PatientService] = None,
+        vitals_service: Optional[VitalsService] = None,
+        lab_reports_service: Optional[LabReportsService] = None
+    ) -> None:
+        self.supabase = get_supabase_client()
+        self.patient_service = patient_service or PatientService()
+        self.vitals_service = vitals_service or VitalsService()
+        self.lab_reports_service = lab_reports_service or LabReportsService()
+
+    # ------------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------------
+    def import_resources(self, resources: Iterator[Dict[str, Any]], user_id: str) -> Dict[str, Any]:
+        """Import resources in rounds; a bad resource is reported and the rest continue.
+
+        Patients referenced by later rounds are remembered for the whole
+        import, so a bundle may list a patient before or in the same round
+        as its observations.
+        """
+        stats = _ImportStats()
+        patient_refs: Dict[str, str] = {}
+        batch: List[Dict[str, Any]] = []
+        try:
+            for resource in resources:
+                batch.append(resource)
+                if len(batch) >= FHIR_IMPORT_BATCH_SIZE:
+                    self._import_batch(batch, user_id, patient_refs, stats)
+                    batch = []
+            if batch:
+                self._import_batch(batch, user_id, patient_refs, stats)
+        except (FhirError, ValueError) as exc:
+            # Malformed input: rounds already written stay written
+            summary = stats.summary()
+            summary['error'] = str(exc)
+            return summary
+        return stats.summary()
+
+    def _import_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        user_id: str,
+        patient_refs: Dict[str, str],
+        stats: _ImportStats
+    ) -> None:
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for resource in batch:
+            resource_type = resource.get('resourceType') if isinstance(resource, dict) else None
+            stats.add(resource_type or 'unknown', 'received')
+            if resource_type not in FHIR_RESOURCE_TYPES:
+                stats.add(resource_type or 'unknown', 'skipped')
+                continue
+            by_type.setdefault(resource_type, []).append(resource)
+
+        if by_type.get('Patient'):
+            self._import_patients(by_type['Patient'], user_id, patient_refs, stats)
+
+        others = by_type.get('Observation', []) + by_type.get('DiagnosticReport', [])
+        if not others:
+            return
+        self._resolve_patients([_reference_id(r.get('subject')) for r in others], patient_refs)
+        if by_type.get('Observation'):
+            self._import_observations(by_type['Observation'], user_id, patient_refs, stats)
+        if by_type.get('DiagnosticReport'):
+            self._import_reports(by_type['DiagnosticReport'], user_id, patient_refs, stats)
+
+    def _import_patients(
+        self,
+        resources: List[Dict[str, Any]],
+        user_id: str,
+        patient_refs: Dict[str, str],
+        stats: _ImportStats
+    ) -> None:
+        rows = {}
+        for resource in resources:
+            try:
+                row = patient_from_fhir(resource, user_id)
+            except FhirError as exc:
+                stats.fail('Patient', str(exc))
+                continue
+            # The last version of a patient in a round wins
+            rows[row['medical_record_number']] = row
+        if not rows:
+            return
+
+        success, message, result = self.patient_service.import_patients(list(rows.values()))
+        if not success:
+            for _ in rows:
+                stats.fail('Patient', message)
+            return
+        for row in result['saved']:
+            patient_refs[row['id']] = row['id']
+            patient_refs[row['medical_record_number']] = row['id']
+            if row.get('fhir_id'):
+                patient_refs[row['fhir_id']] = row['id']
+        stats.add('Patient', 'imported', len(result['saved']))
+        for failure in result['failed']:
+            stats.fail('Patient', f"{failure['medical_record_number']}: {failure['error']}")
+
+    def _resolve_patients(self, references: List[Optional[str]], patient_refs: Dict[str, str]) -> None:
+        """Look up subject references not seen in this import (FHIR id, database id or MRN)."""
+        missing = list(dict.fromkeys(ref for ref in references if ref and ref not in patient_refs))
+        if not missing:
+            return
+        patient_refs.update(self.patient_service.resolve_fhir_references(missing))
+        unresolved = [ref for ref in missing if ref not in patient_refs]
+        if unresolved:
+            success, _, resolved = self.patient_service.resolve_patient_references(unresolved)
+            if success:
+                patient_refs.update(resolved)
+
+    def _import_observations(
+        self,
+        resources: List[Dict[str, Any]],
+        user_id: str,
+        patient_refs: Dict[str, str],
+        stats: _ImportStats
+    ) -> None:
+        # A panel carrying every charted vital is a row of its own; single
+        # vital-sign Observations of one patient at one instant are combined
+        groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        for resource in resources:
+            patient_ref = _reference_id(resource.get('subject'))
+            patient_id = patient_refs.get(patient_ref)
+            if not patient_id:
+                stats.fail('Observation', f'Unknown patient: {patient_ref}')
+                continue
+            if resource.get('status') in ('entered-in-error', 'cancelled'):
+                stats.add('Observation', 'skipped')
+                continue
+            try:
+                values = observation_vitals(resource)
+                recorded_at = parse_timestamp(_effective_time(resource))
+            except (TypeError, ValueError) as exc:
+                stats.fail('Observation', f"{resource.get('id')}: {exc}")
+                continue
+            if not values or not recorded_at:
+                stats.add('Observation', 'skipped')
+                continue
+
+            key: Tuple[str, ...] = (patient_id, recorded_at.isoformat())
+            if len(values) == len(VITAL_SIGN_CODES):
+                key += (resource.get('id') or str(len(groups)),)
+            group = groups.setdefault(key, {'ids': [], 'values': {}, 'notes': []})
+            group['ids'].append(resource.get('id') or '')
+            group['values'].update(values)
+            group['notes'].extend(note.get('text') for note in resource.get('note') or [] if note.get('text'))
+
+        records, record_ids, record_sizes, samples = [], [], [], []
+        for (patient_id, recorded_at, *_), group in groups.items():
+            values = group['values']
+            if len(values) == len(VITAL_SIGN_CODES):
+                fhir_id = group['ids'][0] if len(group['ids']) == 1 else '|'.join(sorted(group['ids']))
+                record_ids.append(record_id('Observation', fhir_id))
+                records.append({
+                    'patient_id': patient_id,
+                    'recorded_at': recorded_at,
+                    'notes': ' '.join(group['notes']),
+                    **{field: round(values[field], 1) for field in values}
+                })
+                record_sizes.append(len(group['ids']))
+            else:
+                samples.append((self._sample_row(patient_id, recorded_at, values), len(group['ids'])))
+
+        if records:
+            success, message, results = self.vitals_service.create_vital_uploads(records, user_id, vital_ids=record_ids)
+            if not success:
+                for size in record_sizes:
+                    for _ in range(size):
+                        stats.fail('Observation', message)
+            for result, size in zip(results, record_sizes):
+                if result['success']:
+                    stats.add('Observation', 'imported', size)
+                elif result.get('duplicate'):
+                    stats.add('Observation', 'duplicates', size)
+                else:
+                    for _ in range(size):
+                        stats.fail('Observation', result['error'])
+
+        self._import_samples(samples, stats)
+
+    def _import_samples(self, samples: List[Tuple[Optional[Dict[str, Any]], int]], stats: _ImportStats) -> None:
+        """Write a round's vital_samples rows; readings already stored count as duplicates.
+
+        The rows are inserted here, not queued for the monitor writer, so an
+        observation is only reported as imported once the database has it.
+        """
+        rows: List[Dict[str, Any]] = []
+        sizes: List[int] = []
+        for row, size in samples:
+            if row is None:
+                stats.add('Observation', 'skipped', size)
+            else:
+                rows.append(row)
+                sizes.append(size)
+        if not rows:
+            return
+
+        inserted: List[Dict[str, Any]] = []
+        errors: Dict[int, str] = {}
+        try:
+            inserted = self._insert_samples(rows)
+        except Exception as exc:
+            if not is_data_error(exc):
+                logger.error('vital_samples insert of %s imported rows failed: %s', len(rows), exc)
+                for size in sizes:
+                    for _ in range(size):
+                        stats.fail('Observation', f'Failed to store vital samples: {exc}')
+                return
+            # One refused row fails the statement; retry one by one so only it is lost
+            for index, row in enumerate(rows):
+                try:
+                    inserted += self._insert_samples([row])
+                except Exception as row_exc:
+                    errors[index] = f'Failed to store vital samples: {row_exc}'
+
+        stored = {self._sample_key(row) for row in inserted}
+        for index, (row, size) in enumerate(zip(rows, sizes)):
+            if index in errors:
+                for _ in range(size):
+                    stats.fail('Observation', errors[index])
+            elif self._sample_key(row) in stored:
+                stats.add('Observation', 'imported', size)
+            else:
+                stats.add('Observation', 'duplicates', size)
+
+        # Same baseline check the monitor writer runs on its batches
+        inserted.sort(key=lambda row: parse_timestamp(row['recorded_at']))
+        if inserted:
+            self.vitals_service.anomaly_service.submit_rows(inserted, 'monitor')
+
+    def _insert_samples(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert vital_samples rows, skipping readings already stored; returns the rows inserted."""
+        result = self.supabase.table('vital_samples').upsert(
+            rows, on_conflict=SAMPLE_CONFLICT_COLUMNS, ignore_duplicates=True
+        ).execute()
+        return result.data or []
+
+    @staticmethod
+    def _sample_key(row: Dict[str, Any]) -> Tuple[str, Optional[datetime]]:
+        # The database returns recorded_at in its own ISO format
+        return str(row['patient_id']).lower(), parse_timestamp(row['recorded_at'])
+
+    @staticmethod
+    def _sample_row(patient_id: str, recorded_at: str, values: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        """Partial observation set -> vital_samples row (Celsius temperature), None if nothing is plausible."""
+        row: Dict[str, Any] = {'patient_id': patient_id, 'device_id': FHIR_IMPORT_DEVICE_ID, 'recorded_at': recorded_at}
+        values = dict(values)
+        if 'temperature' in values:
+            values['temperature_c'] = round((values.pop('temperature') - 32) * 5 / 9, 2)
+        for field, value in values.items():
+            column, low, high = SAMPLE_FIELDS[field]
+            if low <= value <= high:
+                row[column] = value if column == 'temperature_c' else int(round(value))
+        return row if len(row) > 3 else None
+
+    def _import_reports(
+        self,
+        resources: List[Dict[str, Any]],
+        user_id: str,
+        patient_refs: Dict[str, str],
+        stats: _ImportStats
+    ) -> None:
+        payloads, report_ids = [], []
+        for resource in resources:
+            patient_ref = _reference_id(resource.get('subject'))
+            patient_id = patient_refs.get(patient_ref)
+            if not patient_id:
+                stats.fail('DiagnosticReport', f'Unknown patient: {patient_ref}')
+                continue
+            try:
+                payload = lab_report_from_fhir(resource)
+            except FhirError as exc:
+                stats.fail('DiagnosticReport', f"{resource.get('id')}: {exc}")
+                continue
+            payload['patientId'] = patient_id
+            payloads.append(payload)
+            report_ids.append(record_id('DiagnosticReport', resource.get('id')))
+        if not payloads:
+            return
+
+        created, errors, duplicates = self.lab_reports_service.import_lab_reports(payloads, user_id, report_ids)
+        stats.add('DiagnosticReport', 'imported', len(created))
+        stats.add('DiagnosticReport', 'duplicates', len(duplicates))
+        for error in errors:
+            stats.fail('DiagnosticReport', error)
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    def iter_resources(
+        self,
+        resource_types: Optional[List[str]] = None,
+        patient_ids: Optional[List[str]] = None,
+        since: Optional[datetime] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Resources of the requested types, each table paged by id."""
+        sources = (
+            ('Patient', 'patients', 'id', patient_to_fhir),
+            ('Observation', 'vital_uploads', 'patient_id', vitals_to_fhir),
+            ('DiagnosticReport', 'lab_reports', 'patient_id', lab_report_to_fhir),
+        )
+        for resource_type, table, patient_column, to_fhir in sources:
+            if resource_types and resource_type not in resource_types:
+                continue
+            for rows in self._iter_table(table, patient_column, patient_ids, since):
+                for row in rows:
+                    yield to_fhir(row)
+
+    def stream_ndjson(self, resources: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+        batch = []
+        for resource in resources:
+            batch.append(dumps_bytes(resource))
+            if len(batch) >= FHIR_EXPORT_PAGE_SIZE:
+                yield b'\n'.join(batch) + b'\n'
+                batch = []
+        if batch:
+            yield b'\n'.join(batch) + b'\n'
+
+    def stream_bundle(self, resources: Iterator[Dict[str, Any]], bundle_type: str = 'collection') -> Iterator[bytes]:
+        """A Bundle written entry by entry, so its size never has to be known or held."""
+        head = {
+            'resourceType': 'Bundle',
+            'id': str(uuid.uuid4()),
+            'type': bundle_type,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }
+        yield dumps_bytes(head)[:-1] + b',"entry":['
+        batch = []
+        first = True
+        for resource in resources:
+            batch.append(dumps_bytes({'fullUrl': f"urn:uuid:{resource['id']}", 'resource': resource}))
+            if len(batch) >= FHIR_EXPORT_PAGE_SIZE:
+                yield (b'' if first else b',') + b','.join(batch)
+                first = False
+                batch = []
+        if batch:
+            yield (b'' if first else b',') + b','.join(batch)
+        yield b']}\n'
+
+    def _iter_table(
+        self,
+        table: str,
+        patient_column: str,
+        patient_ids: Optional[List[str]],
+        since: Optional[datetime]
+    ) -> Iterator[List[Dict[str, Any]]]:
+        last_id = None
+        while True:
+            query = self.supabase.table(table).select('*')
+            if patient_ids:
+                query = query.in_(patient_column, patient_ids)
+            if since:
+                query = query.gte('updated_at', since.isoformat())
+            if last_id:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(FHIR_EXPORT_PAGE_SIZE).execute().data or []
+            if rows:
+                yield rows
+            if len(rows) < FHIR_EXPORT_PAGE_SIZE:
+                return
+            last_id = rows[-1]['id']
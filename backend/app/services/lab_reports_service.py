@@ -1,48 +1,135 @@
 from app.utils.database import get_supabase_client
 from app.models.lab_report import LabReport
+from app.services.patient_service import PatientService, UUID_PATTERN
+from app.services.lab_results_service import LabResultsService, invalidate_patient_trends
+from app.services.document_extraction_service import DocumentExtractionService
+from app.services.document_index_service import DocumentIndexService
+from app.utils.idempotency import is_data_error, is_duplicate_key_error
 from datetime import datetime
 import uuid
-import pandas as pd
+import numpy as np
 import pandas as pd
 import os
+import tempfile
 from werkzeug.utils import secure_filename
+import base64
+import hashlib
+import json
+import re
+
+# Rows per multi-row insert when ingesting CSV exports
+LAB_REPORT_INSERT_BATCH_SIZE = 500
+
+# Bucket for uploaded lab files, and the copy buffer used when streaming them
+LAB_FILES_BUCKET = 'medical-files'
+UPLOAD_COPY_CHUNK_BYTES = 1024 * 1024
+
+# Lab files are stored under their SHA-256, so identical bytes for a patient share one object
+LAB_FILE_HASH_ALGORITHM = 'sha256'
+
+# Patient fields embedded in list/detail responses
+LAB_REPORT_PATIENT_EMBED = 'patients:patient_id(id, name, patient_id, room)'
+
+# List projection without the test_results JSONB (fetched by the detail endpoint)
+LAB_REPORT_SUMMARY_COLUMNS = ('id, patient_id, test_type, test_name, order_date, collection_date, '
+                              'result_date, status, priority, notes, file_url, file_hash, created_by, created_at, updated_at')
+
+# Equality filters accepted by the list endpoint (comma-separated values mean "any of")
+LAB_REPORT_LIST_FILTERS = ('status', 'priority', 'test_type')
+
+# Chunked CSV ingest: rows per chunk, upload size that switches to chunked mode,
+# and how many row errors are kept on the import record
+LAB_CSV_CHUNK_ROWS = 20000
+LAB_CSV_CHUNKED_THRESHOLD_BYTES = 20 * 1024 * 1024
+MAX_STORED_IMPORT_ERRORS = 500
+
+# Chunked imports give each report an id derived from the import and the
+# report's first CSV row, so a chunk retried after an outage finds the
+# reports it already wrote instead of writing them twice
+CSV_REPORT_ID_NAMESPACE = uuid.UUID('6d3c1f2a-8b4e-4f7a-9e21-5a0c7b9d3e64')
+
+CSV_REQUIRED_COLUMNS = ['patient_id', 'test_type', 'test_name', 'collection_date', 'result_date']
+
+# Rows sharing these values belong to the same lab report
+CSV_GROUP_COLUMNS = ['patient_id', 'test_type', 'test_name', 'collection_date']
+CSV_OPTIONAL_COLUMNS = ['order_date', 'status', 'priority', 'notes', 'parameter', 'value',
+                        'unit', 'normal_range', 'result_status']
+
+
+def _encode_list_cursor(report):
+    """Opaque keyset cursor pointing just after this report."""
+    raw = json.dumps([report['created_at'], report['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_list_cursor(cursor):
+    try:
+        created_at, report_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('malformed cursor')
+    if not UUID_PATTERN.match(str(report_id)) or not re.match(r'^[0-9T:.+\- ]+$', str(created_at)):
+        raise ValueError('malformed cursor')
+    return created_at, report_id
+
+
+def copy_and_hash(source, destination):
+    """Copy a binary stream in chunks and return the hex digest of the bytes copied."""
+    digest = hashlib.new(LAB_FILE_HASH_ALGORITHM)
+    while True:
+        chunk = source.read(UPLOAD_COPY_CHUNK_BYTES)
+        if not chunk:
+            return digest.hexdigest()
+        digest.update(chunk)
+        destination.write(chunk)
+
+
+def hash_file(path):
+    """Hex digest of a file on disk, read in chunks."""
+    digest = hashlib.new(LAB_FILE_HASH_ALGORITHM)
+    with open(path, 'rb') as file_data:
+        for chunk in iter(lambda: file_data.read(UPLOAD_COPY_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _frame_records(frame):
+    """Rows of a DataFrame as plain dicts (much cheaper than DataFrame.to_dict('records'))."""
+    columns = list(frame.columns)
+    return [dict(zip(columns, values)) for values in zip(*(frame[column].tolist() for column in columns))]
 
 class LabReportsService:
     def __init__(self):
         self.supabase = get_supabase_client()
+        self.patient_service = PatientService()
+        self.lab_results_service = LabResultsService()
+        self.extraction_service = DocumentExtractionService()
+        self.document_index = DocumentIndexService()
 
-    def create_lab_report(self, report_data, user_id):
+    def create_lab_report(self, report_data, user_id, report_id=None):
         try:
-            # Generate unique ID
-            report_id = str(uuid.uuid4())
-            
-            # Debug: print the received data
-            print(f"Creating lab report with data: {report_data}")
-            
-            # Prepare data for insertion
-            lab_report_data = {
-                'id': report_id,
-                'patient_id': report_data['patientId'],
-                'test_type': report_data['testType'],
-                'test_name': report_data['testName'],
-                'order_date': report_data.get('orderDate'),
-                'collection_date': report_data['collectionDate'],
-                'result_date': report_data['resultDate'],
-                'status': report_data.get('status', 'completed'),
-                'priority': report_data.get('priority', 'normal'),
-                'notes': report_data.get('notes', ''),
-                'test_results': report_data.get('results', []),  # Store as JSONB
-                'created_by': user_id,
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
-
-            print(f"Inserting lab report data: {lab_report_data}")
+            lab_report_data = self._build_report_row(report_data, user_id)
+            if report_id:
+                # Idempotent request: a retry that reached another worker
+                # collides on this id and gets the stored report back
+                lab_report_data['id'] = report_id
 
             # Insert into database
-            result = self.supabase.table('lab_reports').insert(lab_report_data).execute()
+            try:
+                result = self.supabase.table('lab_reports').insert(lab_report_data).execute()
+            except Exception as e:
+                if not (report_id and is_duplicate_key_error(e)):
+                    raise
+                result = self.supabase.table('lab_reports').select('*').eq('id', report_id).execute()
+                if result.data:
+                    return {
+                        'success': True,
+                        'report': result.data[0],
+                        'message': 'Lab report already created'
+                    }
+                raise
             
             if result.data:
+                self._index_results(result.data[:1])
                 return {
                     'success': True,
                     'report': result.data[0],
@@ -63,40 +150,94 @@ class LabReportsService:
                 'error': f'Database error: {str(e)}'
             }
 
-    def get_lab_reports(self, patient_id=None):
+    def _build_report_row(self, report_data, user_id):
+        """Map a camelCase report payload onto a lab_reports row."""
+        now = datetime.now().isoformat()
+        row = {
+            'id': str(uuid.uuid4()),
+            'patient_id': report_data['patientId'],
+            'test_type': report_data['testType'],
+            'test_name': report_data['testName'],
+            'order_date': report_data.get('orderDate'),
+            'collection_date': report_data['collectionDate'],
+            'result_date': report_data['resultDate'],
+            'status': report_data.get('status', 'completed'),
+            'priority': report_data.get('priority', 'normal'),
+            'notes': report_data.get('notes', ''),
+            'test_results': report_data.get('results', []),  # Store as JSONB
+            'created_by': user_id,
+            'created_at': now,
+            'updated_at': now
+        }
+        # Only file uploads carry these; other inserts leave the columns out
+        for key, column in (('fileUrl', 'file_url'), ('filePath', 'file_path'), ('fileHash', 'file_hash')):
+            if report_data.get(key):
+                row[column] = report_data[key]
+        return row
+
+    def get_lab_reports(self, patient_id=None, filters=None, cursor=None, limit=None, view='full'):
+        """List lab reports, newest first.
+
+        Without a limit every report is returned (original behaviour). With a
+        limit, pages are cut with a keyset cursor on (created_at, id) and the
+        response carries next_cursor. view='summary' omits test_results.
+        """
         try:
-            query = self.supabase.table('lab_reports').select('''
-                *,
-                patients:patient_id(id, name, patient_id, room)
-            ''')
+            columns = LAB_REPORT_SUMMARY_COLUMNS if view == 'summary' else '*'
+            query = self.supabase.table('lab_reports').select(f'{columns}, {LAB_REPORT_PATIENT_EMBED}')
             
             if patient_id:
                 query = query.eq('patient_id', patient_id)
             
-            result = query.order('created_at', desc=True).execute()
+            for field, value in (filters or {}).items():
+                if not value:
+                    continue
+                if field in LAB_REPORT_LIST_FILTERS:
+                    values = [v.strip() for v in str(value).split(',') if v.strip()]
+                    query = query.eq(field, values[0]) if len(values) == 1 else query.in_(field, values)
+                elif field == 'date_from':
+                    query = query.gte('collection_date', value)
+                elif field == 'date_to':
+                    query = query.lte('collection_date', value)
             
-            if result.data:
-                # Format the data to include patient info at the top level
-                formatted_reports = []
-                for report in result.data:
-                    formatted_report = dict(report)
-                    if report.get('patients'):
-                        formatted_report['patient_name'] = report['patients']['name']
-                        formatted_report['patient_id_display'] = report['patients']['patient_id']
-                        formatted_report['patient_room'] = report['patients'].get('room', 'N/A')
-                    
-                    formatted_reports.append(formatted_report)
-                
-                return {
-                    'success': True,
-                    'reports': formatted_reports
-                }
-            else:
-                return {
-                    'success': True,
-                    'reports': []
-                }
+            if cursor:
+                created_at, last_id = _decode_list_cursor(cursor)
+                query = query.or_(
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})'
+                )
+            
+            query = query.order('created_at', desc=True).order('id', desc=True)
+            if limit:
+                # One extra row tells us whether another page exists
+                query = query.limit(limit + 1)
+            
+            result = query.execute()
+            reports = result.data or []
+            
+            next_cursor = None
+            if limit and len(reports) > limit:
+                reports = reports[:limit]
+                next_cursor = _encode_list_cursor(reports[-1])
+            
+            # Format the data to include patient info at the top level
+            # (rows are updated in place so the list is not copied)
+            for report in reports:
+                if report.get('patients'):
+                    report['patient_name'] = report['patients']['name']
+                    report['patient_id_display'] = report['patients']['patient_id']
+                    report['patient_room'] = report['patients'].get('room', 'N/A')
+            
+            return {
+                'success': True,
+                'reports': reports,
+                'next_cursor': next_cursor
+            }
 
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': f'Invalid cursor: {str(e)}'
+            }
         except Exception as e:
             print(f"Error fetching lab reports: {str(e)}")
             return {
@@ -106,10 +247,9 @@ class LabReportsService:
 
     def get_lab_report_by_id(self, report_id):
         try:
-            result = self.supabase.table('lab_reports').select('''
-                *,
-                patients:patient_id(id, name, patient_id, room)
-            ''').eq('id', report_id).execute()
+            result = self.supabase.table('lab_reports').select(
+                f'*, {LAB_REPORT_PATIENT_EMBED}'
+            ).eq('id', report_id).execute()
             
             if result.data:
                 return {
@@ -136,6 +276,11 @@ class LabReportsService:
             result = self.supabase.table('lab_reports').update(update_data).eq('id', report_id).execute()
             
             if result.data:
+                if 'test_results' in update_data or 'collection_date' in update_data:
+                    try:
+                        self.lab_results_service.reindex_report(result.data[0])
+                    except Exception as e:
+                        print(f"Error re-indexing lab results for report {report_id}: {str(e)}")
                 return {
                     'success': True,
                     'report': result.data[0],
@@ -157,6 +302,7 @@ class LabReportsService:
     def delete_lab_report(self, report_id):
         try:
             result = self.supabase.table('lab_reports').delete().eq('id', report_id).execute()
+            invalidate_patient_trends(report['patient_id'] for report in result.data or [])
             
             return {
                 'success': True,
@@ -170,14 +316,16 @@ class LabReportsService:
                 'error': f'Database error: {str(e)}'
             }
 
-    def process_csv_upload(self, file, user_id):
+    def process_csv_upload(self, file, user_id, chunked=False, import_id=None):
+        if chunked or import_id:
+            return self._process_csv_in_chunks(file, user_id, import_id)
+        
         try:
-            # Read CSV file
-            df = pd.read_csv(file)
+            # Read CSV file (as text so values such as "5.0" are stored exactly as written)
+            df = pd.read_csv(file, dtype=str)
             
             # Validate CSV structure - patient_id is now mandatory in CSV
-            required_columns = ['patient_id', 'test_type', 'test_name', 'collection_date', 'result_date']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in CSV_REQUIRED_COLUMNS if col not in df.columns]
             
             if missing_columns:
                 return {
@@ -186,67 +334,21 @@ class LabReportsService:
                 }
             
             # Validate patient_id is not null/empty in any row
-            if df['patient_id'].isnull().any() or (df['patient_id'] == '').any():
-                null_rows = df[df['patient_id'].isnull() | (df['patient_id'] == '')].index.tolist()
+            df['patient_id'] = df['patient_id'].str.strip()
+            empty_patient = df['patient_id'].isnull() | (df['patient_id'] == '')
+            if empty_patient.any():
+                null_rows = df.index[empty_patient].tolist()
                 return {
                     'success': False,
                     'error': f'patient_id is mandatory and cannot be empty. Found empty patient_id in rows: {[r+2 for r in null_rows]}'
                 }
             
-            # Group rows by test (same patient_id, test_type, test_name, collection_date)
-            grouped_reports = {}
-            created_reports = []
-            errors = []
+            # Resolve patient UUIDs / MRNs up front so unknown patients never reach an insert
+            df, errors = self._resolve_csv_patients(df, {})
             
-            for index, row in df.iterrows():
-                try:
-                    # Validate patient_id for this row
-                    if pd.isna(row['patient_id']) or str(row['patient_id']).strip() == '':
-                        errors.append(f"Row {index + 1}: patient_id is required and cannot be empty")
-                        continue
-                    
-                    patient_id = str(row['patient_id']).strip()
-                    test_key = f"{patient_id}_{row['test_type']}_{row['test_name']}_{row['collection_date']}"
-                    
-                    if test_key not in grouped_reports:
-                        grouped_reports[test_key] = {
-                            'patientId': patient_id,  # Use patient_id from CSV
-                            'testType': row['test_type'],  # Map to camelCase
-                            'testName': row['test_name'],  # Map to camelCase
-                            'orderDate': row.get('order_date') if pd.notna(row.get('order_date')) else None,  # Map to camelCase
-                            'collectionDate': row['collection_date'],  # Map to camelCase
-                            'resultDate': row['result_date'],  # Map to camelCase
-                            'status': row.get('status', 'completed'),
-                            'priority': row.get('priority', 'normal'),
-                            'notes': row.get('notes', ''),
-                            'results': []
-                        }
-                    
-                    # Add test parameter if present
-                    if pd.notna(row.get('parameter')) and pd.notna(row.get('value')):
-                        grouped_reports[test_key]['results'].append({
-                            'parameter': str(row['parameter']).strip(),
-                            'value': str(row['value']).strip(),
-                            'unit': str(row.get('unit', '')).strip(),
-                            'normalRange': str(row.get('normal_range', '')).strip(),
-                            'status': str(row.get('result_status', 'normal')).strip()
-                        })
-                        
-                except Exception as e:
-                    errors.append(f"Row {index + 1}: {str(e)}")
-            
-            # Create lab reports
-            for report_data in grouped_reports.values():
-                try:
-                    result = self.create_lab_report(report_data, user_id)
-                    
-                    if result['success']:
-                        created_reports.append(result['report'])
-                    else:
-                        errors.append(f"Report for patient {report_data['patientId']}: {result['error']}")
-                        
-                except Exception as e:
-                    errors.append(f"Report for patient {report_data['patientId']}: {str(e)}")
+            grouped_reports = self._group_csv_reports(df)
+            created_reports, insert_errors, _ = self._insert_reports_in_batches(grouped_reports, user_id)
+            errors.extend(insert_errors)
             
             return {
                 'success': True,
@@ -263,29 +365,401 @@ class LabReportsService:
                 'success': False,
                 'error': f'CSV processing error: {str(e)}'
             }
+
+    def _process_csv_in_chunks(self, file, user_id, import_id=None):
+        """Ingest a CSV in bounded-memory chunks, recording progress in lab_csv_imports.
+
+        Rows of one report must be contiguous in the file for the report to span
+        a chunk boundary (analyser exports are written sorted): the trailing run of
+        rows sharing the last report key is carried into the next chunk. Passing
+        the import_id of a failed import resumes after its last committed chunk.
+        """
+        if import_id:
+            job_result = self.get_csv_import(import_id)
+            if not job_result['success']:
+                return job_result
+            job = job_result['import']
+            if job['status'] == 'completed':
+                return {
+                    'success': True,
+                    'message': 'CSV import already completed',
+                    'data': self._csv_import_summary(job)
+                }
+        else:
+            job = self._create_csv_import(getattr(file, 'filename', None), user_id)
+            if not job:
+                return {
+                    'success': False,
+                    'error': 'Failed to start CSV import'
+                }
+        
+        import_id = job['id']
+        rows_committed = job.get('rows_committed') or 0
+        progress = {
+            'rows_committed': rows_committed,
+            'reports_created': job.get('reports_created') or 0,
+            'chunks_committed': job.get('chunks_committed') or 0,
+            'errors': list(job.get('errors') or []),
+            'error_count': len(job.get('errors') or [])
+        }
+        carry = None  # trailing rows of a report that may continue in the next chunk
+        row_offset = rows_committed
+        resolved_patients = {}  # patient reference -> UUID, shared across chunks
+        
+        try:
+            reader = pd.read_csv(
+                file,
+                dtype=str,
+                chunksize=LAB_CSV_CHUNK_ROWS,
+                skiprows=range(1, rows_committed + 1) if rows_committed else None
+            )
+            
+            for chunk in reader:
+                if carry is None and row_offset == rows_committed:
+                    missing_columns = [col for col in CSV_REQUIRED_COLUMNS if col not in chunk.columns]
+                    if missing_columns:
+                        self._update_csv_import(import_id, {'status': 'failed'})
+                        return {
+                            'success': False,
+                            'error': f'Missing required columns: {", ".join(missing_columns)}. patient_id is mandatory in CSV!'
+                        }
+                
+                # Index rows by their position in the file so errors and resume offsets line up
+                chunk.index = pd.RangeIndex(row_offset, row_offset + len(chunk))
+                row_offset += len(chunk)
+                df = chunk if carry is None else pd.concat([carry, chunk])
+                
+                df['patient_id'] = df['patient_id'].str.strip()
+                empty_patient = df['patient_id'].isnull() | (df['patient_id'] == '')
+                self._add_import_errors(progress, [
+                    f"Row {index + 1}: patient_id is required and cannot be empty" for index in df.index[empty_patient]
+                ])
+                df = df[~empty_patient]
+                
+                # Rows in carry were already resolved, so only new references hit the database
+                df, patient_errors = self._resolve_csv_patients(df, resolved_patients)
+                self._add_import_errors(progress, patient_errors)
+                
+                if df.empty:
+                    carry = None
+                    continue
+                
+                keys = df[CSV_GROUP_COLUMNS].fillna('').to_numpy()
+                same_as_last = (keys == keys[-1]).all(axis=1)
+                tail_start = len(same_as_last) - int(np.argmin(same_as_last[::-1])) if not same_as_last.all() else 0
+                carry = df.iloc[tail_start:]
+                
+                if tail_start:
+                    self._commit_csv_chunk(df.iloc[:tail_start], user_id, import_id, int(carry.index[0]), progress)
+            
+            if carry is not None and not carry.empty:
+                self._commit_csv_chunk(carry, user_id, import_id, row_offset, progress)
+            
+            self._update_csv_import(import_id, {'status': 'completed', 'rows_committed': row_offset})
+            return {
+                'success': True,
+                'message': f'Successfully created {progress["reports_created"]} lab reports{". Errors: " + str(progress["error_count"]) if progress["error_count"] else ""}',
+                'data': {
+                    'import_id': import_id,
+                    'reports_created': progress['reports_created'],
+                    'rows_processed': row_offset,
+                    'errors': progress['errors']
+                }
+            }
             
         except Exception as e:
-            print(f"Error processing CSV upload: {str(e)}")
+            print(f"Error processing chunked CSV upload {import_id}: {str(e)}")
+            try:
+                self._update_csv_import(import_id, {'status': 'failed'})
+            except Exception:
+                pass
             return {
                 'success': False,
-                'error': f'CSV processing error: {str(e)}'
+                'error': f'CSV processing error after {progress["rows_committed"]} rows: {str(e)}. '
+                         f'Re-upload the file with import_id={import_id} to resume.',
+                'data': {
+                    'import_id': import_id,
+                    'rows_committed': progress['rows_committed'],
+                    'reports_created': progress['reports_created']
+                }
+            }
+
+    def _commit_csv_chunk(self, df, user_id, import_id, rows_committed, progress):
+        """Insert one chunk's reports and persist the resume point after it.
+        
+        Rows the database refuses are recorded as errors and the import moves
+        on; an outage raises, leaving the resume point before this chunk.
+        """
+        grouped_reports = self._group_csv_reports(df)
+        report_ids = [str(uuid.uuid5(CSV_REPORT_ID_NAMESPACE, f"{import_id}:{report['sourceRow']}"))
+                      for report in grouped_reports]
+        created_reports, errors, duplicates = self._insert_reports_in_batches(grouped_reports, user_id, report_ids,
+                                                                              raise_on_outage=True)
+        
+        # Duplicates were written by an earlier attempt at this chunk
+        self._add_import_errors(progress, errors)
+        progress['reports_created'] += len(created_reports) + len(duplicates)
+        progress['chunks_committed'] += 1
+        progress['rows_committed'] = rows_committed
+        self._update_csv_import(import_id, {
+            'status': 'processing',
+            'rows_committed': progress['rows_committed'],
+            'reports_created': progress['reports_created'],
+            'chunks_committed': progress['chunks_committed'],
+            'errors': progress['errors']
+        })
+
+    @staticmethod
+    def _add_import_errors(progress, errors):
+        """Count every error but keep only the first MAX_STORED_IMPORT_ERRORS."""
+        progress['error_count'] += len(errors)
+        room = MAX_STORED_IMPORT_ERRORS - len(progress['errors'])
+        if room > 0:
+            progress['errors'].extend(errors[:room])
+
+    def _create_csv_import(self, file_name, user_id):
+        now = datetime.now().isoformat()
+        result = self.supabase.table('lab_csv_imports').insert({
+            'id': str(uuid.uuid4()),
+            'file_name': file_name,
+            'status': 'processing',
+            'rows_committed': 0,
+            'reports_created': 0,
+            'chunks_committed': 0,
+            'errors': [],
+            'created_by': user_id,
+            'created_at': now,
+            'updated_at': now
+        }).execute()
+        return result.data[0] if result.data else None
+
+    def _update_csv_import(self, import_id, fields):
+        fields['updated_at'] = datetime.now().isoformat()
+        self.supabase.table('lab_csv_imports').update(fields).eq('id', import_id).execute()
+
+    def _csv_import_summary(self, job):
+        return {
+            'import_id': job['id'],
+            'status': job['status'],
+            'rows_committed': job.get('rows_committed') or 0,
+            'reports_created': job.get('reports_created') or 0,
+            'chunks_committed': job.get('chunks_committed') or 0,
+            'errors': job.get('errors') or []
+        }
+
+    def get_csv_import(self, import_id):
+        try:
+            result = self.supabase.table('lab_csv_imports').select('*').eq('id', import_id).execute()
+            
+            if result.data:
+                return {
+                    'success': True,
+                    'import': result.data[0]
+                }
+            else:
+                return {
+                    'success': False,
+                    'error': 'CSV import not found'
+                }
+
+        except Exception as e:
+            print(f"Error fetching CSV import: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Database error: {str(e)}'
+            }
+
+    def _resolve_csv_patients(self, df, resolved):
+        """Replace patient references (UUID or MRN) with patient UUIDs and drop unknown patients.
+
+        resolved caches lookups between calls; returns the filtered frame and one
+        error per unknown reference listing the affected rows.
+        """
+        references = df['patient_id'].unique().tolist()
+        unresolved = [ref for ref in references if ref not in resolved]
+        if unresolved:
+            success, message, mapping = self.patient_service.resolve_patient_references(unresolved)
+            if not success:
+                raise RuntimeError(message)
+            resolved.update(mapping)
+            # Patient UUIDs map to themselves, so a carried row is never looked up twice
+            resolved.update({patient_uuid: patient_uuid for patient_uuid in mapping.values()})
+            for ref in unresolved:
+                resolved.setdefault(ref, None)
+        
+        patient_uuids = df['patient_id'].map(resolved)
+        unknown = patient_uuids.isna()
+        errors = []
+        if unknown.any():
+            unknown_rows = pd.Series(df.index[unknown], index=df.index[unknown]).groupby(df['patient_id'][unknown])
+            for ref, rows in unknown_rows:
+                row_numbers = [index + 1 for index in rows.tolist()]
+                shown = ', '.join(str(row) for row in row_numbers[:10])
+                more = f' and {len(row_numbers) - 10} more' if len(row_numbers) > 10 else ''
+                errors.append(f"Rows {shown}{more}: patient '{ref}' not found (use the patient UUID or medical record number)")
+        
+        df = df.loc[~unknown]
+        return df.assign(patient_id=patient_uuids[~unknown]), errors
+
+    def _group_csv_reports(self, df):
+        """Group CSV rows into report payloads (same patient_id, test_type, test_name, collection_date).
+
+        Report-level fields come from the first row of each group, matching the
+        row-by-row behaviour this replaced; parameter rows become the results list.
+        """
+        # Missing optional columns behave like empty cells
+        missing_optional = [column for column in CSV_OPTIONAL_COLUMNS if column not in df.columns]
+        if missing_optional:
+            df = df.assign(**{column: None for column in missing_optional})
+        df = df.astype(object).where(df.notna(), None)
+        
+        group_ids = df.groupby(CSV_GROUP_COLUMNS, sort=False, dropna=False).ngroup().to_numpy()
+        first_rows = df.loc[~pd.Series(group_ids, index=df.index).duplicated()]
+        
+        grouped_reports = [
+            {
+                'patientId': row['patient_id'],
+                'testType': row['test_type'],
+                'testName': row['test_name'],
+                'orderDate': row['order_date'],
+                'collectionDate': row['collection_date'],
+                'resultDate': row['result_date'],
+                'status': row['status'] or 'completed',
+                'priority': row['priority'] or 'normal',
+                'notes': row['notes'] or '',
+                'results': [],
+                'sourceRow': int(source_row)
             }
+            for source_row, row in zip(first_rows.index, _frame_records(first_rows))
+        ]
+        
+        # Build all result entries at once, then attach them to their group
+        has_result = (df['parameter'].notna() & df['value'].notna()).to_numpy()
+        if has_result.any():
+            results = df.loc[has_result, ['parameter', 'value', 'unit', 'normal_range', 'result_status']]
+            results = pd.DataFrame({
+                'parameter': results['parameter'].str.strip(),
+                'value': results['value'].str.strip(),
+                'unit': results['unit'].fillna('').str.strip(),
+                'normalRange': results['normal_range'].fillna('').str.strip(),
+                'status': results['result_status'].fillna('normal').str.strip()
+            })
+            for group_id, result in zip(group_ids[has_result], _frame_records(results)):
+                grouped_reports[group_id]['results'].append(result)
+        
+        return grouped_reports
+
+    def import_lab_reports(self, reports, user_id, report_ids=None):
+        """Create many reports (create_lab_report payloads) at once; returns (created_reports, errors, duplicates).
+        
+        report_ids (one per report) makes re-imports collide on the primary key;
+        the reports that did are returned in duplicates.
+        """
+        return self._insert_reports_in_batches(reports, user_id, report_ids)
+
+    def _insert_reports_in_batches(self, grouped_reports, user_id, report_ids=None, raise_on_outage=False):
+        """Insert report payloads with multi-row inserts; returns (created_reports, errors, duplicates).
+        
+        With report_ids, reports whose id is already taken are returned in
+        duplicates (the payloads) rather than as errors. With raise_on_outage, an error that is not about the rows themselves
+        (see is_data_error) is raised instead of being recorded per report;
+        reports inserted before it are still indexed.
+        """
+        created_reports = []
+        errors = []
+        duplicates = []
+        
+        try:
+            for start in range(0, len(grouped_reports), LAB_REPORT_INSERT_BATCH_SIZE):
+                batch = grouped_reports[start:start + LAB_REPORT_INSERT_BATCH_SIZE]
+                rows = [self._build_report_row(report_data, user_id) for report_data in batch]
+                if report_ids:
+                    for row, report_id in zip(rows, report_ids[start:start + LAB_REPORT_INSERT_BATCH_SIZE]):
+                        row['id'] = report_id
+                
+                try:
+                    result = self.supabase.table('lab_reports').insert(rows).execute()
+                    created_reports.extend(result.data or [])
+                    continue
+                except Exception as e:
+                    if raise_on_outage and not is_data_error(e):
+                        raise
+                    print(f"Batch insert of {len(rows)} lab reports failed, retrying per report: {str(e)}")
+                
+                # One bad row fails the whole statement; retry individually so
+                # errors are reported per report as before
+                for report_data, row in zip(batch, rows):
+                    try:
+                        result = self.supabase.table('lab_reports').insert(row).execute()
+                        if result.data:
+                            created_reports.append(result.data[0])
+                        else:
+                            errors.append(f"Report for patient {report_data['patientId']}: Failed to create lab report - no data returned")
+                    except Exception as e:
+                        if raise_on_outage and not is_data_error(e):
+                            raise
+                        if report_ids and is_duplicate_key_error(e):
+                            duplicates.append(report_data)
+                        else:
+                            errors.append(f"Report for patient {report_data['patientId']}: Database error: {str(e)}")
+        finally:
+            self._index_results(created_reports)
+        
+        return created_reports, errors, duplicates
+
+    def _index_results(self, reports):
+        """Mirror stored reports into lab_results; the report itself is already saved."""
+        try:
+            self.lab_results_service.index_reports(reports)
+        except Exception as e:
+            print(f"Error indexing lab results for {len(reports)} reports: {str(e)}")
 
     def upload_file_to_storage(self, file, patient_id, user_id):
         try:
-            # Generate unique filename
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            file_path = f"lab-reports/{patient_id}/{unique_filename}"
-            
-            # Upload to Supabase storage
-            file_data = file.read()
-            
-            result = self.supabase.storage.from_('medical-files').upload(
-                file_path, 
-                file_data,
-                file_options={"content-type": file.content_type}
-            )
+            # Spool the upload to disk in chunks, hashing as it goes; the bucket
+            # upload then streams from the file instead of holding it in memory
+            with tempfile.NamedTemporaryFile(prefix='lab-upload-', delete=False) as spool:
+                file_hash = copy_and_hash(file.stream, spool)
+            
+            try:
+                return self.store_file(spool.name, file.filename, file.content_type, patient_id, user_id,
+                                       file_hash=file_hash)
+            finally:
+                os.remove(spool.name)
+                
+        except Exception as e:
+            print(f"Error uploading file to storage: {str(e)}")
+            return {
+                'success': False,
+                'error': f'File upload error: {str(e)}'
+            }
+
+    def store_file(self, local_path, filename, content_type, patient_id, user_id, file_hash=None):
+        """Stream a file from local disk into the medical-files bucket and record a lab report for it.
+
+        Files are content-addressed: if the patient already has a report for the
+        same bytes, that report is returned (with duplicate=True) and nothing is
+        stored or created again.
+        """
+        try:
+            filename = secure_filename(filename)
+            file_hash = file_hash or hash_file(local_path)
+            
+            existing = self._find_report_by_file_hash(patient_id, file_hash)
+            if existing:
+                return self._duplicate_upload_result(existing)
+            
+            extension = os.path.splitext(filename)[1].lower()
+            file_path = f"lab-reports/{patient_id}/{file_hash}{extension}"
+            
+            # Upload to Supabase storage (the open file is sent in chunks). Upsert,
+            # since the object outlives a deleted report and may already be there
+            with open(local_path, 'rb') as file_data:
+                result = self.supabase.storage.from_(LAB_FILES_BUCKET).upload(
+                    file_path, 
+                    file_data,
+                    file_options={"content-type": content_type or 'application/octet-stream', "x-upsert": "true"}
+                )
             
             if hasattr(result, 'error') and result.error:
                 return {
@@ -293,8 +767,10 @@ class LabReportsService:
                     'error': f'File upload failed: {result.error.message}'
                 }
             
-            # Get public URL
-            file_url = self.supabase.storage.from_('medical-files').get_public_url(file_path)
+            # Get public URL (a plain string in current storage clients)
+            file_url = self.supabase.storage.from_(LAB_FILES_BUCKET).get_public_url(file_path)
+            if not isinstance(file_url, str):
+                file_url = file_url.data.get('publicUrl') if hasattr(file_url, 'data') else None
             
             # Create a basic lab report entry for the uploaded file
             report_data = {
@@ -307,27 +783,60 @@ class LabReportsService:
                 'priority': 'normal',
                 'notes': f'Uploaded file: {filename}',
                 'results': [],
-                'file_url': file_url.data.get('publicUrl') if hasattr(file_url, 'data') else None
+                'fileUrl': file_url,
+                'filePath': file_path,
+                'fileHash': file_hash
             }
             
             # Create the lab report record
             lab_result = self.create_lab_report(report_data, user_id)
             
             if lab_result['success']:
+                # Index the file and extract its text in the background now
+                # rather than at insight time
+                self.document_index.register(LAB_FILES_BUCKET, file_path, patient_id,
+                                             size_bytes=os.path.getsize(local_path), content_hash=file_hash)
+                self.extraction_service.enqueue(LAB_FILES_BUCKET, file_path, patient_id, file_hash)
                 return {
                     'success': True,
                     'message': 'File uploaded successfully',
                     'data': {
-                        'file_url': file_url.data.get('publicUrl') if hasattr(file_url, 'data') else None,
+                        'file_url': file_url,
+                        'file_hash': file_hash,
+                        'duplicate': False,
                         'report': lab_result['report']
                     }
                 }
-            else:
-                return lab_result
+            
+            # A concurrent upload of the same bytes won the unique index
+            existing = self._find_report_by_file_hash(patient_id, file_hash)
+            if existing:
+                return self._duplicate_upload_result(existing)
+            return lab_result
                 
         except Exception as e:
             print(f"Error uploading file to storage: {str(e)}")
             return {
                 'success': False,
                 'error': f'File upload error: {str(e)}'
-            }
\ No newline at end of file
+            }
+
+    def _find_report_by_file_hash(self, patient_id, file_hash):
+        result = self.supabase.table('lab_reports').select('*') \
+            .eq('patient_id', patient_id) \
+            .eq('file_hash', file_hash) \
+            .limit(1) \
+            .execute()
+        return result.data[0] if result.data else None
+
+    def _duplicate_upload_result(self, report):
+        return {
+            'success': True,
+            'message': 'File already uploaded for this patient',
+            'data': {
+                'file_url': report.get('file_url'),
+                'file_hash': report.get('file_hash'),
+                'duplicate': True,
+                'report': report
+            }
+        }
@@ -0,0 +1,344 @@
+from app.utils.database import get_supabase_client
+from app.utils.cache import TTLCache
+from app.utils.idempotency import is_data_error
+import math
+import numpy as np
+import re
+import threading
+
+# Result rows per multi-row insert
+LAB_RESULT_INSERT_BATCH_SIZE = 1000
+
+# lab_results text column widths (create_lab_results_table.sql); longer values are cut
+LAB_RESULT_COLUMN_WIDTHS = {'parameter': 150, 'parameter_key': 150, 'value_text': 100,
+                            'unit': 50, 'normal_range': 100, 'status': 30}
+
+# Upper bound on rows returned by result queries
+MAX_RESULT_QUERY_LIMIT = 5000
+
+# Rows read when computing a patient's trend series
+MAX_TREND_ROWS = 20000
+
+# A value this far outside its reference range, as a fraction of the range width
+# (or of the bound for one-sided ranges), is flagged critical
+CRITICAL_RANGE_FRACTION = 0.5
+
+# Computed series per patient; dropped whenever a report for the patient is
+# written, the TTL only bounds staleness across worker processes
+TREND_CACHE_TTL_SECONDS = 600
+_trend_cache = TTLCache(maxsize=2048, ttl=TREND_CACHE_TTL_SECONDS)
+# Bumped by every invalidation, so a fill that read lab_results before a write
+# landed cannot cache its now-stale series afterwards
+_trend_generations = {}
+_trend_generations_lock = threading.Lock()
+
+NUMBER_PATTERN = re.compile(r'[-+]?\d+(?:\.\d+)?')
+RANGE_PATTERN = re.compile(r'^\s*([-+]?\d+(?:\.\d+)?)\s*(?:-|–|to)\s*([-+]?\d+(?:\.\d+)?)\s*$', re.IGNORECASE)
+BOUND_PATTERN = re.compile(r'^\s*(<=|>=|<|>|≤|≥)\s*([-+]?\d+(?:\.\d+)?)\s*$')
+
+
+def normalize_parameter(parameter):
+    """Key used to match a parameter across reports ("Potassium ", "potassium" -> "potassium")."""
+    return re.sub(r'\s+', ' ', str(parameter or '')).strip().lower()
+
+
+def parse_numeric_value(value):
+    """Numeric part of a result value ("5.6", "<0.5", "1,200 cells") or None."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            number = float(value)
+        else:
+            match = NUMBER_PATTERN.search(str(value).replace(',', ''))
+            number = float(match.group()) if match else None
+    except OverflowError:
+        return None
+    # Absurdly long digit strings overflow to inf, which JSON cannot carry
+    return number if number is not None and math.isfinite(number) else None
+
+
+def parse_reference_range(normal_range):
+    """Parse a reference range such as "3.5-5.1", "<5" or ">=60" into (low, high)."""
+    if not normal_range:
+        return None, None
+    text = str(normal_range).replace(',', '')
+    match = RANGE_PATTERN.match(text)
+    if match:
+        return _finite(float(match.group(1))), _finite(float(match.group(2)))
+    match = BOUND_PATTERN.match(text)
+    if match:
+        bound = _finite(float(match.group(2)))
+        if match.group(1) in ('<', '<=', '≤'):
+            return None, bound
+        return bound, None
+    return None, None
+
+
+def _finite(number):
+    return number if math.isfinite(number) else None
+
+
+def build_result_rows(report):
+    """Normalised lab_results rows for a stored lab_reports row, cut to fit the table."""
+    rows = []
+    if not report.get('collection_date'):
+        # collected_at is NOT NULL; such a report has nothing to index by
+        return rows
+    for result in report.get('test_results') or []:
+        parameter = str(result.get('parameter') or '').strip()
+        if not parameter:
+            continue
+        ref_low, ref_high = parse_reference_range(result.get('normalRange'))
+        value = result.get('value')
+        rows.append({
+            'report_id': report['id'],
+            'patient_id': report['patient_id'],
+            'parameter': parameter,
+            'parameter_key': normalize_parameter(parameter),
+            'value_text': None if value is None else str(value),
+            'value_numeric': parse_numeric_value(value),
+            'unit': result.get('unit') or None,
+            'normal_range': result.get('normalRange') or None,
+            'ref_low': ref_low,
+            'ref_high': ref_high,
+            'status': result.get('status') or None,
+            'collected_at': report.get('collection_date')
+        })
+    for row in rows:
+        for column, width in LAB_RESULT_COLUMN_WIDTHS.items():
+            if row[column] is not None and len(row[column]) > width:
+                row[column] = row[column][:width]
+    return rows
+
+
+def _float_array(rows, key):
+    return np.array([row.get(key) if row.get(key) is not None else np.nan for row in rows], dtype=float)
+
+
+def _nullable(array):
+    """Array -> list with NaN replaced by None (JSON null)."""
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+def compute_result_flags(values, ref_low, ref_high):
+    """Vectorised flags for arrays of values and reference bounds (NaN where unknown).
+
+    Returns an object array of 'normal', 'low', 'high', 'critical_low',
+    'critical_high' or 'unknown' (no numeric value or no reference range).
+    """
+    with np.errstate(invalid='ignore'):
+        span = ref_high - ref_low
+        one_sided = np.where(np.isnan(ref_high), np.abs(ref_low), np.abs(ref_high))
+        margin = np.where(np.isnan(span), one_sided, span) * CRITICAL_RANGE_FRACTION
+        low = values < ref_low
+        high = values > ref_high
+        critical_low = values < ref_low - margin
+        critical_high = values > ref_high + margin
+
+    flags = np.full(values.shape, 'normal', dtype=object)
+    flags[np.isnan(values) | (np.isnan(ref_low) & np.isnan(ref_high))] = 'unknown'
+    flags[low] = 'low'
+    flags[high] = 'high'
+    flags[critical_low] = 'critical_low'
+    flags[critical_high] = 'critical_high'
+    return flags
+
+
+def build_trend_series(rows):
+    """Group lab_results rows into per-parameter time series with flags and deltas.
+
+    Flags and deltas are computed with NumPy over all parameters at once; a
+    delta is the change from the previous result of the same parameter.
+    """
+    if not rows:
+        return {}
+
+    keys = np.array([row['parameter_key'] for row in rows], dtype=object)
+    collected = np.array([str(row.get('collected_at') or '') for row in rows], dtype=object)
+    order = np.lexsort((collected, keys))
+    rows = [rows[i] for i in order]
+    keys = keys[order]
+
+    values = _float_array(rows, 'value_numeric')
+    ref_low = _float_array(rows, 'ref_low')
+    ref_high = _float_array(rows, 'ref_high')
+    flags = compute_result_flags(values, ref_low, ref_high)
+
+    same_parameter = np.concatenate(([False], keys[1:] == keys[:-1]))
+    previous = np.concatenate(([np.nan], values[:-1]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        deltas = np.where(same_parameter, values - previous, np.nan)
+        percent = np.where(same_parameter & (previous != 0), deltas / np.abs(previous) * 100, np.nan)
+
+    values_list = _nullable(values)
+    low_list = _nullable(ref_low)
+    high_list = _nullable(ref_high)
+    delta_list = _nullable(np.round(deltas, 4))
+    percent_list = _nullable(np.round(percent, 2))
+    flag_list = flags.tolist()
+
+    boundaries = np.flatnonzero(~same_parameter).tolist() + [len(rows)]
+    series = {}
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        points = [
+            {
+                'collected_at': rows[i].get('collected_at'),
+                'report_id': rows[i].get('report_id'),
+                'value': values_list[i],
+                'value_text': rows[i].get('value_text'),
+                'ref_low': low_list[i],
+                'ref_high': high_list[i],
+                'flag': flag_list[i],
+                'reported_status': rows[i].get('status'),
+                'delta': delta_list[i],
+                'delta_percent': percent_list[i]
+            }
+            for i in range(start, end)
+        ]
+        series[keys[start]] = {
+            'parameter': rows[end - 1].get('parameter'),
+            'unit': rows[end - 1].get('unit'),
+            'count': end - start,
+            'latest_flag': flag_list[end - 1],
+            'abnormal_count': sum(1 for flag in flag_list[start:end] if flag not in ('normal', 'unknown')),
+            'points': points
+        }
+    return series
+
+
+def invalidate_patient_trends(patient_ids):
+    """Drop cached trend series after reports for these patients changed."""
+    with _trend_generations_lock:
+        for patient_id in set(patient_ids):
+            _trend_generations[patient_id] = _trend_generations.get(patient_id, 0) + 1
+            _trend_cache.pop(patient_id)
+
+
+def _cache_patient_trends(patient_id, series, generation):
+    """Cache series read at generation, unless the patient was invalidated since."""
+    with _trend_generations_lock:
+        if _trend_generations.get(patient_id, 0) == generation:
+            _trend_cache.set(patient_id, series)
+
+
+class LabResultsService:
+    """Normalised, indexed per-parameter lab results (mirrors lab_reports.test_results)."""
+
+    def __init__(self):
+        self.supabase = get_supabase_client()
+
+    def index_reports(self, reports):
+        """Write result rows for newly stored reports. Returns the number of rows written.
+        
+        A batch refused for its data is retried row by row, so one bad result
+        only loses itself; rows that still fail are logged with their report.
+        Other errors (outages) raise.
+        """
+        rows = []
+        for report in reports:
+            rows.extend(build_result_rows(report))
+
+        written = 0
+        try:
+            for start in range(0, len(rows), LAB_RESULT_INSERT_BATCH_SIZE):
+                batch = rows[start:start + LAB_RESULT_INSERT_BATCH_SIZE]
+                try:
+                    self.supabase.table('lab_results').insert(batch, returning='minimal').execute()
+                    written += len(batch)
+                    continue
+                except Exception as e:
+                    if not is_data_error(e):
+                        raise
+                    print(f"Batch insert of {len(batch)} lab results failed, retrying per row: {str(e)}")
+                for row in batch:
+                    try:
+                        self.supabase.table('lab_results').insert(row, returning='minimal').execute()
+                        written += 1
+                    except Exception as e:
+                        print(f"Lab result {row['parameter']!r} of report {row['report_id']} not indexed: {str(e)}")
+        finally:
+            invalidate_patient_trends(report['patient_id'] for report in reports)
+        return written
+
+    def reindex_report(self, report):
+        """Replace the result rows of an updated report."""
+        self.supabase.table('lab_results').delete().eq('report_id', report['id']).execute()
+        return self.index_reports([report])
+
+    def query_results(self, parameter, patient_id=None, min_value=None, max_value=None,
+                      start=None, end=None, limit=1000):
+        """Results for one parameter, optionally by patient, value bounds and collection window.
+
+        Served by the (parameter_key, collected_at) and
+        (patient_id, parameter_key, collected_at) indexes.
+        """
+        try:
+            query = self.supabase.table('lab_results').select(
+                'report_id, patient_id, parameter, value_text, value_numeric, unit, '
+                'normal_range, ref_low, ref_high, status, collected_at'
+            ).eq('parameter_key', normalize_parameter(parameter))
+
+            if patient_id:
+                query = query.eq('patient_id', patient_id)
+            if min_value is not None:
+                query = query.gte('value_numeric', min_value)
+            if max_value is not None:
+                query = query.lte('value_numeric', max_value)
+            if start:
+                query = query.gte('collected_at', start)
+            if end:
+                query = query.lte('collected_at', end)
+
+            limit = max(1, min(int(limit or 1000), MAX_RESULT_QUERY_LIMIT))
+            result = query.order('collected_at', desc=True).limit(limit).execute()
+
+            return {
+                'success': True,
+                'results': result.data or []
+            }
+
+        except Exception as e:
+            print(f"Error querying lab results: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Database error: {str(e)}'
+            }
+
+    def get_parameter_trend(self, patient_id, parameter, start=None, end=None, limit=1000):
+        """Time-ordered (oldest first) results of one parameter for a patient."""
+        result = self.query_results(parameter, patient_id=patient_id, start=start, end=end, limit=limit)
+        if result['success']:
+            result['results'].reverse()
+        return result
+
+    def get_patient_trends(self, patient_id, parameters=None):
+        """Per-parameter series for a patient with abnormal/critical flags and deltas (cached)."""
+        try:
+            series = _trend_cache.get(patient_id)
+            if series is None:
+                with _trend_generations_lock:
+                    generation = _trend_generations.get(patient_id, 0)
+                result = self.supabase.table('lab_results').select(
+                    'report_id, parameter, parameter_key, value_text, value_numeric, unit, '
+                    'ref_low, ref_high, status, collected_at'
+                ).eq('patient_id', patient_id).order('collected_at', desc=True).limit(MAX_TREND_ROWS).execute()
+
+                series = build_trend_series(result.data or [])
+                _cache_patient_trends(patient_id, series, generation)
+
+            if parameters:
+                wanted = {normalize_parameter(parameter) for parameter in parameters}
+                series = {key: value for key, value in series.items() if key in wanted}
+
+            return {
+                'success': True,
+                'series': series
+            }
+
+        except Exception as e:
+            print(f"Error building lab trends: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Database error: {str(e)}'
+            }
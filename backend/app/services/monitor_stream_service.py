@@ -0,0 +1,314 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from app.services.patient_service import UUID_PATTERN
+from app.services.vitals_anomaly_service import VitalsAnomalyService
+from app.services.vitals_history_service import parse_timestamp
+from app.utils.cache import TTLCache
+from app.utils.database import get_supabase_client
+from app.utils.idempotency import is_data_error
+
+logger = logging.getLogger(__name__)
+
+# Samples held in memory between the request handlers and the writer. When it
+# is full, handlers block (and stop reading the socket) for up to
+# MONITOR_BACKPRESSURE_SECONDS before giving up on the request with a 503.
+MONITOR_BUFFER_MAX_SAMPLES = int(os.getenv('MONITOR_BUFFER_MAX_SAMPLES', 100000))
+MONITOR_BACKPRESSURE_SECONDS = float(os.getenv('MONITOR_BACKPRESSURE_SECONDS', 5))
+
+# Writer: rows per multi-row insert, longest a sample waits for a batch to fill,
+# and attempts per batch before it is dropped during an outage
+MONITOR_INSERT_BATCH_SIZE = 2000
+MONITOR_FLUSH_INTERVAL_SECONDS = 0.5
+MONITOR_INSERT_ATTEMPTS = 3
+
+MAX_REPORTED_SAMPLE_ERRORS = 20
+
+# Bytes read from the request body at a time (lines are split in memory)
+STREAM_READ_BYTES = 64 * 1024
+
+# vital_samples.device_id is VARCHAR(64)
+MAX_DEVICE_ID_LENGTH = 64
+
+# Wire field -> (vital_samples column, plausible range). Monitors report
+# temperature in Celsius, unlike the charted vital_uploads rows.
+SAMPLE_FIELDS: Dict[str, Tuple[str, float, float]] = {
+    'heart_rate': ('heart_rate', 0, 350),
+    'respiratory_rate': ('respiratory_rate', 0, 120),
+    'oxygen_saturation': ('oxygen_saturation', 0, 100),
+    'blood_pressure_systolic': ('blood_pressure_systolic', 0, 350),
+    'blood_pressure_diastolic': ('blood_pressure_diastolic', 0, 250),
+    'temperature_c': ('temperature_c', 20, 46),
+}
+# Columns stored as SMALLINT; fractional readings are rounded
+INTEGER_SAMPLE_COLUMNS = {column for column, _, _ in SAMPLE_FIELDS.values()} - {'temperature_c'}
+# vital_samples unique key: a resent reading is skipped instead of stored twice
+SAMPLE_CONFLICT_COLUMNS = 'patient_id,recorded_at,device_id'
+
+# Patient ids already confirmed to exist, so a batch never fails on the foreign key
+_known_patients = TTLCache(maxsize=10000, ttl=600)
+
+
+class SampleError(ValueError):
+    pass
+
+
+def iter_ndjson_lines(stream: Any, chunk_size: int = STREAM_READ_BYTES) -> Iterable[bytes]:
+    """Lines of an NDJSON body, read in blocks rather than one readline() per reading."""
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def parse_sample(line: bytes) -> Dict[str, Any]:
+    """One NDJSON monitor reading -> vital_samples row (raises SampleError)."""
+    try:
+        reading = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        raise SampleError('invalid JSON')
+    if not isinstance(reading, dict):
+        raise SampleError('expected a JSON object')
+
+    patient_id = reading.get('patient_id')
+    device_id = reading.get('device_id')
+    if not patient_id or not device_id:
+        raise SampleError('patient_id and device_id are required')
+    # Everything the insert would reject is caught here: one bad row would
+    # otherwise fail the whole multi-row batch, other devices' samples included
+    if not isinstance(patient_id, str) or not UUID_PATTERN.match(patient_id):
+        raise SampleError('patient_id must be a UUID')
+    if isinstance(device_id, int) and not isinstance(device_id, bool):
+        device_id = str(device_id)
+    if not isinstance(device_id, str) or len(device_id) > MAX_DEVICE_ID_LENGTH:
+        raise SampleError(f'device_id must be a string of at most {MAX_DEVICE_ID_LENGTH} characters')
+
+    recorded_at = reading.get('recorded_at')
+    try:
+        if isinstance(recorded_at, bool):
+            raise ValueError(recorded_at)
+        if isinstance(recorded_at, (int, float)):
+            recorded_at = datetime.fromtimestamp(recorded_at, timezone.utc).isoformat()
+        elif isinstance(recorded_at, str) and recorded_at:
+            recorded_at = parse_timestamp(recorded_at).isoformat()
+        elif not recorded_at:
+            recorded_at = datetime.now(timezone.utc).isoformat()
+        else:
+            raise ValueError(recorded_at)
+    except (ValueError, OverflowError, OSError):
+        raise SampleError('recorded_at must be an ISO 8601 timestamp or epoch seconds')
+
+    row = {'patient_id': patient_id.lower(), 'device_id': device_id, 'recorded_at': recorded_at}
+    measured = False
+    for field, (column, low, high) in SAMPLE_FIELDS.items():
+        value = reading.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+            raise SampleError(f'{field} out of range')
+        row[column] = int(round(value)) if column in INTEGER_SAMPLE_COLUMNS else value
+        measured = True
+    if not measured:
+        raise SampleError('no vital sign values')
+    return row
+
+
+class MonitorSampleWriter:
+    """Bounded in-process buffer drained by one background thread in multi-row inserts."""
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+        self.anomaly_service = VitalsAnomalyService()
+        self.buffer: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=MONITOR_BUFFER_MAX_SAMPLES)
+        self.stats = {'accepted': 0, 'written': 0, 'refused': 0, 'dropped': 0, 'batches': 0, 'failed_batches': 0,
+                      'undetected': 0}
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def put(self, row: Dict[str, Any], timeout: float) -> bool:
+        """Queue a sample, blocking while the buffer is full; False if it stayed full."""
+        self._ensure_started()
+        try:
+            self.buffer.put(row, timeout=timeout)
+        except queue.Full:
+            return False
+        with self._stats_lock:
+            self.stats['accepted'] += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['buffered'] = self.buffer.qsize()
+        stats['capacity'] = MONITOR_BUFFER_MAX_SAMPLES
+        return stats
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything queued so far has been written or dropped; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self.buffer.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.buffer.unfinished_tasks
+
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='monitor-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self.buffer.task_done()
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = [self.buffer.get()]
+        deadline = time.monotonic() + MONITOR_FLUSH_INTERVAL_SECONDS
+        while len(batch) < MONITOR_INSERT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.buffer.get(timeout=remaining) if remaining > 0 else self.buffer.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        refused: List[Tuple[Dict[str, Any], Exception]] = []
+        self._insert(batch, refused)
+        if refused:
+            logger.error('Dropped %s monitor samples the database refused, from devices %s; first error: %s',
+                         len(refused), sorted({row['device_id'] for row, _ in refused}), refused[0][1])
+            for row, _ in refused:
+                # Most likely the patient was deleted; look it up again on its next reading
+                _known_patients.pop(row['patient_id'])
+            with self._stats_lock:
+                self.stats['refused'] += len(refused)
+
+    def _insert(self, batch: List[Dict[str, Any]], refused: List[Tuple[Dict[str, Any], Exception]]) -> None:
+        """Insert a batch, retrying outages; rows the database refuses are set aside on their own.
+
+        A refused row (is_data_error, e.g. a patient deleted while still in
+        _known_patients) fails the whole statement, so the batch is halved
+        until each refused row is alone and the rest are written.
+        """
+        for attempt in range(1, MONITOR_INSERT_ATTEMPTS + 1):
+            try:
+                self.supabase.table('vital_samples').upsert(
+                    batch, on_conflict=SAMPLE_CONFLICT_COLUMNS, ignore_duplicates=True, returning='minimal'
+                ).execute()
+            except Exception as exc:
+                if is_data_error(exc):
+                    if len(batch) == 1:
+                        refused.append((batch[0], exc))
+                    else:
+                        middle = len(batch) // 2
+                        self._insert(batch[:middle], refused)
+                        self._insert(batch[middle:], refused)
+                    return
+                logger.warning('Monitor sample insert failed (attempt %s): %s', attempt, exc)
+                time.sleep(0.2 * attempt)
+                continue
+            with self._stats_lock:
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+            self._detect_anomalies(batch)
+            return
+        logger.error('Dropping %s monitor samples from devices %s after %s attempts', len(batch),
+                     sorted({row['device_id'] for row in batch}), MONITOR_INSERT_ATTEMPTS)
+        with self._stats_lock:
+            self.stats['dropped'] += len(batch)
+            self.stats['failed_batches'] += 1
+
+    def _detect_anomalies(self, batch: List[Dict[str, Any]]) -> None:
+        # Off the writer thread, so baselines never slow down the inserts
+        if not self.anomaly_service.submit_rows(batch, 'monitor'):
+            with self._stats_lock:
+                self.stats['undetected'] += len(batch)
+
+
+_writer: Optional[MonitorSampleWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_monitor_writer() -> MonitorSampleWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = MonitorSampleWriter()
+        return _writer
+
+
+class MonitorStreamService:
+    """Ingests NDJSON streams of bedside monitor readings into vital_samples."""
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+        self.writer = get_monitor_writer()
+
+    def ingest(self, lines: Iterable[bytes]) -> Dict[str, Any]:
+        """Parse and queue readings line by line; stops early if the buffer stays full.
+
+        Returns counts plus 'backpressure' (True when the caller should retry
+        the unread remainder of its stream later) and the first few errors.
+        """
+        accepted = rejected = 0
+        errors: List[Dict[str, Any]] = []
+        backpressure = False
+
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = parse_sample(line)
+                self._check_patient(row['patient_id'])
+            except SampleError as exc:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_SAMPLE_ERRORS:
+                    errors.append({'line': line_number, 'error': str(exc)})
+                continue
+
+            if not self.writer.put(row, timeout=MONITOR_BACKPRESSURE_SECONDS):
+                backpressure = True
+                break
+            accepted += 1
+
+        return {
+            'accepted': accepted,
+            'rejected': rejected,
+            'backpressure': backpressure,
+            'errors': errors
+        }
+
+    def _check_patient(self, patient_id: str) -> None:
+        # A malformed id would make the lookup itself fail with a database error
+        if not UUID_PATTERN.match(patient_id):
+            raise SampleError('patient_id must be a UUID')
+        known = _known_patients.get(patient_id)
+        if known is None:
+            result = self.supabase.table('patients').select('id').eq('id', patient_id).limit(1).execute()
+            known = bool(result.data)
+            # Unknown ids are cached briefly too, so a misconfigured device
+            # does not cost one lookup per reading
+            _known_patients.set(patient_id, known, ttl=None if known else 30)
+        if not known:
+            raise SampleError(f'unknown patient {patient_id}')
@@ -0,0 +1,246 @@
+import logging
+import os
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from app.services.ai_insight_service import AIInsightsService
+from app.services.lab_reports_service import LabReportsService, LAB_FILES_BUCKET
+from app.services.patient_service import PatientService
+from app.services.vitals_service import VitalsService
+from app.utils.json_provider import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+RECORD_EXPORT_FORMAT_VERSION = 1
+
+# Rows per service call for each section; together with the chunk size below
+# they bound what one export holds in memory, whatever the patient's history
+RECORD_EXPORT_VITALS_PAGE_SIZE = 500
+RECORD_EXPORT_LAB_REPORTS_PAGE_SIZE = 100
+RECORD_EXPORT_INSIGHTS_PAGE_SIZE = 100
+
+# Bytes gathered before a chunk is handed to the WSGI server
+RECORD_EXPORT_FLUSH_BYTES = 256 * 1024
+# Storage objects are piped through in pieces of this size
+RECORD_EXPORT_DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+RECORD_EXPORT_SIGNED_URL_SECONDS = 300
+RECORD_EXPORT_DOWNLOAD_TIMEOUT = (10, 60)
+
+# Already-compressed files are stored as-is; deflating them costs CPU for nothing
+STORED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'zip', 'gz'}
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that ZipFile streams into.
+
+    ZipFile falls back to data descriptors on unseekable output, so entries
+    are written once, front to back, and the bytes can be handed out as they
+    are produced.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self.pending = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+class PatientRecordExportService:
+    """Everything held on one patient, streamed as an NDJSON or ZIP bundle.
+
+    Sections are read lazily, one page at a time, from the services that own
+    them: demographics from PatientService, vitals from VitalsService, lab
+    reports from LabReportsService, insights from AIInsightsService, and the
+    patient's indexed files from storage. Nothing is assembled up front. A
+    section that fails is recorded in the bundle's summary and the export
+    carries on with the next one.
+    """
+
+    def __init__(
+        self,
+        patient_service: Optional[PatientService] = None,
+        vitals_service: Optional[VitalsService] = None,
+        lab_reports_service: Optional[LabReportsService] = None,
+        ai_insights_service: Optional[AIInsightsService] = None
+    ) -> None:
+        self.patient_service = patient_service or PatientService()
+        self.vitals_service = vitals_service or VitalsService()
+        self.lab_reports_service = lab_reports_service or LabReportsService()
+        self.ai_insights_service = ai_insights_service or AIInsightsService()
+        self.supabase = self.ai_insights_service.supabase
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def stream_ndjson(self, patient: Any, include_documents: bool = True) -> Iterator[bytes]:
+        """One JSON object per line: a header, {"type", "data"} records, then a summary."""
+        patient_id = patient.id
+        counts: Dict[str, int] = {}
+        errors: List[Dict[str, str]] = []
+        buffer: List[bytes] = []
+        pending = 0
+
+        yield dumps_bytes(self._header(patient_id)) + b'\n'
+        yield dumps_bytes({'type': 'patient', 'data': patient.to_dict()}) + b'\n'
+        for record_type, rows in self._iter_sections(patient_id, include_documents, errors):
+            counts[record_type] = counts.get(record_type, 0) + len(rows)
+            for row in rows:
+                line = dumps_bytes({'type': record_type, 'data': row}) + b'\n'
+                buffer.append(line)
+                pending += len(line)
+            if pending >= RECORD_EXPORT_FLUSH_BYTES:
+                yield b''.join(buffer)
+                buffer, pending = [], 0
+        if buffer:
+            yield b''.join(buffer)
+        yield dumps_bytes({'type': 'summary', 'counts': counts, 'errors': errors}) + b'\n'
+
+    def stream_zip(self, patient: Any, include_documents: bool = True) -> Iterator[bytes]:
+        """ZIP with patient.json, one NDJSON file per section, the stored files and manifest.json."""
+        patient_id = patient.id
+        counts: Dict[str, int] = {}
+        errors: List[Dict[str, str]] = []
+        sink = _ChunkSink()
+
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('patient.json', dumps_bytes(patient.to_dict()))
+
+            entry, entry_type = None, None
+            documents: List[Dict[str, Any]] = []
+            for record_type, rows in self._iter_sections(patient_id, include_documents, errors):
+                if record_type != entry_type:
+                    if entry:
+                        entry.close()
+                    entry_type = record_type
+                    entry = archive.open(f'{record_type}s.ndjson', 'w', force_zip64=True)
+                counts[record_type] = counts.get(record_type, 0) + len(rows)
+                entry.write(b''.join(dumps_bytes(row) + b'\n' for row in rows))
+                if record_type == 'document':
+                    documents.extend(rows)
+                if sink.pending >= RECORD_EXPORT_FLUSH_BYTES:
+                    yield sink.drain()
+            if entry:
+                entry.close()
+
+            # Index rows are small; the files themselves are piped through one at a time
+            for document in documents:
+                yield from self._write_document(archive, sink, document, errors)
+            counts['file'] = sum(1 for document in documents if document.get('archive_path'))
+
+            manifest = self._header(patient_id)
+            manifest.update({'counts': counts, 'errors': errors})
+            archive.writestr('manifest.json', dumps_bytes(manifest))
+        yield sink.drain()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _header(self, patient_id: str) -> Dict[str, Any]:
+        return {
+            'type': 'export',
+            'format_version': RECORD_EXPORT_FORMAT_VERSION,
+            'patient_id': patient_id,
+            'exported_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    def _iter_sections(
+        self,
+        patient_id: str,
+        include_documents: bool,
+        errors: List[Dict[str, str]]
+    ) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """(record type, page of rows) for every section, in a fixed order."""
+        sections: List[Tuple[str, Callable[[str], Iterator[List[Dict[str, Any]]]]]] = [
+            ('vital', self._iter_vitals),
+            ('lab_report', self._iter_lab_reports),
+            ('insight', self._iter_insights),
+        ]
+        if include_documents:
+            sections.append(('document', self._iter_documents))
+
+        for record_type, pages in sections:
+            try:
+                for rows in pages(patient_id):
+                    yield record_type, rows
+            except Exception as exc:
+                logger.exception('Patient export of %ss failed for %s: %s', record_type, patient_id, exc)
+                errors.append({'section': record_type, 'error': str(exc)[:500]})
+
+    def _iter_vitals(self, patient_id: str) -> Iterator[List[Dict[str, Any]]]:
+        # The strict pager raises on a failed page, so the error lands in the summary
+        return self.vitals_service.iter_patient_vitals(patient_id, RECORD_EXPORT_VITALS_PAGE_SIZE)
+
+    def _iter_lab_reports(self, patient_id: str) -> Iterator[List[Dict[str, Any]]]:
+        cursor = None
+        while True:
+            result = self.lab_reports_service.get_lab_reports(
+                patient_id=patient_id, cursor=cursor, limit=RECORD_EXPORT_LAB_REPORTS_PAGE_SIZE
+            )
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            if result['reports']:
+                yield result['reports']
+            cursor = result['next_cursor']
+            if not cursor:
+                return
+
+    def _iter_insights(self, patient_id: str) -> Iterator[List[Dict[str, Any]]]:
+        return self.ai_insights_service.iter_patient_insights(patient_id, RECORD_EXPORT_INSIGHTS_PAGE_SIZE)
+
+    def _iter_documents(self, patient_id: str) -> Iterator[List[Dict[str, Any]]]:
+        """Indexed files of the patient in the insight PDF and lab file buckets."""
+        document_index = self.ai_insights_service.document_index
+        for bucket in dict.fromkeys([self.ai_insights_service.bucket_name, LAB_FILES_BUCKET]):
+            rows = document_index.list_documents(bucket, patient_id)
+            for row in rows:
+                row['archive_path'] = f"documents/{bucket}/{row['storage_path']}"
+            if rows:
+                yield rows
+
+    def _write_document(
+        self,
+        archive: zipfile.ZipFile,
+        sink: _ChunkSink,
+        document: Dict[str, Any],
+        errors: List[Dict[str, str]]
+    ) -> Iterator[bytes]:
+        bucket, path = document['bucket'], document['storage_path']
+        try:
+            signed = self.supabase.storage.from_(bucket).create_signed_url(path, RECORD_EXPORT_SIGNED_URL_SECONDS)
+            response = requests.get(signed.get('signedURL') or signed.get('signedUrl'),
+                                    stream=True, timeout=RECORD_EXPORT_DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+        except Exception as exc:
+            logger.error('Patient export could not fetch %s/%s: %s', bucket, path, exc)
+            errors.append({'section': 'file', 'path': f'{bucket}/{path}', 'error': str(exc)[:500]})
+            document['archive_path'] = None
+            return
+
+        info = zipfile.ZipInfo(document['archive_path'], date_time=datetime.now().timetuple()[:6])
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        with response, archive.open(info, 'w', force_zip64=True) as entry:
+            try:
+                for chunk in response.iter_content(RECORD_EXPORT_DOWNLOAD_CHUNK_BYTES):
+                    entry.write(chunk)
+                    if sink.pending >= RECORD_EXPORT_FLUSH_BYTES:
+                        yield sink.drain()
+            except requests.RequestException as exc:
+                # Bytes already sent cannot be taken back; the entry stays truncated
+                logger.error('Patient export lost %s/%s mid-download: %s', bucket, path, exc)
+                errors.append({'section': 'file', 'path': f'{bucket}/{path}', 'error': f'truncated: {exc}'[:500]})
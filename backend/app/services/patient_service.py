@@ -5,6 +5,18 @@ from app.utils.database import get_supabase_client
 import re
 from datetime import datetime
 
+# References per batched lookup; keeps the PostgREST filter within URL limits
+PATIENT_LOOKUP_BATCH_SIZE = 200
+
+# Bulk imports: columns written for every row, and what a new patient gets
+# when a row leaves a required column empty
+PATIENT_IMPORT_COLUMNS = ('medical_record_number', 'fhir_id', 'first_name', 'last_name', 'email', 'phone',
+                          'date_of_birth', 'gender', 'address', 'emergency_contact_name',
+                          'emergency_contact_phone', 'created_by')
+PATIENT_IMPORT_DEFAULTS = {'first_name': 'Unknown', 'last_name': 'Unknown'}
+
+UUID_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
 class PatientService:
     """Service class for patient management operations"""
     
@@ -144,6 +156,125 @@ class PatientService:
             print(f"Error getting patient by MRN: {str(e)}")
             return False, f"Failed to get patient: {str(e)}", None
     
+    def resolve_patient_references(self, references: List[str]) -> Tuple[bool, str, Dict[str, str]]:
+        """Map patient references (database UUIDs or medical record numbers) to patient UUIDs.
+        
+        Every distinct reference is resolved with one query per PATIENT_LOOKUP_BATCH_SIZE
+        references; unknown references are absent from the returned mapping.
+        """
+        try:
+            distinct = list(dict.fromkeys(ref.strip() for ref in references if ref and ref.strip()))
+            resolved: Dict[str, str] = {}
+            
+            for start in range(0, len(distinct), PATIENT_LOOKUP_BATCH_SIZE):
+                batch = distinct[start:start + PATIENT_LOOKUP_BATCH_SIZE]
+                uuids = [ref.lower() for ref in batch if UUID_PATTERN.match(ref)]
+                mrns = ','.join('"' + ref.replace('\\', '\\\\').replace('"', '\\"') + '"' for ref in batch)
+                
+                filters = f'medical_record_number.in.({mrns})'
+                if uuids:
+                    filters = f'id.in.({",".join(uuids)}),{filters}'
+                
+                result = self.supabase.table('patients')\
+                    .select('id, medical_record_number')\
+                    .or_(filters)\
+                    .execute()
+                
+                by_mrn = {}
+                ids = set()
+                for row in result.data or []:
+                    ids.add(row['id'])
+                    if row.get('medical_record_number'):
+                        by_mrn[row['medical_record_number']] = row['id']
+                
+                for ref in batch:
+                    # An internal UUID wins over an MRN that happens to look like one
+                    if UUID_PATTERN.match(ref) and ref.lower() in ids:
+                        resolved[ref] = ref.lower()
+                    elif ref in by_mrn:
+                        resolved[ref] = by_mrn[ref]
+            
+            return True, f"Resolved {len(resolved)} of {len(distinct)} patient references", resolved
+            
+        except Exception as e:
+            print(f"Error resolving patient references: {str(e)}")
+            return False, f"Failed to resolve patients: {str(e)}", {}
+    
+    def import_patients(self, rows: List[Dict[str, Any]]) -> Tuple[bool, str, Dict[str, List[Dict[str, Any]]]]:
+        """Insert or update patients rows keyed by medical_record_number.
+        
+        Used for bulk imports. On patients that already exist, columns a row
+        leaves empty keep their stored values and created_by is never
+        changed; new patients get PATIENT_IMPORT_DEFAULTS for empty names.
+        All rows go in one upsert; if that fails, each row is retried alone
+        so one bad row does not fail the rest. data is {'saved': [{id,
+        medical_record_number, fhir_id}], 'failed': [{medical_record_number, error}]}.
+        """
+        try:
+            existing: Dict[str, Dict[str, Any]] = {}
+            mrns = list(dict.fromkeys(row['medical_record_number'] for row in rows))
+            for start in range(0, len(mrns), PATIENT_LOOKUP_BATCH_SIZE):
+                result = self.supabase.table('patients')\
+                    .select(', '.join(PATIENT_IMPORT_COLUMNS))\
+                    .in_('medical_record_number', mrns[start:start + PATIENT_LOOKUP_BATCH_SIZE])\
+                    .execute()
+                for row in result.data or []:
+                    existing[row['medical_record_number']] = row
+        except Exception as e:
+            print(f"Error importing patients: {str(e)}")
+            return False, f"Failed to import patients: {str(e)}", {'saved': [], 'failed': []}
+        
+        merged = [self._merge_import_row(row, existing.get(row['medical_record_number'])) for row in rows]
+        try:
+            saved = self._upsert_patients(merged)
+            return True, f"Imported {len(saved)} patients", {'saved': saved, 'failed': []}
+        except Exception as e:
+            print(f"Error importing patients, retrying one by one: {str(e)}")
+        
+        saved, failed = [], []
+        for row in merged:
+            try:
+                saved.extend(self._upsert_patients([row]))
+            except Exception as e:
+                failed.append({'medical_record_number': row['medical_record_number'], 'error': str(e)[:500]})
+        return True, f"Imported {len(saved)} patients, {len(failed)} failed", {'saved': saved, 'failed': failed}
+    
+    @staticmethod
+    def _merge_import_row(row: Dict[str, Any], stored: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Every row carries the same columns, as one multi-row upsert requires
+        merged = {column: row.get(column) for column in PATIENT_IMPORT_COLUMNS}
+        fallback = stored or PATIENT_IMPORT_DEFAULTS
+        for column, value in merged.items():
+            if value is None or value == '':
+                merged[column] = fallback.get(column)
+        if stored:
+            merged['created_by'] = stored.get('created_by')
+        return merged
+    
+    def _upsert_patients(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = self.supabase.table('patients')\
+            .upsert(rows, on_conflict='medical_record_number')\
+            .execute()
+        return [{'id': row['id'], 'medical_record_number': row.get('medical_record_number'),
+                 'fhir_id': row.get('fhir_id')} for row in result.data or []]
+    
+    def resolve_fhir_references(self, references: List[str]) -> Dict[str, str]:
+        """Map FHIR Patient ids recorded by earlier imports (patients.fhir_id) to patient UUIDs."""
+        resolved: Dict[str, str] = {}
+        try:
+            distinct = list(dict.fromkeys(ref for ref in references if ref))
+            for start in range(0, len(distinct), PATIENT_LOOKUP_BATCH_SIZE):
+                batch = distinct[start:start + PATIENT_LOOKUP_BATCH_SIZE]
+                result = self.supabase.table('patients')\
+                    .select('id, fhir_id')\
+                    .in_('fhir_id', batch)\
+                    .execute()
+                for row in result.data or []:
+                    resolved[row['fhir_id']] = row['id']
+        except Exception as e:
+            print(f"Error resolving FHIR patient references: {str(e)}")
+        return resolved
+    
     def update_patient(self, patient_id: str, patient_data: Dict[str, Any], updated_by: str) -> Tuple[bool, str, Optional[Patient]]:
         """Update patient information"""
         try:
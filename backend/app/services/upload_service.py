@@ -0,0 +1,176 @@
+# Resumable (tus-style) chunked uploads for lab files
+from app.services.lab_reports_service import LabReportsService, UPLOAD_COPY_CHUNK_BYTES
+from datetime import datetime, timedelta
+import json
+import os
+import tempfile
+import threading
+import uuid
+from werkzeug.exceptions import ClientDisconnected
+
+# Partial uploads are staged here until complete; point it at a shared volume
+# when running several workers behind a load balancer
+UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'healthcare-uploads'))
+MAX_RESUMABLE_UPLOAD_BYTES = int(os.getenv('MAX_RESUMABLE_UPLOAD_BYTES', 2 * 1024 * 1024 * 1024))
+UPLOAD_SESSION_TTL = timedelta(hours=24)
+
+# One lock per upload id serialises PATCH requests for the same upload
+_session_locks = {}
+_session_locks_guard = threading.Lock()
+
+
+def _session_lock(upload_id):
+    with _session_locks_guard:
+        return _session_locks.setdefault(upload_id, threading.Lock())
+
+
+class ResumableUploadService:
+    """Upload sessions whose bytes arrive in PATCH requests at explicit offsets.
+
+    Each chunk is copied from the request stream to a staging file in
+    UPLOAD_COPY_CHUNK_BYTES pieces, so a worker never buffers more than that
+    per upload. After a dropped connection the client asks for the current
+    offset and continues from there; the staged file is pushed to storage
+    once the declared length has arrived. A session is only visible to the
+    user who created it (and to admins); anyone else gets "not found".
+    """
+
+    def __init__(self, lab_reports_service=None, staging_dir=UPLOAD_STAGING_DIR):
+        self.lab_reports_service = lab_reports_service or LabReportsService()
+        self.staging_dir = staging_dir
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def create_session(self, patient_id, filename, content_type, length, user_id):
+        try:
+            if length is None or length <= 0:
+                return {'success': False, 'error': 'Upload-Length must be a positive integer'}
+            if length > MAX_RESUMABLE_UPLOAD_BYTES:
+                return {'success': False, 'error': f'Upload exceeds the {MAX_RESUMABLE_UPLOAD_BYTES} byte limit'}
+
+            self._expire_stale_sessions()
+
+            upload_id = uuid.uuid4().hex
+            session = {
+                'id': upload_id,
+                'patient_id': patient_id,
+                'filename': filename,
+                'content_type': content_type,
+                'length': length,
+                'created_by': user_id,
+                'created_at': datetime.now().isoformat()
+            }
+            with open(self._meta_path(upload_id), 'w') as meta:
+                json.dump(session, meta)
+            open(self._data_path(upload_id), 'wb').close()
+
+            session['offset'] = 0
+            return {'success': True, 'upload': session}
+
+        except Exception as e:
+            print(f"Error creating upload session: {str(e)}")
+            return {'success': False, 'error': f'Upload session error: {str(e)}'}
+
+    def get_session(self, upload_id, user_id, is_admin=False):
+        session = self._owned_session(upload_id, user_id, is_admin)
+        if not session:
+            return {'success': False, 'error': 'Upload not found or expired'}
+        return {'success': True, 'upload': session}
+
+    def append_chunk(self, upload_id, offset, stream, user_id, is_admin=False):
+        """Append bytes from stream at offset; completes the upload once all bytes arrived."""
+        with _session_lock(upload_id):
+            session = self._owned_session(upload_id, user_id, is_admin)
+            if not session:
+                return {'success': False, 'status': 404, 'error': 'Upload not found or expired'}
+            if offset != session['offset']:
+                # Client and server disagree after a dropped request; it must re-sync via HEAD
+                return {'success': False, 'status': 409, 'error': f"Upload-Offset mismatch, server is at {session['offset']}",
+                        'upload': session}
+
+            remaining = session['length'] - session['offset']
+            try:
+                with open(self._data_path(upload_id), 'ab') as data:
+                    while remaining > 0:
+                        chunk = stream.read(min(UPLOAD_COPY_CHUNK_BYTES, remaining))
+                        if not chunk:
+                            break
+                        data.write(chunk)
+                        # Persist progress as we go so an interrupted request still counts
+                        data.flush()
+                        remaining -= len(chunk)
+
+                    if remaining == 0 and stream.read(1):
+                        data.truncate(session['length'])
+                        return {'success': False, 'status': 413, 'error': 'More bytes sent than Upload-Length'}
+            except (OSError, ClientDisconnected) as e:
+                # Whatever reached the staging file before the failure is kept
+                print(f"Error writing upload chunk {upload_id}: {str(e)}")
+
+            session['offset'] = os.path.getsize(self._data_path(upload_id))
+            if session['offset'] < session['length']:
+                return {'success': True, 'complete': False, 'upload': session}
+
+            result = self.lab_reports_service.store_file(
+                self._data_path(upload_id),
+                session['filename'],
+                session['content_type'],
+                session['patient_id'],
+                session['created_by']
+            )
+            if result['success']:
+                self._remove_session(upload_id)
+                result['complete'] = True
+                result['upload'] = session
+            else:
+                result['status'] = 502
+            return result
+
+    def delete_session(self, upload_id, user_id, is_admin=False):
+        with _session_lock(upload_id):
+            if not self._owned_session(upload_id, user_id, is_admin):
+                return {'success': False, 'error': 'Upload not found or expired'}
+            self._remove_session(upload_id)
+            return {'success': True}
+
+    def _owned_session(self, upload_id, user_id, is_admin):
+        """The session if user_id created it (any session for admins), else None."""
+        session = self._load_session(upload_id)
+        if session and (is_admin or session['created_by'] == user_id):
+            return session
+        return None
+
+    def _load_session(self, upload_id):
+        if not upload_id or not upload_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(upload_id)) as meta:
+                session = json.load(meta)
+            session['offset'] = os.path.getsize(self._data_path(upload_id))
+            return session
+        except (OSError, ValueError):
+            return None
+
+    def _remove_session(self, upload_id):
+        for path in (self._data_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with _session_locks_guard:
+            _session_locks.pop(upload_id, None)
+
+    def _expire_stale_sessions(self):
+        cutoff = datetime.now() - UPLOAD_SESSION_TTL
+        for name in os.listdir(self.staging_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-5]
+            session = self._load_session(upload_id)
+            if session and datetime.fromisoformat(session['created_at']) < cutoff:
+                self._remove_session(upload_id)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.staging_dir, f'{upload_id}.json')
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.staging_dir, f'{upload_id}.part')
@@ -0,0 +1,313 @@
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.database import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Vital signs tracked per patient (temperature in Fahrenheit, like vital_uploads)
+ANOMALY_VITALS = ('heart_rate', 'respiratory_rate', 'oxygen_saturation',
+                  'blood_pressure_systolic', 'blood_pressure_diastolic', 'temperature')
+TEMPERATURE = ANOMALY_VITALS.index('temperature')
+
+# Smallest standard deviation a baseline is allowed, per vital, so a patient
+# whose readings never move does not alert on the first 1-unit change
+ANOMALY_MIN_STD = np.array([3.0, 1.5, 1.0, 5.0, 4.0, 0.4])
+
+# The baseline forgets with this half-life (in time, so 1 Hz monitor samples
+# and 4-hourly charted rounds age the same way); the first readings are
+# averaged evenly until the time weight takes over. After a long gap one
+# reading still carries at most BASELINE_MAX_WEIGHT, so sparse charted
+# readings keep a spread instead of collapsing onto the last value.
+BASELINE_HALF_LIFE_SECONDS = 12 * 3600
+BASELINE_MAX_WEIGHT = 0.2
+# Readings per vital before it can alert
+BASELINE_WARMUP_READINGS = 5
+# Deviation (in baseline standard deviations) that alerts when two readings of
+# a vital in a row exceed it in the same direction, and the deviation that
+# alerts on a single reading ('high' severity)
+ANOMALY_Z_THRESHOLD = 3.0
+ANOMALY_Z_HIGH = 4.5
+# One alert per patient and vital sign per cooldown window
+ANOMALY_ALERT_COOLDOWN_SECONDS = 15 * 60
+
+# Rows per insert of persisted alerts
+ALERT_INSERT_BATCH_SIZE = 500
+
+# Monitor batches waiting for background detection; when detection falls this
+# far behind, further batches skip it rather than hold up sample writes
+ANOMALY_QUEUE_MAX_BATCHES = 50
+
+
+def _epoch_seconds(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return datetime.now(timezone.utc).timestamp()
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def vitals_matrix(rows: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """(len(rows), len(ANOMALY_VITALS)) float array, NaN where a vital is missing.
+
+    Accepts vital_uploads rows and vital_samples rows (temperature_c is
+    converted to Fahrenheit).
+    """
+    values = np.empty((len(rows), len(ANOMALY_VITALS)))
+    for j, vital in enumerate(ANOMALY_VITALS):
+        # None becomes NaN in a float array
+        values[:, j] = np.array([row.get(vital) for row in rows], dtype=float)
+    celsius = np.array([row.get('temperature_c') for row in rows], dtype=float)
+    values[:, TEMPERATURE] = np.where(np.isnan(values[:, TEMPERATURE]), celsius * 9.0 / 5.0 + 32.0, values[:, TEMPERATURE])
+    return values
+
+
+class VitalsBaselines:
+    """Per-patient EWMA mean/variance of every vital sign, held in flat numpy arrays.
+
+    Each patient owns one row of the (patients x vitals) arrays, so updating
+    it for a new reading is O(1). A batch is applied in rounds: the k-th
+    reading of every patient in the batch is processed together, which keeps
+    each patient's readings in order while vectorising across patients.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._index: Dict[str, int] = {}
+        self._patients: List[str] = []
+        shape = (capacity, len(ANOMALY_VITALS))
+        self.mean = np.zeros(shape)
+        self.var = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int32)
+        self.last_seen = np.full(shape, np.nan)
+        self.last_alert = np.full(shape, -np.inf)
+        # Sign of the previous reading's deviation if it was beyond the threshold, else 0
+        self.excursion = np.zeros(shape, dtype=np.int8)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._patients)
+
+    def baseline(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._index.get(patient_id)
+            if row is None:
+                return None
+            return {
+                vital: {
+                    'mean': round(float(self.mean[row, j]), 2),
+                    'std': round(float(np.sqrt(self.var[row, j])), 2),
+                    'readings': int(self.count[row, j])
+                }
+                for j, vital in enumerate(ANOMALY_VITALS) if self.count[row, j]
+            }
+
+    def observe(
+        self,
+        patient_ids: Sequence[str],
+        values: np.ndarray,
+        timestamps: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """Fold readings into the baselines (in the given order) and return the alerts they raise."""
+        if not len(patient_ids):
+            return []
+        with self._lock:
+            rows = self._rows(patient_ids)
+
+            # Occurrence number of each reading within its patient
+            seen: Dict[int, int] = {}
+            ranks = np.empty(len(rows), dtype=np.int64)
+            for i, row in enumerate(rows.tolist()):
+                ranks[i] = seen.get(row, 0)
+                seen[row] = ranks[i] + 1
+
+            alerts: List[Dict[str, Any]] = []
+            for rank in range(int(ranks.max()) + 1):
+                selected = np.flatnonzero(ranks == rank)
+                alerts.extend(self._apply(selected, rows[selected], values[selected], timestamps[selected]))
+            return alerts
+
+    def _apply(
+        self,
+        positions: np.ndarray,
+        rows: np.ndarray,
+        x: np.ndarray,
+        t: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        mean, var, count = self.mean[rows], self.var[rows], self.count[rows]
+        last_seen, last_alert, excursion = self.last_seen[rows], self.last_alert[rows], self.excursion[rows]
+        t = t[:, None]
+
+        present = ~np.isnan(x)
+        std = np.sqrt(np.maximum(var, ANOMALY_MIN_STD ** 2))
+        diff = np.where(present, x - mean, 0.0)
+        z = diff / std
+        ready = present & (count >= BASELINE_WARMUP_READINGS)
+        beyond = np.where(ready & (np.abs(z) >= ANOMALY_Z_THRESHOLD), np.sign(z), 0).astype(np.int8)
+        sustained = (beyond != 0) & (beyond == excursion)
+        flagged = (sustained | (ready & (np.abs(z) >= ANOMALY_Z_HIGH))) \
+            & (t - last_alert >= ANOMALY_ALERT_COOLDOWN_SECONDS)
+
+        # An outlier moves the baseline no further than a threshold-sized
+        # reading would, so a deteriorating patient does not become the new normal at once
+        diff = np.where(ready, np.clip(diff, -ANOMALY_Z_THRESHOLD * std, ANOMALY_Z_THRESHOLD * std), diff)
+        elapsed = np.where(np.isnan(last_seen), 0.0, np.maximum(t - last_seen, 0.0))
+        alpha = np.maximum(1.0 / (count + 1),
+                           np.minimum(1.0 - np.exp2(-elapsed / BASELINE_HALF_LIFE_SECONDS), BASELINE_MAX_WEIGHT))
+
+        self.mean[rows] = mean + alpha * diff
+        self.var[rows] = np.where(present, (1.0 - alpha) * (var + alpha * diff * diff), var)
+        self.count[rows] = count + present
+        self.last_seen[rows] = np.where(present, t, last_seen)
+        self.last_alert[rows] = np.where(flagged, t, last_alert)
+        self.excursion[rows] = np.where(present, beyond, excursion)
+
+        alerts = []
+        for i, j in zip(*np.nonzero(flagged)):
+            score = float(z[i, j])
+            alerts.append({
+                'position': int(positions[i]),
+                'patient_id': self._patients[rows[i]],
+                'vital': ANOMALY_VITALS[j],
+                'value': float(x[i, j]),
+                'baseline_mean': round(float(mean[i, j]), 2),
+                'baseline_std': round(float(std[i, j]), 2),
+                'z_score': round(score, 2),
+                'direction': 'high' if score > 0 else 'low',
+                'severity': 'high' if abs(score) >= ANOMALY_Z_HIGH else 'medium'
+            })
+        return alerts
+
+    def _rows(self, patient_ids: Sequence[str]) -> np.ndarray:
+        rows = np.empty(len(patient_ids), dtype=np.int64)
+        for i, patient_id in enumerate(patient_ids):
+            row = self._index.get(patient_id)
+            if row is None:
+                row = self._add(patient_id)
+            rows[i] = row
+        return rows
+
+    def _add(self, patient_id: str) -> int:
+        row = len(self._patients)
+        if row == len(self.mean):
+            self._grow()
+        self._index[patient_id] = row
+        self._patients.append(patient_id)
+        return row
+
+    def _grow(self) -> None:
+        extra = len(self.mean)
+        shape = (extra, len(ANOMALY_VITALS))
+        self.mean = np.vstack([self.mean, np.zeros(shape)])
+        self.var = np.vstack([self.var, np.zeros(shape)])
+        self.count = np.vstack([self.count, np.zeros(shape, dtype=np.int32)])
+        self.last_seen = np.vstack([self.last_seen, np.full(shape, np.nan)])
+        self.last_alert = np.vstack([self.last_alert, np.full(shape, -np.inf)])
+        self.excursion = np.vstack([self.excursion, np.zeros(shape, dtype=np.int8)])
+
+
+_baselines: Optional[VitalsBaselines] = None
+_baselines_lock = threading.Lock()
+_detection_queue: 'queue.Queue[Tuple[List[Dict[str, Any]], str]]' = queue.Queue(maxsize=ANOMALY_QUEUE_MAX_BATCHES)
+_detection_thread: Optional[threading.Thread] = None
+_detection_lock = threading.Lock()
+
+
+def get_vitals_baselines() -> VitalsBaselines:
+    global _baselines
+    with _baselines_lock:
+        if _baselines is None:
+            _baselines = VitalsBaselines()
+        return _baselines
+
+
+class VitalsAnomalyService:
+    """Flags readings that deviate from the patient's own recent baseline into vital_alerts.
+
+    Fed with every charted vitals row and every written monitor batch.
+    Baselines live in this process and rebuild from the stream after a
+    restart (BASELINE_WARMUP_READINGS per vital), so run the ingest on one
+    worker per ward or accept that each worker learns from what it sees.
+    """
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+        self.baselines = get_vitals_baselines()
+
+    def observe_rows(self, rows: Sequence[Dict[str, Any]], source: str) -> List[Dict[str, Any]]:
+        """Score and absorb vital_uploads / vital_samples rows, in the order given; returns stored alerts."""
+        rows = [row for row in rows if row.get('patient_id')]
+        if not rows:
+            return []
+        timestamps = np.fromiter((_epoch_seconds(row.get('recorded_at')) for row in rows), dtype=float, count=len(rows))
+        alerts = self.baselines.observe([str(row['patient_id']) for row in rows], vitals_matrix(rows), timestamps)
+
+        for alert in alerts:
+            row = rows[alert.pop('position')]
+            alert['recorded_at'] = row.get('recorded_at')
+            alert['source'] = source
+            alert['vital_id'] = row.get('id')
+        if alerts:
+            self._save_alerts(alerts)
+        return alerts
+
+    def submit_rows(self, rows: List[Dict[str, Any]], source: str) -> bool:
+        """Queue rows for detection on a background thread; False if detection is too far behind."""
+        global _detection_thread
+        with _detection_lock:
+            if not (_detection_thread and _detection_thread.is_alive()):
+                _detection_thread = threading.Thread(target=self._run_detection, name='vitals-anomaly', daemon=True)
+                _detection_thread.start()
+        try:
+            _detection_queue.put_nowait((rows, source))
+        except queue.Full:
+            return False
+        return True
+
+    def _run_detection(self) -> None:
+        while True:
+            rows, source = _detection_queue.get()
+            try:
+                self.observe_rows(rows, source)
+            except Exception as exc:
+                logger.error('Anomaly detection failed for %s rows: %s', len(rows), exc)
+            finally:
+                _detection_queue.task_done()
+
+    def get_alerts(
+        self,
+        patient_id: Optional[str] = None,
+        since: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[bool, str, List[Dict[str, Any]]]:
+        try:
+            query = self.supabase.table('vital_alerts').select('*')
+            if patient_id:
+                query = query.eq('patient_id', patient_id)
+            if since:
+                query = query.gte('recorded_at', since)
+            alerts = query.order('recorded_at', desc=True).limit(limit).execute().data or []
+            return True, 'Vital alerts retrieved', alerts
+        except Exception as exc:
+            logger.exception('Failed to read vital alerts: %s', exc)
+            return False, f'Failed to read vital alerts: {exc}', []
+
+    def _save_alerts(self, alerts: List[Dict[str, Any]]) -> None:
+        for start in range(0, len(alerts), ALERT_INSERT_BATCH_SIZE):
+            try:
+                self.supabase.table('vital_alerts') \
+                    .insert(alerts[start:start + ALERT_INSERT_BATCH_SIZE], returning='minimal') \
+                    .execute()
+            except Exception as exc:
+                logger.error('Failed to store %s vital alerts: %s', len(alerts), exc)
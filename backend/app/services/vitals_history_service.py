@@ -0,0 +1,128 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.database import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Rollup resolutions kept in vital_rollups, finest first
+ROLLUP_RESOLUTIONS: Dict[str, timedelta] = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# Points a chart asks for when it does not say; the resolution is the finest
+# one whose bucket count over the window stays within this
+DEFAULT_HISTORY_POINTS = 500
+# Upper bound on buckets per request (one PostgREST page)
+MAX_HISTORY_POINTS = 1000
+DEFAULT_HISTORY_WINDOW = timedelta(days=7)
+
+ROLLUP_VITALS = ('heart_rate', 'respiratory_rate', 'oxygen_saturation',
+                 'blood_pressure_systolic', 'blood_pressure_diastolic', 'temperature')
+
+ROLLUP_COLUMNS = ', '.join(
+    ['bucket_start', 'sample_count']
+    + [f'{vital}_{stat}' for vital in ROLLUP_VITALS for stat in ('min', 'max', 'sum', 'count')]
+)
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """ISO 8601 timestamp (a trailing 'Z' and naive values are taken as UTC); raises ValueError."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int = DEFAULT_HISTORY_POINTS) -> str:
+    """Finest rollup resolution that covers start..end in at most max_points buckets."""
+    window = end - start
+    for resolution, width in ROLLUP_RESOLUTIONS.items():
+        if window / width <= max_points:
+            return resolution
+    return 'day'
+
+
+def rollup_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    """vital_rollups row -> chart point with min/max/mean per vital sign."""
+    point = {'bucket_start': row['bucket_start'], 'samples': row.get('sample_count') or 0}
+    for vital in ROLLUP_VITALS:
+        count = row.get(f'{vital}_count') or 0
+        point[vital] = {
+            'min': row.get(f'{vital}_min'),
+            'max': row.get(f'{vital}_max'),
+            'mean': round(row[f'{vital}_sum'] / count, 2),
+            'count': count
+        } if count else None
+    return point
+
+
+class VitalsHistoryService:
+    """Downsampled vitals history read from the vital_rollups tables.
+
+    Rollups are kept current by database triggers on vital_uploads and
+    vital_samples (create_vital_rollups_table.sql), so a query only reads one
+    pre-aggregated row per bucket however many observations fell into it.
+    """
+
+    def __init__(self) -> None:
+        self.supabase = get_supabase_client()
+
+    def get_history(
+        self,
+        patient_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        resolution: Optional[str] = None,
+        max_points: int = DEFAULT_HISTORY_POINTS
+    ) -> Tuple[bool, str, Dict[str, Any]]:
+        """Chart series for start..end (default: the last 7 days), oldest bucket first."""
+        end = end or datetime.now(timezone.utc)
+        start = start or end - DEFAULT_HISTORY_WINDOW
+        if start >= end:
+            return False, 'start must be before end', {}
+
+        max_points = max(1, min(max_points, MAX_HISTORY_POINTS))
+        if resolution is None:
+            resolution = choose_resolution(start, end, max_points)
+        elif resolution not in ROLLUP_RESOLUTIONS:
+            return False, f"resolution must be one of {', '.join(ROLLUP_RESOLUTIONS)}", {}
+        elif (end - start) / ROLLUP_RESOLUTIONS[resolution] > MAX_HISTORY_POINTS:
+            return False, f'Window too long for {resolution} resolution (max {MAX_HISTORY_POINTS} buckets)', {}
+
+        # Widen to the enclosing buckets so the first and last points are complete
+        bucket_start = self._bucket_floor(start, resolution)
+
+        try:
+            rows = self.supabase.table('vital_rollups') \
+                .select(ROLLUP_COLUMNS) \
+                .eq('patient_id', patient_id) \
+                .eq('resolution', resolution) \
+                .gte('bucket_start', bucket_start.isoformat()) \
+                .lt('bucket_start', end.isoformat()) \
+                .order('bucket_start') \
+                .limit(MAX_HISTORY_POINTS) \
+                .execute().data or []
+        except Exception as exc:
+            logger.exception('Failed to read vitals history for %s: %s', patient_id, exc)
+            return False, f'Failed to read vitals history: {exc}', {}
+
+        return True, 'Vitals history retrieved', {
+            'patient_id': patient_id,
+            'resolution': resolution,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'points': [rollup_point(row) for row in rows]
+        }
+
+    @staticmethod
+    def _bucket_floor(moment: datetime, resolution: str) -> datetime:
+        moment = moment.astimezone(timezone.utc)
+        if resolution == 'minute':
+            return moment.replace(second=0, microsecond=0)
+        if resolution == 'hour':
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
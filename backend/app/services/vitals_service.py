@@ -10,210 +10,389 @@ class VitalsService:
         self.supabase = get_supabase_client()
     
 # Vitals service for managing patient vital signs
+from app.services.patient_service import UUID_PATTERN
+from app.services.vitals_anomaly_service import VitalsAnomalyService
+from app.utils.cache import TTLCache
 from app.utils.database import get_supabase_client
+from app.utils.idempotency import is_duplicate_key_error
+import base64
+import json
+import re
 import uuid
 from datetime import datetime, timezone
 
+VITAL_REQUIRED_FIELDS = ['patient_id', 'heart_rate', 'blood_pressure_systolic',
+                         'blood_pressure_diastolic', 'temperature', 'respiratory_rate',
+                         'oxygen_saturation']
+
+# Same bounds as the vital_uploads CHECK constraints, so a bad record is
+# rejected on its own instead of failing a whole multi-row insert
+VITAL_RANGES = {
+    'heart_rate': (30, 300),
+    'blood_pressure_systolic': (70, 250),
+    'blood_pressure_diastolic': (30, 150),
+    'temperature': (85.0, 115.0),
+    'respiratory_rate': (5, 60),
+    'oxygen_saturation': (70, 100)
+}
+CONSCIOUSNESS_LEVELS = ('A', 'C', 'V', 'P', 'U')
+
+# Spellings accepted for supplemental_oxygen when it does not arrive as a JSON
+# boolean (form posts, CSV round trips); anything else is rejected
+FLAG_VALUES = {'true': True, 'yes': True, 'y': True, '1': True,
+               'false': False, 'no': False, 'n': False, '0': False}
+
+# Records accepted by one POST /api/vitals/batch
+MAX_VITALS_BATCH_SIZE = 500
+
+# Newest vital_uploads row per patient (None = patient has no vitals). Kept
+# current by the writes below; the TTL only bounds staleness across workers.
+LATEST_VITALS_TTL_SECONDS = 120
+_latest_vitals = TTLCache(maxsize=20000, ttl=LATEST_VITALS_TTL_SECONDS)
+_NO_VITALS = object()
+
+# Patients per lookup of the latest_vital_uploads view (keeps the URL short)
+LATEST_VITALS_LOOKUP_BATCH_SIZE = 200
+MAX_LATEST_VITALS_PATIENTS = 1000
+
+
+def _parse_flag(value, field):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, str)) and str(value).strip().lower() in FLAG_VALUES:
+        return FLAG_VALUES[str(value).strip().lower()]
+    raise ValueError(f'{field} must be true or false')
+
+
+def _recorded_at(row):
+    try:
+        return datetime.fromisoformat(str(row.get('recorded_at')).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def remember_latest_vitals(row):
+    """Fold a newly written vital_uploads row into the latest-vitals index."""
+    patient_id = row.get('patient_id')
+    cached = _latest_vitals.get(patient_id)
+    if cached is None:
+        # Not indexed here yet: the next lookup reads the current latest row
+        return
+    if cached is _NO_VITALS:
+        _latest_vitals.set(patient_id, row)
+        return
+    new_time, cached_time = _recorded_at(row), _recorded_at(cached)
+    if new_time is None or cached_time is None:
+        _latest_vitals.pop(patient_id)
+    elif new_time >= cached_time:
+        # A back-dated entry leaves the newer cached row in place
+        _latest_vitals.set(patient_id, row)
+
+
+def forget_latest_vitals(patient_ids):
+    for patient_id in set(patient_ids):
+        _latest_vitals.pop(patient_id)
+
+
+# Columns of vitals list responses, with the patient embedded through the
+# patient_id foreign key so names come back in the same request
+VITAL_LIST_COLUMNS = ('id, patient_id, heart_rate, blood_pressure_systolic, blood_pressure_diastolic, '
+                      'temperature, respiratory_rate, oxygen_saturation, notes, recorded_at, uploaded_at, uploaded_by')
+VITAL_PATIENT_EMBED = 'patients:patient_id(first_name, last_name, medical_record_number)'
+
+
+def _format_vital_row(row):
+    """Flatten the embedded patient into the response shape the dashboards use."""
+    patient = row.pop('patients', None) or {}
+    patient_name = f"{patient.get('first_name') or ''} {patient.get('last_name') or ''}".strip()
+    row['patient_name'] = patient_name or 'Unknown Patient'
+    row['patient_code'] = patient.get('medical_record_number') or ''
+    row['notes'] = row.get('notes') or ''
+    return row
+
+
+def _encode_vitals_cursor(row, order_column):
+    """Opaque keyset cursor pointing just after this row."""
+    raw = json.dumps([row[order_column], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_vitals_cursor(cursor):
+    try:
+        position, vital_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('malformed cursor')
+    if not UUID_PATTERN.match(str(vital_id)) or not re.match(r'^[0-9T:.+\- ]+$', str(position)):
+        raise ValueError('malformed cursor')
+    return position, vital_id
+
+
 class VitalsService:
     """Service class for vital signs operations"""
     
     def __init__(self):
         self.supabase = get_supabase_client()
+        self.anomaly_service = VitalsAnomalyService()
     
-    def create_vital_upload(self, vital_data, uploaded_by):
-        """Upload new vital signs for a patient"""
+    def create_vital_upload(self, vital_data, uploaded_by, vital_id=None):
+        """Upload new vital signs for a patient
+        
+        vital_id is supplied for idempotent requests; if a row with that id
+        already exists (a retry handled by another worker) it is reported as
+        uploaded instead of inserted twice.
+        """
         try:
-            print(f"=== DEBUG: create_vital_upload called with vital_data={vital_data}, uploaded_by={uploaded_by}")
-            
-            # Validate required fields
-            required_fields = ['patient_id', 'heart_rate', 'blood_pressure_systolic', 
-                             'blood_pressure_diastolic', 'temperature', 'respiratory_rate', 
-                             'oxygen_saturation']
-            
-            print(f"=== DEBUG: Checking required fields: {required_fields}")
-            for field in required_fields:
-                if field not in vital_data or vital_data[field] is None:
-                    print(f"=== DEBUG: Missing required field: {field}")
-                    return False, f'Missing required field: {field}', None
-            
-            print("=== DEBUG: All required fields present")
-            
-            # Generate ID
-            vital_id = str(uuid.uuid4())
-            current_time = datetime.now(timezone.utc)
-            
-            # Prepare data for Supabase
-            insert_data = {
-                'id': vital_id,
-                'patient_id': vital_data.get('patient_id'),
-                'heart_rate': int(vital_data.get('heart_rate')),
-                'blood_pressure_systolic': int(vital_data.get('blood_pressure_systolic')),
-                'blood_pressure_diastolic': int(vital_data.get('blood_pressure_diastolic')),
-                'temperature': float(vital_data.get('temperature')),
-                'respiratory_rate': int(vital_data.get('respiratory_rate')),
-                'oxygen_saturation': float(vital_data.get('oxygen_saturation')),
-                'notes': vital_data.get('notes', ''),
-                'recorded_at': vital_data.get('recorded_at', current_time.isoformat()),
-                'uploaded_by': uploaded_by
-            }
-            
-            print(f"=== DEBUG: Prepared insert_data: {insert_data}")
+            try:
+                insert_data = self._build_vital_row(vital_data, uploaded_by)
+            except ValueError as e:
+                return False, str(e), None
+            if vital_id:
+                insert_data['id'] = vital_id
             
             # Insert into Supabase
-            print("=== DEBUG: Inserting into Supabase...")
-            result = self.supabase.table('vital_uploads').insert(insert_data).execute()
-            print(f"=== DEBUG: Supabase result: {result}")
+            try:
+                result = self.supabase.table('vital_uploads').insert(insert_data).execute()
+            except Exception as e:
+                if vital_id and is_duplicate_key_error(e):
+                    return True, 'Vital signs already uploaded', vital_id
+                raise
             
             if result.data:
-                print(f"=== DEBUG: Insert successful: {result.data}")
-                return True, 'Vital signs uploaded successfully', vital_id
+                remember_latest_vitals(result.data[0])
+                self._detect_anomalies(result.data)
+                return True, 'Vital signs uploaded successfully', insert_data['id']
             else:
-                print(f"=== DEBUG: Insert failed - no data returned")
                 return False, 'Failed to upload vital signs', None
             
         except Exception as e:
-            print(f"=== DEBUG: Exception in create_vital_upload: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            print(f"Error in create_vital_upload: {str(e)}")
             return False, f'Failed to upload vital signs: {str(e)}', None
     
-    def get_patient_vitals(self, patient_id, limit=10):
-        """Get vital signs for a specific patient"""
+    def create_vital_uploads(self, records, uploaded_by, vital_ids=None):
+        """Upload a round of vital signs in one multi-row insert.
+        
+        Every record is validated first (fields, ranges, patient exists); the
+        valid ones are inserted together and each record gets its own result.
+        vital_ids (one per record) makes re-imports collide on the primary key;
+        a record that did fails with 'duplicate': True in its result.
+        """
         try:
-            print(f"=== DEBUG: Getting vitals for patient {patient_id} with limit={limit} ===")
-            
-            # Get vitals for specific patient
-            query = self.supabase.table('vital_uploads')\
-                .select('*')\
-                .eq('patient_id', patient_id)\
-                .order('recorded_at', desc=True)
-            
-            if limit:
-                query = query.limit(limit)
-            
-            vitals_result = query.execute()
-            
-            print(f"=== DEBUG: Found {len(vitals_result.data or [])} vitals for patient ===")
-            
-            if not vitals_result.data:
-                return True, 'No vitals found for patient', []
-            
-            # Get patient information
-            patient_result = self.supabase.table('patients')\
-                .select('id, first_name, last_name, medical_record_number')\
-                .eq('id', patient_id)\
-                .execute()
-            
-            patient_info = {}
-            if patient_result.data:
-                patient_data = patient_result.data[0]
-                patient_info = {
-                    'first_name': patient_data.get('first_name', ''),
-                    'last_name': patient_data.get('last_name', ''),
-                    'medical_record_number': patient_data.get('medical_record_number', '')
-                }
-            
-            patient_name = f"{patient_info.get('first_name', '')} {patient_info.get('last_name', '')}".strip()
-            
-            # Format results
-            vitals = []
-            for row in vitals_result.data:
-                vitals.append({
-                    'id': row.get('id'),
-                    'patient_id': row.get('patient_id'),
-                    'patient_name': patient_name or 'Unknown Patient',
-                    'patient_code': patient_info.get('medical_record_number', ''),
-                    'heart_rate': row.get('heart_rate'),
-                    'blood_pressure_systolic': row.get('blood_pressure_systolic'),
-                    'blood_pressure_diastolic': row.get('blood_pressure_diastolic'),
-                    'temperature': row.get('temperature'),
-                    'respiratory_rate': row.get('respiratory_rate'),
-                    'oxygen_saturation': row.get('oxygen_saturation'),
-                    'notes': row.get('notes', ''),
-                    'recorded_at': row.get('recorded_at'),
-                    'uploaded_at': row.get('uploaded_at'),
-                    'uploaded_by': row.get('uploaded_by')
-                })
-            
-            print(f"=== DEBUG: Formatted {len(vitals)} vitals for patient ===")
-            return True, 'Vitals retrieved successfully', vitals
+            if len(records) > MAX_VITALS_BATCH_SIZE:
+                return False, f'At most {MAX_VITALS_BATCH_SIZE} records per batch', []
+            
+            results = [None] * len(records)
+            rows = []
+            for index, vital_data in enumerate(records):
+                try:
+                    row = self._build_vital_row(vital_data, uploaded_by)
+                    if vital_ids:
+                        row['id'] = vital_ids[index]
+                    rows.append((index, row))
+                except (ValueError, TypeError, AttributeError) as e:
+                    results[index] = {'index': index, 'success': False, 'error': str(e)}
+            
+            # One lookup instead of letting a foreign key error fail the whole insert
+            patient_ids = list({row['patient_id'] for _, row in rows})
+            known = set()
+            if patient_ids:
+                patients = self.supabase.table('patients').select('id').in_('id', patient_ids).execute()
+                known = {patient['id'] for patient in patients.data or []}
+            valid = []
+            for index, row in rows:
+                if row['patient_id'] in known:
+                    valid.append((index, row))
+                else:
+                    results[index] = {'index': index, 'success': False, 'error': f"Unknown patient: {row['patient_id']}"}
+            
+            if valid:
+                try:
+                    inserted = self.supabase.table('vital_uploads').insert([row for _, row in valid]).execute()
+                    for index, row in valid:
+                        results[index] = {'index': index, 'success': True, 'vital_id': row['id']}
+                    for row in inserted.data or []:
+                        remember_latest_vitals(row)
+                except Exception as e:
+                    # The statement is atomic; retry one by one so each record
+                    # reports its own outcome
+                    print(f"Batch vitals insert failed, retrying per record: {str(e)}")
+                    for index, row in valid:
+                        try:
+                            inserted = self.supabase.table('vital_uploads').insert(row).execute()
+                            results[index] = {'index': index, 'success': True, 'vital_id': row['id']}
+                            for inserted_row in inserted.data or []:
+                                remember_latest_vitals(inserted_row)
+                        except Exception as row_error:
+                            results[index] = {'index': index, 'success': False,
+                                              'duplicate': bool(vital_ids) and is_duplicate_key_error(row_error),
+                                              'error': f'Failed to upload vital signs: {str(row_error)}'}
+            
+            inserted_ids = {result['vital_id'] for result in results if result['success']}
+            self._detect_anomalies(sorted((row for _, row in valid if row['id'] in inserted_ids),
+                                          key=lambda row: str(row['recorded_at'])))
+            
+            created = sum(1 for result in results if result['success'])
+            return True, f'{created} of {len(records)} vital records uploaded', results
             
         except Exception as e:
-            print(f"=== DEBUG: Exception in get_patient_vitals: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return True, 'No vitals found (error occurred)', []
+            print(f"Error in create_vital_uploads: {str(e)}")
+            return False, f'Failed to upload vital signs: {str(e)}', []
     
-    def get_recent_vitals(self, limit=20):
-        """Get recent vital signs across all patients"""
+    def _detect_anomalies(self, rows):
+        """Check new readings against each patient's baseline (never fails the upload)"""
         try:
-            print(f"=== DEBUG: Getting recent vitals with limit={limit} ===")
-            
-            # First get the vitals data
-            vitals_result = self.supabase.table('vital_uploads')\
-                .select('*')\
-                .order('uploaded_at', desc=True)\
-                .limit(limit)\
-                .execute()
+            self.anomaly_service.observe_rows(rows, 'charted')
+        except Exception as e:
+            print(f"Anomaly detection failed: {str(e)}")
+    
+    def _build_vital_row(self, vital_data, uploaded_by):
+        """Validate a vitals payload and map it onto a vital_uploads row (raises ValueError)."""
+        for field in VITAL_REQUIRED_FIELDS:
+            if field not in vital_data or vital_data[field] is None:
+                raise ValueError(f'Missing required field: {field}')
+        # Checked here so one malformed id cannot fail the batch's patient lookup
+        patient_id = vital_data['patient_id']
+        if not isinstance(patient_id, str) or not UUID_PATTERN.match(patient_id):
+            raise ValueError('patient_id must be a patient UUID')
+        
+        insert_data = {
+            'id': str(uuid.uuid4()),
+            'patient_id': patient_id.lower(),
+            'heart_rate': int(vital_data.get('heart_rate')),
+            'blood_pressure_systolic': int(vital_data.get('blood_pressure_systolic')),
+            'blood_pressure_diastolic': int(vital_data.get('blood_pressure_diastolic')),
+            'temperature': float(vital_data.get('temperature')),
+            'respiratory_rate': int(vital_data.get('respiratory_rate')),
+            'oxygen_saturation': float(vital_data.get('oxygen_saturation')),
+            'notes': vital_data.get('notes', ''),
+            'recorded_at': vital_data.get('recorded_at', datetime.now(timezone.utc).isoformat()),
+            'uploaded_by': uploaded_by
+        }
+        
+        for field, (low, high) in VITAL_RANGES.items():
+            if not low <= insert_data[field] <= high:
+                raise ValueError(f'{field} must be between {low} and {high}')
+        
+        # Optional early-warning inputs (AVPU/ACVPU level, oxygen therapy)
+        if vital_data.get('consciousness'):
+            insert_data['consciousness'] = str(vital_data['consciousness']).upper()[:1]
+            if insert_data['consciousness'] not in CONSCIOUSNESS_LEVELS:
+                raise ValueError(f"consciousness must be one of {', '.join(CONSCIOUSNESS_LEVELS)}")
+        if vital_data.get('supplemental_oxygen') is not None:
+            insert_data['supplemental_oxygen'] = _parse_flag(vital_data['supplemental_oxygen'], 'supplemental_oxygen')
+        
+        return insert_data
+    
+    def get_latest_vitals(self, patient_ids):
+        """Newest vitals row for each of the given patients ({patient_id: row or None}).
+        
+        Served from the in-process index; patients not indexed yet are read
+        together from the latest_vital_uploads view, so a whole ward costs at
+        most one query.
+        """
+        try:
+            patient_ids = list(dict.fromkeys(str(patient_id) for patient_id in patient_ids if patient_id))
+            if len(patient_ids) > MAX_LATEST_VITALS_PATIENTS:
+                return False, f'At most {MAX_LATEST_VITALS_PATIENTS} patients per lookup', {}
+            
+            latest = {}
+            missing = []
+            for patient_id in patient_ids:
+                cached = _latest_vitals.get(patient_id)
+                if cached is None:
+                    missing.append(patient_id)
+                else:
+                    latest[patient_id] = None if cached is _NO_VITALS else cached
+            
+            for start in range(0, len(missing), LATEST_VITALS_LOOKUP_BATCH_SIZE):
+                batch = missing[start:start + LATEST_VITALS_LOOKUP_BATCH_SIZE]
+                result = self.supabase.table('latest_vital_uploads')\
+                    .select('*')\
+                    .in_('patient_id', batch)\
+                    .execute()
+                found = {row['patient_id']: row for row in result.data or []}
+                for patient_id in batch:
+                    row = found.get(patient_id)
+                    _latest_vitals.set(patient_id, row if row is not None else _NO_VITALS)
+                    latest[patient_id] = row
+            
+            return True, 'Latest vitals retrieved successfully', latest
             
-            print(f"=== DEBUG: Found {len(vitals_result.data or [])} vital records ===")
+        except Exception as e:
+            print(f"Error in get_latest_vitals: {str(e)}")
+            return False, f'Failed to get latest vitals: {str(e)}', {}
+    
+    def get_patient_vitals(self, patient_id, limit=10, cursor=None, filters=None):
+        """Get vital signs for a specific patient, newest recorded first"""
+        return self._list_vitals('recorded_at', limit, cursor, filters, patient_ids=[patient_id])
+    
+    def get_recent_vitals(self, limit=20, cursor=None, filters=None, patient_ids=None):
+        """Get recent vital signs across all patients, newest uploaded first"""
+        return self._list_vitals('uploaded_at', limit, cursor, filters, patient_ids=patient_ids)
+    
+    def iter_patient_vitals(self, patient_id, page_size=500):
+        """Every vitals row of a patient, newest recorded first, one page at a time.
+        
+        Unlike get_patient_vitals, a failed query raises instead of reading as
+        an empty page, so callers that must see everything (exports) can tell.
+        """
+        cursor = None
+        while True:
+            _, _, page = self._list_vitals('recorded_at', page_size, cursor, None,
+                                           patient_ids=[patient_id], strict=True)
+            if page['vitals']:
+                yield page['vitals']
+            cursor = page['next_cursor']
+            if not cursor:
+                return
+    
+    def _list_vitals(self, order_column, limit, cursor, filters, patient_ids=None, strict=False):
+        """One query: vital_uploads rows with the patient's name and MRN embedded.
+        
+        Keyset-paginated on (order_column, id); data is {'vitals', 'next_cursor'}.
+        filters: since/until bound recorded_at. With strict, database errors raise.
+        """
+        try:
+            query = self.supabase.table('vital_uploads')\
+                .select(f'{VITAL_LIST_COLUMNS}, {VITAL_PATIENT_EMBED}')
             
-            if not vitals_result.data:
-                return True, 'No vitals found', []
+            if patient_ids:
+                query = query.eq('patient_id', patient_ids[0]) if len(patient_ids) == 1 else query.in_('patient_id', patient_ids)
             
-            # Get all unique patient IDs
-            patient_ids = list(set(row['patient_id'] for row in vitals_result.data))
-            print(f"=== DEBUG: Unique patient IDs: {patient_ids} ===")
+            filters = filters or {}
+            if filters.get('since'):
+                query = query.gte('recorded_at', filters['since'])
+            if filters.get('until'):
+                query = query.lte('recorded_at', filters['until'])
             
-            # Fetch patient information
-            patients_result = self.supabase.table('patients')\
-                .select('id, first_name, last_name, medical_record_number')\
-                .in_('id', patient_ids)\
-                .execute()
+            if cursor:
+                position, last_id = _decode_vitals_cursor(cursor)
+                query = query.or_(
+                    f'{order_column}.lt."{position}",and({order_column}.eq."{position}",id.lt.{last_id})'
+                )
             
-            print(f"=== DEBUG: Found {len(patients_result.data or [])} patient records ===")
+            query = query.order(order_column, desc=True).order('id', desc=True)
+            if limit:
+                # One extra row tells us whether another page exists
+                query = query.limit(limit + 1)
             
-            # Create patient lookup
-            patients_lookup = {}
-            for patient in patients_result.data or []:
-                patients_lookup[patient['id']] = {
-                    'first_name': patient.get('first_name', ''),
-                    'last_name': patient.get('last_name', ''),
-                    'medical_record_number': patient.get('medical_record_number', '')
-                }
+            rows = query.execute().data or []
             
-            # Format results
-            vitals = []
-            for row in vitals_result.data:
-                patient_info = patients_lookup.get(row['patient_id'], {})
-                patient_name = f"{patient_info.get('first_name', '')} {patient_info.get('last_name', '')}".strip()
-                
-                vitals.append({
-                    'id': row.get('id'),
-                    'patient_id': row.get('patient_id'),
-                    'patient_name': patient_name or 'Unknown Patient',
-                    'patient_code': patient_info.get('medical_record_number', ''),
-                    'heart_rate': row.get('heart_rate'),
-                    'blood_pressure_systolic': row.get('blood_pressure_systolic'),
-                    'blood_pressure_diastolic': row.get('blood_pressure_diastolic'),
-                    'temperature': row.get('temperature'),
-                    'respiratory_rate': row.get('respiratory_rate'),
-                    'oxygen_saturation': row.get('oxygen_saturation'),
-                    'notes': row.get('notes', ''),
-                    'recorded_at': row.get('recorded_at'),
-                    'uploaded_at': row.get('uploaded_at'),
-                    'uploaded_by': row.get('uploaded_by')
-                })
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = _encode_vitals_cursor(rows[-1], order_column)
             
-            print(f"=== DEBUG: Formatted {len(vitals)} vitals records ===")
-            return True, 'Recent vitals retrieved successfully', vitals
+            vitals = [_format_vital_row(row) for row in rows]
+            message = 'Vitals retrieved successfully' if vitals else 'No vitals found'
+            return True, message, {'vitals': vitals, 'next_cursor': next_cursor}
             
+        except ValueError as e:
+            return False, f'Invalid cursor: {str(e)}', {'vitals': [], 'next_cursor': None}
         except Exception as e:
-            print(f"=== DEBUG: Exception in get_recent_vitals: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Return empty list if there's an error
-            return True, 'No vitals found (error occurred)', []
+            print(f"Error listing vitals: {str(e)}")
+            if strict:
+                raise
+            return True, 'No vitals found (error occurred)', {'vitals': [], 'next_cursor': None}
     
     def update_vital_record(self, vital_id, vital_data):
         """Update an existing vital signs record"""
@@ -225,7 +404,8 @@ class VitalsService:
                 'temperature': float(vital_data.get('temperature')),
                 'respiratory_rate': int(vital_data.get('respiratory_rate')),
                 'oxygen_saturation': float(vital_data.get('oxygen_saturation')),
-                'notes': vital_data.get('notes', '')
+                'notes': vital_data.get('notes', ''),
+                'updated_at': datetime.now(timezone.utc).isoformat()
             }
             
             result = self.supabase.table('vital_uploads')\
@@ -234,6 +414,9 @@ class VitalsService:
                 .execute()
             
             if result.data:
+                # Re-read on next lookup rather than guess whether the cached
+                # row (or a newer one) is still the patient's latest
+                forget_latest_vitals(row.get('patient_id') for row in result.data)
                 return True, 'Vital record updated successfully'
             else:
                 return False, 'Failed to update vital record'
@@ -250,6 +433,8 @@ class VitalsService:
                 .execute()
             
             if result.data:
+                # The patient's previous row may be the latest now; re-read on next lookup
+                forget_latest_vitals(row.get('patient_id') for row in result.data)
                 return True, 'Vital record deleted successfully'
             else:
                 return False, 'Failed to delete vital record'
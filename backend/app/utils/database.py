@@ -95,6 +95,7 @@ CREATE TABLE IF NOT EXISTS patients (
     emergency_contact_name VARCHAR(200),
     emergency_contact_phone VARCHAR(20),
     medical_record_number VARCHAR(50) UNIQUE,
+    fhir_id VARCHAR(64),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     created_by UUID REFERENCES users(id)
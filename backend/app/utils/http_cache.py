@@ -0,0 +1,157 @@
+# Conditional GET (ETag / If-None-Match) and response compression middleware
+import gzip
+import hashlib
+import logging
+import zlib
+from typing import Dict, Optional, Tuple
+
+from flask import Flask, g, request
+from flask_jwt_extended import verify_jwt_in_request
+
+from app.utils.database import get_supabase_client
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# endpoint -> (table, version column, {request arg or view arg: table column})
+# The version of a list/detail response is the newest version column value plus
+# the row count, both answered by one small indexed query.
+ROW_VERSION_SOURCES: Dict[str, Tuple[str, str, Dict[str, str]]] = {
+    'lab_reports.get_lab_reports': ('lab_reports', 'updated_at', {'patient_id': 'patient_id'}),
+    'lab_reports.get_lab_report': ('lab_reports', 'updated_at', {'report_id': 'id'}),
+    'patients.get_all_patients': ('patients', 'updated_at', {}),
+    'patients.get_patient_by_id': ('patients', 'updated_at', {'patient_id': 'id'}),
+    'vitals.get_patient_vitals': ('vital_uploads', 'updated_at', {'patient_id': 'patient_id'}),
+    'vitals.get_recent_vitals': ('vital_uploads', 'updated_at', {}),
+}
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'application/fhir+json',
+                          'application/fhir+ndjson', 'text/plain', 'text/html', 'text/csv'}
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+
+
+def compute_row_version_etag(endpoint: str) -> Optional[str]:
+    """Return a weak ETag for the current request, or None if it cannot be computed."""
+    source = ROW_VERSION_SOURCES.get(endpoint)
+    if not source:
+        return None
+
+    table, version_column, filter_columns = source
+    supabase = get_supabase_client()
+    try:
+        query = supabase.table(table).select(version_column, count='exact')
+        for arg_name, column in filter_columns.items():
+            value = (request.view_args or {}).get(arg_name) or request.args.get(arg_name)
+            if value:
+                query = query.eq(column, value)
+        result = query.order(version_column, desc=True).limit(1).execute()
+    except Exception as exc:
+        logger.warning('Row version lookup failed for %s: %s', endpoint, exc)
+        return None
+
+    latest = result.data[0].get(version_column) if result.data else None
+    fingerprint = f"{endpoint}|{request.query_string.decode('utf-8')}|{result.count}|{latest}"
+    digest = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:32]
+    # Weak, because the same representation may be sent gzip/brotli encoded
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return '*' in candidates or any(
+        (tag[2:] if tag.startswith('W/') else tag) == bare for tag in candidates
+    )
+
+
+def _pick_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',') if part.strip()}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compress_stream(chunks, encoding: str):
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+def init_http_cache(app: Flask) -> None:
+    """Register ETag/304 handling and gzip/brotli compression on the app."""
+    app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_COMPRESS_MIN_SIZE)
+
+    @app.before_request
+    def answer_conditional_get():
+        if request.method != 'GET' or request.endpoint not in ROW_VERSION_SOURCES:
+            return None
+
+        # Never reveal row versions to unauthenticated callers
+        try:
+            verify_jwt_in_request()
+        except Exception:
+            return None
+
+        etag = compute_row_version_etag(request.endpoint)
+        if not etag:
+            return None
+        g.row_version_etag = etag
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and _etag_matches(if_none_match, etag):
+            response = app.response_class(status=304)
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return None
+
+    @app.after_request
+    def add_etag_and_compress(response):
+        etag = g.pop('row_version_etag', None)
+        if etag and response.status_code == 200:
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'private, no-cache'
+
+        if (response.status_code < 200 or response.status_code >= 300
+                or response.status_code == 204
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        encoding = _pick_encoding(request.headers.get('Accept-Encoding', ''))
+        if not encoding:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed:
+            # Size is unknown up front; streamed bodies are list payloads, always worth it
+            response.response = _compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(body, quality=5))
+            else:
+                response.set_data(gzip.compress(body, compresslevel=6))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
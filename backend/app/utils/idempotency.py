@@ -0,0 +1,125 @@
+# Idempotency-Key support for write endpoints that clients retry
+import functools
+import hashlib
+import threading
+import uuid
+from typing import Any, Callable, Dict, Tuple
+
+from flask import g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from app.utils.cache import TTLCache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Completed responses per (user, endpoint, key). A tablet retrying after a
+# dropped connection does so within minutes; a day bounds the worst case.
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+_responses = TTLCache(maxsize=20000, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+# How long a retry waits for the original request, still running, to finish
+IDEMPOTENCY_WAIT_SECONDS = 10
+
+_in_flight: Dict[Tuple[str, str, str], threading.Event] = {}
+_in_flight_lock = threading.Lock()
+
+# Namespace for record ids derived from idempotency keys
+IDEMPOTENT_ID_NAMESPACE = uuid.UUID('5b0d7c1e-3f7a-4c61-9a53-2f1e8d6b4a90')
+
+
+def idempotent_id() -> str:
+    """Id for the record this request creates.
+
+    With an Idempotency-Key the id is derived from (user, endpoint, key), so
+    a retry that lands on another worker collides on the primary key instead
+    of inserting a second row. Without one it is a fresh uuid4.
+    """
+    scope = getattr(g, 'idempotency_scope', None)
+    if scope is None:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(IDEMPOTENT_ID_NAMESPACE, '|'.join(scope)))
+
+
+def _replay(entry: Dict[str, Any]):
+    response = make_response(entry['body'], entry['status'])
+    response.headers['Content-Type'] = entry['content_type']
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view: Callable) -> Callable:
+    """Replay the stored response when a request repeats its Idempotency-Key.
+
+    Apply below @jwt_required(). Requests without the header run as before.
+    The first completed response (anything but a 5xx) is kept for
+    IDEMPOTENCY_TTL_SECONDS; repeats with the same body get it back without
+    running the view again, repeats with a different body get 422, and a
+    repeat arriving while the original is still running waits for it.
+    """
+    @functools.wraps(view)
+    def wrapper(*args: Any, **kwargs: Any):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return jsonify({'success': False, 'error': f'{IDEMPOTENCY_HEADER} is too long'}), 400
+
+        scope = (str(get_jwt_identity()), request.endpoint or request.path, key)
+        fingerprint = hashlib.sha256(request.get_data(cache=True)).hexdigest()
+
+        while True:
+            entry = _responses.get(scope)
+            if entry is not None:
+                if entry['fingerprint'] != fingerprint:
+                    return jsonify({
+                        'success': False,
+                        'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'
+                    }), 422
+                return _replay(entry)
+
+            with _in_flight_lock:
+                running = _in_flight.get(scope)
+                if running is None:
+                    done = _in_flight[scope] = threading.Event()
+                    break
+            if not running.wait(IDEMPOTENCY_WAIT_SECONDS):
+                return jsonify({
+                    'success': False,
+                    'error': 'A request with this Idempotency-Key is still in progress'
+                }), 409
+
+        try:
+            g.idempotency_scope = scope
+            response = make_response(view(*args, **kwargs))
+            if response.status_code < 500 and not response.is_streamed:
+                _responses.set(scope, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'content_type': response.headers.get('Content-Type', 'application/json'),
+                    'body': response.get_data()
+                })
+            return response
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(scope, None)
+            done.set()
+
+    return wrapper
+
+
+def is_duplicate_key_error(error: Exception) -> bool:
+    """True for a unique/primary key violation reported by PostgREST."""
+    return getattr(error, 'code', None) == '23505' or '23505' in str(error)
+
+
+# SQLSTATE classes meaning the rows themselves were refused (22: data
+# exception, 23: integrity constraint). Anything else (timeouts, lost
+# connections, PostgREST 5xx) may succeed when the same request is retried.
+DATA_ERROR_SQLSTATE_CLASSES = ('22', '23')
+
+
+def is_data_error(error: Exception) -> bool:
+    """True when PostgREST rejected the submitted values, not the request itself."""
+    code = getattr(error, 'code', None)
+    return isinstance(code, str) and code[:2] in DATA_ERROR_SQLSTATE_CLASSES
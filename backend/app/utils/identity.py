@@ -0,0 +1,37 @@
+# Resolve the user behind a JWT once per request, through the user cache
+from typing import Optional
+
+from flask_jwt_extended import JWTManager, get_current_user as _jwt_current_user
+
+from app.models.user import User
+from app.services.auth_service import AuthService
+
+
+def init_identity(jwt: JWTManager) -> None:
+    """Load the token's user on every @jwt_required request.
+
+    A token is refused (401) when its user no longer exists, has been
+    deactivated, or no longer holds the role the token was issued with, so
+    the role claims routes check via get_jwt() are at most
+    USER_CACHE_TTL_SECONDS out of date. A failed lookup (database down) is
+    not a bad token: it propagates and the request fails with a 500.
+    """
+    auth_service = AuthService()
+
+    @jwt.user_lookup_loader
+    def load_user(jwt_header, jwt_data):
+        user = auth_service.get_user_by_id(jwt_data['sub'], strict=True)
+        if not user or not user.is_active:
+            return None
+        if jwt_data.get('role') and jwt_data['role'] != user.role:
+            return None
+        return user
+
+    @jwt.user_lookup_error_loader
+    def user_lookup_error(jwt_header, jwt_data):
+        return {'error': 'User not found or deactivated'}, 401
+
+
+def get_current_user() -> Optional[User]:
+    """The User behind the current request's token (no extra database query)."""
+    return _jwt_current_user()
@@ -0,0 +1,85 @@
+# Fast JSON serialisation for Flask responses
+import decimal
+from typing import Any, Dict, Iterable, Optional, Union
+
+import orjson
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+# Rows are encoded in batches so each yielded chunk is large enough to be
+# worth a socket write without holding the whole list in memory.
+STREAM_BATCH_SIZE = 200
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """Encode types orjson does not handle natively."""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialise obj to UTF-8 JSON bytes with the shared orjson options."""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson; handles datetime, UUID and Decimal natively."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            # Callers asking for stdlib-specific options (indent, sort_keys, ...)
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            body = orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS | orjson.OPT_INDENT_2)
+        else:
+            body = dumps_bytes(obj)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def stream_json_list(
+    key: str,
+    rows: Iterable[Any],
+    status: int = 200,
+    extra: Optional[Dict[str, Any]] = None
+) -> Response:
+    """Stream ``{**extra, key: [rows...]}`` incrementally instead of building one large body.
+
+    ``extra`` fields are emitted before the list, so they must be known up front
+    (counts computed while streaming are not available).
+    """
+    def generate():
+        head = dumps_bytes(extra or {})
+        if len(head) > 2:
+            yield head[:-1] + b',' + dumps_bytes(key) + b':['
+        else:
+            yield b'{' + dumps_bytes(key) + b':['
+
+        batch = []
+        first = True
+        for row in rows:
+            batch.append(dumps_bytes(row))
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield (b'' if first else b',') + b','.join(batch)
+                first = False
+                batch = []
+        if batch:
+            yield (b'' if first else b',') + b','.join(batch)
+        yield b']}\n'
+
+    return Response(generate(), status=status, mimetype='application/json')
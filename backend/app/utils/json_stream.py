@@ -0,0 +1,114 @@
+# Incremental reading of one large JSON document from a byte stream
+import codecs
+import json
+import re
+from typing import Any, BinaryIO, Iterator, Optional
+
+# Bytes read from the stream per refill
+JSON_STREAM_READ_BYTES = 256 * 1024
+# Largest single value (e.g. one Bundle entry) held while it is decoded
+MAX_JSON_VALUE_CHARS = 16 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class JSONStreamReader:
+    """Pulls JSON tokens and whole values off a stream without reading all of it.
+
+    Only the value being decoded (plus one read block) is buffered: containers
+    can be entered token by token with expect(), and each element is decoded
+    with value(), which refills the buffer until the element is complete.
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int = JSON_STREAM_READ_BYTES,
+                 max_value_chars: int = MAX_JSON_VALUE_CHARS) -> None:
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_value_chars = max_value_chars
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self._text.decode(b'', final=True)
+        else:
+            self.buffer = self.buffer[self.pos:] + self._text.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self) -> Optional[str]:
+        """Next non-whitespace character (not consumed), or None at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, chars: str) -> str:
+        """Consume the next token, which must be one of chars; raises ValueError."""
+        char = self.peek()
+        if char is None or char not in chars:
+            found = 'end of input' if char is None else repr(char)
+            raise ValueError(f'Expected one of {chars!r} at offset {self.pos}, found {found}')
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        if self.peek() is None:
+            raise ValueError('Unexpected end of input')
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if len(self.buffer) - self.pos > self.max_value_chars:
+                    raise ValueError(f'JSON value larger than {self.max_value_chars} characters')
+                if not self._fill():
+                    raise
+                continue
+            # A number ending exactly at the end of the buffer may continue in the next block
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_object_items(reader: JSONStreamReader) -> Iterator[str]:
+    """Keys of the object at the reader, positioned on each key's value.
+
+    The caller must consume the value (reader.value() or token by token)
+    before asking for the next key.
+    """
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, str):
+            raise ValueError('Object keys must be strings')
+        reader.expect(':')
+        yield key
+        if reader.expect(',}') == '}':
+            return
+
+
+def iter_array_values(reader: JSONStreamReader) -> Iterator[Any]:
+    """Decoded elements of the array at the reader, one at a time."""
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.expect(']')
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
@@ -0,0 +1,81 @@
+# In-memory stand-in for the Supabase client, used by the benchmarks.
+#
+# It supports the small part of the query builder the ingest paths use (select,
+# insert, upsert ignoring duplicates, eq, in_, limit, execute) and sleeps for a
+# fixed round trip on every execute(), so a benchmark counts what matters for
+# ingest: database calls.
+import threading
+import time
+
+
+class LocalResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class LocalQuery:
+    def __init__(self, database, table):
+        self.database = database
+        self.table = table
+        self.rows = None
+        self.conflict_columns = None
+        self.filters = []
+        self.max_rows = None
+
+    def select(self, *columns, **kwargs):
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict='', **kwargs):
+        self.conflict_columns = on_conflict.split(',')
+        return self.insert(rows)
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def in_(self, column, values):
+        values = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in values)
+        return self
+
+    def limit(self, count, **kwargs):
+        self.max_rows = count
+        return self
+
+    def execute(self):
+        time.sleep(self.database.round_trip_seconds)
+        with self.database.lock:
+            self.database.calls += 1
+            stored = self.database.tables.setdefault(self.table, [])
+            if self.rows is not None:
+                rows = self.rows
+                if self.conflict_columns:
+                    keys = self.database.keys.setdefault(self.table, set())
+                    rows = []
+                    for row in self.rows:
+                        key = tuple(row.get(column) for column in self.conflict_columns)
+                        if key not in keys:
+                            keys.add(key)
+                            rows.append(row)
+                stored.extend(rows)
+                return LocalResult(list(rows))
+            found = [row for row in stored if all(match(row) for match in self.filters)]
+        return LocalResult(found[:self.max_rows] if self.max_rows else found)
+
+
+class LocalDatabase:
+    """Tables as lists of dicts; every execute() costs round_trip_seconds."""
+
+    def __init__(self, round_trip_seconds=0.005):
+        self.round_trip_seconds = round_trip_seconds
+        self.tables = {}
+        self.keys = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return LocalQuery(self, name)
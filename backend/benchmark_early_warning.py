@@ -0,0 +1,106 @@
+# Throughput of the vectorised NEWS2 engine on synthetic vital_uploads rows.
+#
+#   python benchmark_early_warning.py --rows 100000
+#   python benchmark_early_warning.py --url http://localhost:5000 --token <JWT>
+#
+# Without --url it scores rows in-process (no database) and checks the result
+# against a row-at-a-time scorer. With --url it also times the ward endpoint.
+import argparse
+import bisect
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services.early_warning_service import (
+    compute_news2, fahrenheit_to_celsius, score_vitals_rows, scored_observations,
+    NEWS2_BANDS, NOT_ALERT_SCORE, SUPPLEMENTAL_OXYGEN_SCORE
+)
+
+
+def synthetic_rows(count, patients, seed=1):
+    rng = np.random.default_rng(seed)
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    columns = {
+        'respiratory_rate': rng.integers(6, 36, count),
+        'oxygen_saturation': rng.uniform(85, 100, count).round(1),
+        'blood_pressure_systolic': rng.integers(75, 230, count),
+        'heart_rate': rng.integers(35, 150, count),
+        'temperature': rng.uniform(94, 104, count).round(1),
+    }
+    # Some unrecorded values, as in real charts
+    gaps = rng.random((len(columns), count)) < 0.02
+    consciousness = rng.choice(['A'] * 19 + ['V'], count)
+    oxygen = rng.random(count) < 0.1
+    values = {name: column.tolist() for name, column in columns.items()}
+    return [dict(
+        {name: (None if gaps[c, i] else values[name][i]) for c, name in enumerate(values)},
+        id=str(i), patient_id=f'bench-{i % patients}', consciousness=str(consciousness[i]),
+        supplemental_oxygen=bool(oxygen[i]), recorded_at=(started + timedelta(seconds=i)).isoformat()
+    ) for i in range(count)]
+
+
+def score_row(row):
+    """One observation at a time, in plain Python (the shape of the old per-patient scoring)."""
+    total = 0
+    for name, (edges, scores) in NEWS2_BANDS.items():
+        value = row.get(name)
+        if value is None:
+            continue
+        if name == 'temperature':
+            value = round((value - 32.0) * 5.0 / 9.0, 1)
+        total += scores[bisect.bisect_left(edges, value)]
+    if (row.get('consciousness') or 'A') != 'A':
+        total += NOT_ALERT_SCORE
+    if row.get('supplemental_oxygen'):
+        total += SUPPLEMENTAL_OXYGEN_SCORE
+    return total
+
+
+def best_of(repeats, function, *args):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--patients', type=int, default=3000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--url', help='base URL of a running backend, e.g. http://localhost:5000')
+    parser.add_argument('--token', help='JWT for --url')
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.patients)
+    print(f'{args.rows:,} vitals rows across {args.patients:,} patients')
+
+    arrays = [np.array([np.nan if row[name] is None else row[name] for row in rows], dtype=float)
+              for name in ('respiratory_rate', 'oxygen_saturation', 'blood_pressure_systolic', 'heart_rate', 'temperature')]
+    arrays[4] = fahrenheit_to_celsius(arrays[4])
+    not_alert = np.array([row['consciousness'] != 'A' for row in rows])
+    oxygen = np.array([row['supplemental_oxygen'] for row in rows])
+
+    elapsed, _ = best_of(args.repeats, compute_news2, *arrays, not_alert, oxygen)
+    print(f'compute_news2 (arrays)          {elapsed * 1000:>8.1f} ms {args.rows / elapsed:>14,.0f} rows/s')
+    elapsed, scores = best_of(args.repeats, score_vitals_rows, rows)
+    print(f'score_vitals_rows (dict rows)   {elapsed * 1000:>8.1f} ms {args.rows / elapsed:>14,.0f} rows/s')
+    elapsed, _ = best_of(args.repeats, scored_observations, rows, scores)
+    print(f'scored_observations (annotate)  {elapsed * 1000:>8.1f} ms {args.rows / elapsed:>14,.0f} rows/s')
+    elapsed, reference = best_of(1, lambda: [score_row(row) for row in rows])
+    print(f'row-at-a-time Python            {elapsed * 1000:>8.1f} ms {args.rows / elapsed:>14,.0f} rows/s')
+
+    mismatches = int(np.count_nonzero(scores['total'] != np.array(reference)))
+    print(f'totals differing from the row-at-a-time scorer: {mismatches}')
+
+    if args.url:
+        import requests
+        started = time.perf_counter()
+        response = requests.get(f"{args.url.rstrip('/')}/api/vitals/early-warning/ward",
+                                headers={'Authorization': f'Bearer {args.token}'})
+        elapsed = time.perf_counter() - started
+        print(f'GET /api/vitals/early-warning/ward: HTTP {response.status_code}, '
+              f"{len(response.json().get('patients', []))} patients in {elapsed * 1000:.0f} ms")
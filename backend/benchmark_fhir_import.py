@@ -0,0 +1,126 @@
+# Throughput of the FHIR import path on a synthetic bundle.
+#
+#   python benchmark_fhir_import.py --patients 2000 --vitals 200
+#   python benchmark_fhir_import.py --url http://localhost:5000 --token <admin JWT>
+#
+# Without --url it measures the streaming parsers and the resource mapping
+# (no database). With --url it posts the NDJSON file to /api/fhir/import too.
+import argparse
+import io
+import tempfile
+import time
+import tracemalloc
+
+import orjson
+
+from app.services.fhir_service import (
+    iter_bundle_resources, iter_ndjson_resources, lab_report_from_fhir, observation_vitals, patient_from_fhir,
+    VITAL_SIGN_CODES, LOINC_SYSTEM
+)
+
+
+def synthetic_resources(patients, vitals_per_patient, reports_per_patient):
+    for p in range(patients):
+        patient_id = f'bench-{p}'
+        yield {
+            'resourceType': 'Patient', 'id': patient_id,
+            'identifier': [{'system': 'urn:bench', 'value': f'BENCH{p:07d}'}],
+            'name': [{'family': f'Family{p}', 'given': ['Given']}],
+            'gender': 'female' if p % 2 else 'male', 'birthDate': '1970-01-01'
+        }
+        for v in range(vitals_per_patient):
+            yield {
+                'resourceType': 'Observation', 'id': f'{patient_id}-v{v}', 'status': 'final',
+                'subject': {'reference': f'Patient/{patient_id}'},
+                'effectiveDateTime': f'2025-{1 + v % 12:02d}-{1 + v % 28:02d}T{v % 24:02d}:00:00Z',
+                'code': {'coding': [{'system': LOINC_SYSTEM, 'code': '85353-1'}]},
+                'component': [
+                    {'code': {'coding': [{'system': LOINC_SYSTEM, 'code': code}]},
+                     'valueQuantity': {'value': value, 'code': ucum}}
+                    for (code, _, _, ucum), value in zip(VITAL_SIGN_CODES.values(), (72, 16, 97, 98.6, 120, 80))
+                ]
+            }
+        for r in range(reports_per_patient):
+            yield {
+                'resourceType': 'DiagnosticReport', 'id': f'{patient_id}-r{r}', 'status': 'final',
+                'subject': {'reference': f'Patient/{patient_id}'}, 'code': {'text': 'CBC'},
+                'effectiveDateTime': '2025-03-01', 'issued': '2025-03-02T00:00:00Z',
+                'contained': [
+                    {'resourceType': 'Observation', 'id': f'r{i}', 'code': {'text': name},
+                     'valueQuantity': {'value': 10 + i, 'unit': 'g/dL'}, 'referenceRange': [{'text': '5-20'}]}
+                    for i, name in enumerate(('Hemoglobin', 'Hematocrit', 'WBC', 'Platelets', 'RBC'))
+                ]
+            }
+
+
+def write_files(args):
+    ndjson = tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False)
+    bundle = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+    bundle.write(b'{"resourceType":"Bundle","type":"collection","entry":[')
+    count = 0
+    for resource in synthetic_resources(args.patients, args.vitals, args.reports):
+        line = orjson.dumps(resource)
+        ndjson.write(line + b'\n')
+        bundle.write((b',' if count else b'') + b'{"resource":' + line + b'}')
+        count += 1
+    bundle.write(b']}')
+    ndjson.close()
+    bundle.close()
+    return ndjson.name, bundle.name, count
+
+
+def run(path, parse, map_resources):
+    count = 0
+    with open(path, 'rb') as stream:
+        for resource in parse(stream):
+            count += 1
+            if map_resources:
+                kind = resource['resourceType']
+                if kind == 'Patient':
+                    patient_from_fhir(resource, 'benchmark')
+                elif kind == 'Observation':
+                    observation_vitals(resource)
+                else:
+                    lab_report_from_fhir(resource)
+    return count
+
+
+def measure(label, path, parse, size_mb, map_resources=False):
+    started = time.perf_counter()
+    count = run(path, parse, map_resources)
+    elapsed = time.perf_counter() - started
+    # Second pass for memory; tracemalloc slows allocation-heavy code a lot
+    tracemalloc.start()
+    run(path, parse, map_resources)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    print(f'{label:<28} {count / elapsed:>10,.0f} resources/s {size_mb / elapsed:>8.1f} MB/s  peak {peak:.1f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--vitals', type=int, default=200, help='vital-sign panels per patient')
+    parser.add_argument('--reports', type=int, default=20, help='lab reports per patient')
+    parser.add_argument('--url', help='base URL of a running backend, e.g. http://localhost:5000')
+    parser.add_argument('--token', help='admin JWT for --url')
+    args = parser.parse_args()
+
+    ndjson_path, bundle_path, count = write_files(args)
+    size_mb = io.open(ndjson_path, 'rb').seek(0, io.SEEK_END) / 1e6
+    print(f'{count:,} resources, {size_mb:.1f} MB NDJSON')
+
+    measure('NDJSON parse', ndjson_path, iter_ndjson_resources, size_mb)
+    measure('Bundle parse (incremental)', bundle_path, iter_bundle_resources, size_mb)
+    measure('NDJSON parse + map', ndjson_path, iter_ndjson_resources, size_mb, map_resources=True)
+
+    if args.url:
+        import requests
+        started = time.perf_counter()
+        with open(ndjson_path, 'rb') as body:
+            response = requests.post(f"{args.url.rstrip('/')}/api/fhir/import", data=body,
+                                     headers={'Authorization': f'Bearer {args.token}',
+                                              'Content-Type': 'application/fhir+ndjson'})
+        elapsed = time.perf_counter() - started
+        print(f'POST /api/fhir/import: HTTP {response.status_code}, {count / elapsed:,.0f} resources/s')
+        print(response.json().get('resources'))
@@ -0,0 +1,101 @@
+# Serialisation cost of the large list responses, before (stdlib jsonify) and
+# after (orjson provider, streamed lists).
+#
+#   python benchmark_json_lists.py --rows 50000
+#   python benchmark_json_lists.py --url http://localhost:5000 --token <JWT>
+#
+# Without --url it encodes synthetic list payloads in a bare Flask app (no
+# database). With --url it also times the list endpoints of a running backend.
+import argparse
+import decimal
+import time
+import tracemalloc
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from app.utils.json_provider import OrjsonProvider, stream_json_list
+
+LIST_ENDPOINTS = ('/api/patients/list', '/api/lab-reports/list', '/api/vitals/recent?limit=1000')
+
+
+def synthetic_lab_reports(count):
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    results = [
+        {'parameter': name, 'value': value, 'unit': unit, 'normalRange': normal, 'status': 'normal'}
+        for name, value, unit, normal in (('Hemoglobin', '13.1', 'g/dL', '12-16'), ('WBC', '6.2', '10^3/uL', '4-11'),
+                                          ('Platelets', '250', '10^3/uL', '150-400'), ('Sodium', '140', 'mmol/L', '135-145'),
+                                          ('Potassium', '4.2', 'mmol/L', '3.5-5.1'))
+    ]
+    return [{
+        'id': uuid.uuid4(), 'patient_id': uuid.uuid4(), 'test_type': 'Blood', 'test_name': 'CBC',
+        'collection_date': date(2025, 1, 1) + timedelta(days=i % 365), 'status': 'completed',
+        'created_at': started + timedelta(minutes=i), 'test_results': results,
+        'patients': {'name': 'Given Family', 'patient_id': f'MRN{i:07d}', 'room': str(i % 40)}
+    } for i in range(count)]
+
+
+def synthetic_vitals(count):
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [{
+        'id': uuid.uuid4(), 'patient_id': uuid.uuid4(), 'heart_rate': 60 + i % 40,
+        'blood_pressure_systolic': 120, 'blood_pressure_diastolic': 80, 'temperature': decimal.Decimal('98.6'),
+        'respiratory_rate': 16, 'oxygen_saturation': 97.0, 'notes': '', 'recorded_at': started + timedelta(minutes=i)
+    } for i in range(count)]
+
+
+def encode(app, key, rows, streamed):
+    with app.test_request_context():
+        if streamed:
+            largest = 0
+            size = 0
+            for chunk in stream_json_list(key, rows).response:
+                largest = max(largest, len(chunk))
+                size += len(chunk)
+            return size, largest
+        body = jsonify({key: rows}).get_data()
+        return len(body), len(body)
+
+
+def measure(label, app, key, rows, streamed=False):
+    started = time.perf_counter()
+    size, largest = encode(app, key, rows, streamed)
+    elapsed = time.perf_counter() - started
+    # Second pass for memory; tracemalloc slows allocation-heavy code a lot
+    tracemalloc.start()
+    encode(app, key, rows, streamed)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    print(f'{label:<34} {elapsed * 1000:>8.0f} ms {size / 1e6 / elapsed:>8.1f} MB/s  '
+          f'peak {peak:.1f} MB  largest write {largest / 1e6:.2f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--url', help='base URL of a running backend, e.g. http://localhost:5000')
+    parser.add_argument('--token', help='JWT for --url')
+    args = parser.parse_args()
+
+    before = Flask('before')
+    before.json = DefaultJSONProvider(before)
+    after = Flask('after')
+    after.json = OrjsonProvider(after)
+
+    for key, rows in (('reports', synthetic_lab_reports(args.rows)), ('vitals', synthetic_vitals(args.rows))):
+        print(f'{args.rows:,} {key}')
+        measure('  stdlib jsonify (before)', before, key, rows)
+        measure('  orjson jsonify', after, key, rows)
+        measure('  orjson stream_json_list (after)', after, key, rows, streamed=True)
+
+    if args.url:
+        import requests
+        for endpoint in LIST_ENDPOINTS:
+            started = time.perf_counter()
+            response = requests.get(f"{args.url.rstrip('/')}{endpoint}",
+                                    headers={'Authorization': f'Bearer {args.token}'})
+            elapsed = time.perf_counter() - started
+            print(f'GET {endpoint}: HTTP {response.status_code}, {len(response.content) / 1e6:.1f} MB '
+                  f'in {elapsed * 1000:.0f} ms')
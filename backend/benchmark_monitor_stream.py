@@ -0,0 +1,111 @@
+# Load test for bedside monitor ingestion (/api/vitals/stream): many devices
+# streaming NDJSON at once, through the bounded buffer and the batch writer.
+#
+#   python benchmark_monitor_stream.py --devices 20 --samples 5000 --round-trip-ms 5
+#   python benchmark_monitor_stream.py --url http://localhost:5000 --token <JWT> --patient <id>
+#
+# Without --url each device is a thread calling MonitorStreamService.ingest,
+# with a local database stand-in behind the writer. With --url each device is a
+# chunked POST to a running backend, whose /stream/stats is polled until the
+# buffer drains.
+import argparse
+import io
+import threading
+import time
+import uuid
+
+import orjson
+
+from benchmark_database import LocalDatabase
+from app.services.monitor_stream_service import MonitorStreamService, get_monitor_writer, iter_ndjson_lines
+
+
+def device_lines(device, patient_id, samples):
+    for i in range(samples):
+        yield orjson.dumps({
+            'device_id': f'bench-bed-{device}', 'patient_id': patient_id, 'recorded_at': 1760000000 + i,
+            'heart_rate': 60 + i % 40, 'respiratory_rate': 16, 'oxygen_saturation': 97, 'temperature_c': 37.0
+        }) + b'\n'
+
+
+def run_devices(target, count):
+    threads = [threading.Thread(target=target, args=(device,)) for device in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def measure_local(args):
+    database = LocalDatabase(args.round_trip_ms / 1000)
+    patient_ids = [str(uuid.uuid4()) for _ in range(args.devices)]
+    database.tables['patients'] = [{'id': patient_id} for patient_id in patient_ids]
+
+    writer = get_monitor_writer()
+    writer.supabase = database
+    writer.anomaly_service.supabase = database
+    service = MonitorStreamService()
+    service.supabase = database
+
+    bodies = [b''.join(device_lines(device, patient_ids[device], args.samples)) for device in range(args.devices)]
+    results = []
+
+    def device(number):
+        results.append(service.ingest(iter_ndjson_lines(io.BytesIO(bodies[number]))))
+
+    started = time.perf_counter()
+    run_devices(device, args.devices)
+    queued = time.perf_counter() - started
+    writer.flush(timeout=300)
+    written = time.perf_counter() - started
+
+    accepted = sum(result['accepted'] for result in results)
+    rows = len(database.tables.get('vital_samples', []))
+    print(f'accepted {accepted:,} samples in {queued:.2f}s ({accepted / queued:,.0f}/s), '
+          f'{rows:,} written in {written:.2f}s ({rows / written:,.0f}/s)')
+    print(f"backpressure on {sum(result['backpressure'] for result in results)} of {args.devices} streams; "
+          f'writer {writer.snapshot()}')
+
+
+def measure_http(args):
+    import requests
+    url = args.url.rstrip('/')
+    headers = {'Authorization': f'Bearer {args.token}', 'Content-Type': 'application/x-ndjson'}
+    statuses = []
+
+    def device(number):
+        response = requests.post(f'{url}/api/vitals/stream', headers=headers,
+                                 data=device_lines(number, args.patient, args.samples))
+        statuses.append((response.status_code, response.json().get('accepted', 0)))
+
+    started = time.perf_counter()
+    run_devices(device, args.devices)
+    sent = time.perf_counter() - started
+    while True:
+        stats = requests.get(f'{url}/api/vitals/stream/stats', headers=headers).json()['stats']
+        if not stats['buffered']:
+            break
+        time.sleep(0.1)
+    drained = time.perf_counter() - started
+
+    accepted = sum(count for _, count in statuses)
+    print(f'HTTP: accepted {accepted:,} samples in {sent:.2f}s ({accepted / sent:,.0f}/s), '
+          f'buffer drained after {drained:.2f}s ({accepted / drained:,.0f}/s)')
+    print(f'statuses {sorted(set(status for status, _ in statuses))}; writer {stats}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=5000, help='readings per device')
+    parser.add_argument('--round-trip-ms', type=float, default=5.0, help='simulated database round trip')
+    parser.add_argument('--url', help='base URL of a running backend, e.g. http://localhost:5000')
+    parser.add_argument('--token', help='JWT for --url')
+    parser.add_argument('--patient', help='existing patient id for --url')
+    args = parser.parse_args()
+
+    print(f'{args.devices} devices x {args.samples:,} readings')
+    if args.url:
+        measure_http(args)
+    else:
+        measure_local(args)
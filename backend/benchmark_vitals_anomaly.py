@@ -0,0 +1,95 @@
+# Throughput and detection of the per-patient EWMA anomaly detector on a
+# synthetic hospital-wide vitals stream.
+#
+#   python benchmark_vitals_anomaly.py --beds 2000 --seconds 500
+#
+# Every bed reports once per simulated second, with noise around its own
+# baseline and some missing values; every hundredth bed's heart rate climbs by
+# 40 bpm for the last fifth of the run. Runs in-process on one core, with a
+# local database stand-in for the alert inserts.
+import argparse
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmark_database import LocalDatabase
+from app.services.vitals_anomaly_service import ANOMALY_VITALS, VitalsAnomalyService, VitalsBaselines
+
+# Baseline ranges and reading noise per vital, in ANOMALY_VITALS order
+BASELINE_RANGES = ((60, 100), (12, 20), (94, 99), (100, 140), (60, 90), (97.5, 99.5))
+READING_NOISE = np.array([3.0, 1.2, 0.8, 6.0, 4.0, 0.3])
+DETERIORATION_BPM = 40
+HEART_RATE = ANOMALY_VITALS.index('heart_rate')
+
+
+def synthetic_stream(beds, seconds, seed=1):
+    """(patient_ids, deteriorating bed numbers, generator of per-second (values, timestamps))."""
+    rng = np.random.default_rng(seed)
+    baseline = np.column_stack([rng.uniform(low, high, beds) for low, high in BASELINE_RANGES])
+    deteriorating = np.arange(0, beds, 100)
+    onset = int(seconds * 0.8)
+
+    def batches():
+        for second in range(seconds):
+            values = baseline + rng.normal(0, 1, baseline.shape) * READING_NOISE
+            if second >= onset:
+                values[deteriorating, HEART_RATE] += DETERIORATION_BPM
+            values[rng.random(values.shape) < 0.05] = np.nan
+            yield values, np.full(beds, 1.76e9 + second)
+
+    return [f'bench-{bed}' for bed in range(beds)], set(deteriorating.tolist()), batches()
+
+
+def report_detection(alerts, deteriorating, readings):
+    detected = {int(alert['patient_id'].split('-')[1]) for alert in alerts
+                if alert['vital'] == 'heart_rate' and int(alert['patient_id'].split('-')[1]) in deteriorating}
+    other = sum(1 for alert in alerts
+                if alert['vital'] != 'heart_rate' or int(alert['patient_id'].split('-')[1]) not in deteriorating)
+    print(f'  deteriorating beds detected {len(detected)}/{len(deteriorating)}; '
+          f'{other} other alerts ({other / (readings * len(ANOMALY_VITALS)):.2e} per reading and vital)')
+
+
+def measure_arrays(args):
+    patient_ids, deteriorating, batches = synthetic_stream(args.beds, args.seconds)
+    baselines = VitalsBaselines()
+    alerts = []
+    elapsed = 0.0
+    for values, timestamps in batches:
+        started = time.perf_counter()
+        alerts += baselines.observe(patient_ids, values, timestamps)
+        elapsed += time.perf_counter() - started
+    readings = args.beds * args.seconds
+    print(f'VitalsBaselines.observe: {readings:,} readings in {elapsed:.2f}s ({readings / elapsed:,.0f}/s)')
+    report_detection(alerts, deteriorating, readings)
+
+
+def measure_rows(args):
+    # Dict rows as the monitor writer hands them over, timestamps as ISO strings
+    seconds = min(args.seconds, 100)
+    patient_ids, _, batches = synthetic_stream(args.beds, seconds)
+    service = VitalsAnomalyService()
+    service.supabase = LocalDatabase(0)
+    service.baselines = VitalsBaselines()
+    elapsed = 0.0
+    for values, timestamps in batches:
+        recorded_at = datetime.fromtimestamp(timestamps[0], timezone.utc).isoformat()
+        rows = [dict({vital: (None if np.isnan(value) else float(value)) for vital, value in zip(ANOMALY_VITALS, reading)},
+                     patient_id=patient_id, recorded_at=recorded_at)
+                for patient_id, reading in zip(patient_ids, values.tolist())]
+        started = time.perf_counter()
+        service.observe_rows(rows, 'monitor')
+        elapsed += time.perf_counter() - started
+    readings = args.beds * seconds
+    print(f'VitalsAnomalyService.observe_rows: {readings:,} dict rows in {elapsed:.2f}s ({readings / elapsed:,.0f}/s)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--beds', type=int, default=2000)
+    parser.add_argument('--seconds', type=int, default=500, help='simulated seconds, one reading per bed each')
+    args = parser.parse_args()
+
+    print(f'{args.beds:,} beds x {args.seconds} s at 1 Hz')
+    measure_arrays(args)
+    measure_rows(args)
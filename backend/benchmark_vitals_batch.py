@@ -0,0 +1,88 @@
+# Throughput of batch vitals ingestion (/api/vitals/batch) against one request
+# per record (/api/vitals/upload).
+#
+#   python benchmark_vitals_batch.py --records 30 300 500 --round-trip-ms 5
+#   python benchmark_vitals_batch.py --url http://localhost:5000 --token <JWT> --patient <id>
+#
+# Without --url both paths run in-process against a local database stand-in
+# that charges a fixed round trip per query. With --url the same comparison is
+# made over HTTP against a running backend.
+import argparse
+import time
+import uuid
+
+from benchmark_database import LocalDatabase
+from app.services.vitals_service import VitalsService
+
+
+def vitals_record(patient_id, i):
+    return {
+        'patient_id': patient_id, 'heart_rate': 60 + i % 40, 'blood_pressure_systolic': 120,
+        'blood_pressure_diastolic': 80, 'temperature': 98.6, 'respiratory_rate': 16, 'oxygen_saturation': 97
+    }
+
+
+def local_service(round_trip_seconds, patient_ids):
+    database = LocalDatabase(round_trip_seconds)
+    database.tables['patients'] = [{'id': patient_id} for patient_id in patient_ids]
+    service = VitalsService()
+    service.supabase = database
+    service.anomaly_service.supabase = database
+    return service, database
+
+
+def measure_local(count, round_trip_seconds):
+    patient_ids = [str(uuid.uuid4()) for _ in range(min(count, 30))]
+    records = [vitals_record(patient_ids[i % len(patient_ids)], i) for i in range(count)]
+
+    service, database = local_service(round_trip_seconds, patient_ids)
+    started = time.perf_counter()
+    for record in records:
+        success, message, _ = service.create_vital_upload(record, 'benchmark')
+        assert success, message
+    single = time.perf_counter() - started
+    single_calls = database.calls
+
+    service, database = local_service(round_trip_seconds, patient_ids)
+    started = time.perf_counter()
+    success, message, results = service.create_vital_uploads(records, 'benchmark')
+    batch = time.perf_counter() - started
+    assert success and all(result['success'] for result in results), message
+
+    print(f'{count:>6} records  per-record {single * 1000:>8.0f} ms {count / single:>8,.0f}/s {single_calls:>5} queries   '
+          f'batch {batch * 1000:>6.0f} ms {count / batch:>8,.0f}/s {database.calls:>3} queries')
+
+
+def measure_http(count, url, token, patient_id):
+    import requests
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {token}'
+    records = [vitals_record(patient_id, i) for i in range(count)]
+
+    started = time.perf_counter()
+    for record in records:
+        session.post(f'{url}/api/vitals/upload', json=record).raise_for_status()
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    session.post(f'{url}/api/vitals/batch', json={'vitals': records}).raise_for_status()
+    batch = time.perf_counter() - started
+    print(f'{count:>6} records over HTTP  per-record {count / single:>8,.0f}/s   batch {count / batch:>8,.0f}/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, nargs='+', default=[30, 300, 500], help='at most MAX_VITALS_BATCH_SIZE')
+    parser.add_argument('--round-trip-ms', type=float, default=5.0, help='simulated database round trip')
+    parser.add_argument('--url', help='base URL of a running backend, e.g. http://localhost:5000')
+    parser.add_argument('--token', help='JWT for --url')
+    parser.add_argument('--patient', help='existing patient id for --url')
+    args = parser.parse_args()
+
+    print(f'local database stand-in, {args.round_trip_ms:g} ms per round trip')
+    for count in args.records:
+        measure_local(count, args.round_trip_ms / 1000)
+
+    if args.url:
+        for count in args.records:
+            measure_http(count, args.url.rstrip('/'), args.token, args.patient)
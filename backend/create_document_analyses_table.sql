@@ -0,0 +1,61 @@
+-- Per-document AI analyses (one row per stored PDF, computed once)
+CREATE TABLE IF NOT EXISTS document_analyses (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    patient_id UUID NOT NULL,
+    bucket VARCHAR(100) NOT NULL,
+    storage_path TEXT NOT NULL,
+    content_hash CHAR(64),
+    document_created_at TIMESTAMP WITH TIME ZONE,
+    risk_score INTEGER CHECK (risk_score >= 0 AND risk_score <= 100),
+    ai_summary TEXT,
+    risk_factors JSONB DEFAULT '[]'::jsonb,
+    recommendations JSONB DEFAULT '[]'::jsonb,
+    key_terms JSONB DEFAULT '[]'::jsonb,
+    confidence_score DECIMAL(5,2),
+    model_version VARCHAR(50),
+    analysed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    CONSTRAINT uq_document_analyses_object UNIQUE (bucket, storage_path),
+    CONSTRAINT fk_document_analyses_patient
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_analyses_patient_id ON document_analyses(patient_id, bucket);
+
+-- Running patient-level totals over document_analyses, merged incrementally
+CREATE TABLE IF NOT EXISTS patient_document_insights (
+    patient_id UUID PRIMARY KEY REFERENCES patients(id) ON DELETE CASCADE,
+    document_count INTEGER NOT NULL DEFAULT 0,
+    risk_sum BIGINT NOT NULL DEFAULT 0,
+    risk_max INTEGER NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    factor_counts JSONB DEFAULT '{}'::jsonb,
+    term_counts JSONB DEFAULT '{}'::jsonb,
+    recommendation_counts JSONB DEFAULT '{}'::jsonb,
+    latest_document_path TEXT,
+    latest_document_at TIMESTAMP WITH TIME ZONE,
+    latest_summary TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE document_analyses ENABLE ROW LEVEL SECURITY;
+ALTER TABLE patient_document_insights ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view document analyses" ON document_analyses
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert document analyses" ON document_analyses
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Users can update document analyses" ON document_analyses
+    FOR UPDATE USING (true);
+
+CREATE POLICY "Users can view patient document insights" ON patient_document_insights
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert patient document insights" ON patient_document_insights
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Users can update patient document insights" ON patient_document_insights
+    FOR UPDATE USING (true);
@@ -0,0 +1,48 @@
+-- Text extracted from uploaded PDFs/scans, filled in the background after upload
+CREATE TABLE IF NOT EXISTS document_extractions (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    bucket VARCHAR(100) NOT NULL,
+    storage_path TEXT NOT NULL,
+    patient_id UUID,
+    content_hash CHAR(64),
+    size_bytes BIGINT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'completed', 'empty', 'failed')),
+    extraction_mode VARCHAR(20),
+    page_count INTEGER,
+    pages JSONB DEFAULT '[]'::jsonb,
+    text TEXT,
+    error TEXT,
+    -- Consecutive failed attempts; a failed row is retried from next_attempt_at on
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE,
+    extracted_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    CONSTRAINT uq_document_extractions_object UNIQUE (bucket, storage_path),
+    CONSTRAINT fk_document_extractions_patient
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+ALTER TABLE document_extractions ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE document_extractions ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_document_extractions_patient_id ON document_extractions(patient_id);
+-- Identical bytes (same SHA-256) reuse an earlier extraction instead of running OCR again
+CREATE INDEX IF NOT EXISTS idx_document_extractions_content_hash ON document_extractions(content_hash)
+    WHERE content_hash IS NOT NULL;
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE document_extractions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view document extractions" ON document_extractions;
+CREATE POLICY "Users can view document extractions" ON document_extractions
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Users can insert document extractions" ON document_extractions;
+CREATE POLICY "Users can insert document extractions" ON document_extractions
+    FOR INSERT WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Users can update document extractions" ON document_extractions;
+CREATE POLICY "Users can update document extractions" ON document_extractions
+    FOR UPDATE USING (true);
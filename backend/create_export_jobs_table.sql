@@ -0,0 +1,49 @@
+-- Background exports of vitals / lab results to Parquet or Arrow IPC files
+-- (export_service.py). The finished file lives in the 'exports' storage bucket.
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    dataset VARCHAR(30) NOT NULL CHECK (dataset IN ('vitals', 'lab_results')),
+    format VARCHAR(20) NOT NULL DEFAULT 'parquet' CHECK (format IN ('parquet', 'arrow')),
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    range_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    range_end TIMESTAMP WITH TIME ZONE NOT NULL,
+    patient_ids UUID[],  -- NULL exports every patient
+    rows_written BIGINT,
+    row_groups INTEGER,
+    size_bytes BIGINT,
+    storage_path TEXT,
+    error TEXT,
+    requested_by UUID,
+    started_at TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    CONSTRAINT fk_export_jobs_user
+        FOREIGN KEY (requested_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_created_at ON export_jobs(created_at DESC);
+
+-- Export scans read a time window in (patient_id, time, id) order
+CREATE INDEX IF NOT EXISTS idx_vital_uploads_patient_recorded_id
+    ON vital_uploads(patient_id, recorded_at, id);
+CREATE INDEX IF NOT EXISTS idx_lab_results_patient_collected_id
+    ON lab_results(patient_id, collected_at, id);
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE export_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view export jobs" ON export_jobs
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert export jobs" ON export_jobs
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Users can update export jobs" ON export_jobs
+    FOR UPDATE USING (true);
+
+-- Storage bucket for export files (private; downloads go through signed URLs)
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('exports', 'exports', false)
+ON CONFLICT (id) DO NOTHING;
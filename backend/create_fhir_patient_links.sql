@@ -0,0 +1,9 @@
+-- FHIR interoperability (fhir_service.py): id of the Patient resource a patient
+-- was imported from, so Observations/DiagnosticReports in later files that
+-- reference "Patient/<id>" resolve to the same row. Not unique: two source
+-- systems may reuse the same id.
+ALTER TABLE patients ADD COLUMN IF NOT EXISTS fhir_id VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_patients_fhir_id ON patients(fhir_id) WHERE fhir_id IS NOT NULL;
+
+-- Incremental FHIR exports (_since) page through rows changed after a moment
+CREATE INDEX IF NOT EXISTS idx_patients_updated_at ON patients(updated_at);
@@ -0,0 +1,30 @@
+-- Progress records for chunked lab report CSV imports (resumable)
+CREATE TABLE IF NOT EXISTS lab_csv_imports (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    file_name VARCHAR(255),
+    status VARCHAR(20) DEFAULT 'processing' CHECK (status IN ('processing', 'completed', 'failed')),
+    rows_committed INTEGER DEFAULT 0,
+    chunks_committed INTEGER DEFAULT 0,
+    reports_created INTEGER DEFAULT 0,
+    errors JSONB DEFAULT '[]'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    created_by UUID,
+    
+    CONSTRAINT fk_lab_csv_imports_user 
+        FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_lab_csv_imports_created_by ON lab_csv_imports(created_by);
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE lab_csv_imports ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view lab csv imports" ON lab_csv_imports
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert lab csv imports" ON lab_csv_imports
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Users can update lab csv imports" ON lab_csv_imports
+    FOR UPDATE USING (true);
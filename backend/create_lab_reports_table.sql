@@ -22,12 +22,24 @@ CREATE TABLE IF NOT EXISTS lab_reports (
         FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
 );
 
+-- Uploaded files (content-addressed by SHA-256 of the bytes)
+ALTER TABLE lab_reports ADD COLUMN IF NOT EXISTS file_url TEXT;
+ALTER TABLE lab_reports ADD COLUMN IF NOT EXISTS file_path TEXT;
+ALTER TABLE lab_reports ADD COLUMN IF NOT EXISTS file_hash CHAR(64);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_lab_reports_patient_id ON lab_reports(patient_id);
 CREATE INDEX IF NOT EXISTS idx_lab_reports_created_by ON lab_reports(created_by);
 CREATE INDEX IF NOT EXISTS idx_lab_reports_test_type ON lab_reports(test_type);
 CREATE INDEX IF NOT EXISTS idx_lab_reports_status ON lab_reports(status);
 CREATE INDEX IF NOT EXISTS idx_lab_reports_result_date ON lab_reports(result_date);
+CREATE INDEX IF NOT EXISTS idx_lab_reports_updated_at ON lab_reports(updated_at);
+-- Keyset pagination of the reports list (ORDER BY created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_lab_reports_created_at_id ON lab_reports(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_lab_reports_patient_created_at ON lab_reports(patient_id, created_at DESC, id DESC);
+-- One report per file per patient; re-uploads of the same bytes link to it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_lab_reports_patient_file_hash ON lab_reports(patient_id, file_hash)
+    WHERE file_hash IS NOT NULL;
 
 -- Create updated_at trigger
 CREATE OR REPLACE FUNCTION update_updated_at_column()
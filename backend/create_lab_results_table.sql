@@ -0,0 +1,76 @@
+-- Normalised lab results: one row per parameter of a lab report, with numeric
+-- values and parsed reference ranges so per-parameter queries use indexes
+-- instead of scanning lab_reports.test_results JSONB.
+CREATE TABLE IF NOT EXISTS lab_results (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    report_id UUID NOT NULL,
+    patient_id UUID NOT NULL,
+    parameter VARCHAR(150) NOT NULL,
+    parameter_key VARCHAR(150) NOT NULL,  -- lower-cased, whitespace-collapsed parameter
+    value_text VARCHAR(100),
+    value_numeric DOUBLE PRECISION,
+    unit VARCHAR(50),
+    normal_range VARCHAR(100),
+    ref_low DOUBLE PRECISION,
+    ref_high DOUBLE PRECISION,
+    status VARCHAR(30),
+    collected_at DATE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    
+    -- Foreign key constraints
+    CONSTRAINT fk_lab_results_report 
+        FOREIGN KEY (report_id) REFERENCES lab_reports(id) ON DELETE CASCADE,
+    CONSTRAINT fk_lab_results_patient 
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+-- Per-patient trends: WHERE patient_id = ? AND parameter_key = ? ORDER BY collected_at
+CREATE INDEX IF NOT EXISTS idx_lab_results_patient_parameter_collected
+    ON lab_results(patient_id, parameter_key, collected_at);
+-- Cross-patient queries: WHERE parameter_key = ? AND collected_at >= ? AND value_numeric > ?
+CREATE INDEX IF NOT EXISTS idx_lab_results_parameter_collected
+    ON lab_results(parameter_key, collected_at) INCLUDE (value_numeric);
+CREATE INDEX IF NOT EXISTS idx_lab_results_report_id ON lab_results(report_id);
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE lab_results ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view lab results" ON lab_results
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert lab results" ON lab_results
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Users can delete lab results" ON lab_results
+    FOR DELETE USING (true);
+
+-- One-off backfill from existing reports (same parsing rules and column cuts as lab_results_service.py)
+INSERT INTO lab_results (report_id, patient_id, parameter, parameter_key, value_text, value_numeric,
+                         unit, normal_range, ref_low, ref_high, status, collected_at)
+SELECT
+    r.id,
+    r.patient_id,
+    left(trim(item->>'parameter'), 150),
+    left(lower(regexp_replace(trim(item->>'parameter'), '\s+', ' ', 'g')), 150),
+    left(item->>'value', 100),
+    CASE WHEN length(num) <= 300 THEN num::double precision END,
+    left(NULLIF(item->>'unit', ''), 50),
+    left(NULLIF(item->>'normalRange', ''), 100),
+    COALESCE(rng[1], CASE WHEN bnd[1] IN ('>=', '>', '≥') THEN bnd[2] END)::double precision,
+    COALESCE(rng[2], CASE WHEN bnd[1] IN ('<=', '<', '≤') THEN bnd[2] END)::double precision,
+    left(NULLIF(item->>'status', ''), 30),
+    r.collection_date
+FROM lab_reports r
+CROSS JOIN LATERAL jsonb_array_elements(COALESCE(r.test_results, '[]'::jsonb)) AS item
+-- RANGE_PATTERN / BOUND_PATTERN: capture groups, not a leftmost substring, so the
+-- "-" in "3.5-5.1" is read as the separator and not as a sign
+CROSS JOIN LATERAL (SELECT
+    regexp_match(replace(item->>'normalRange', ',', ''),
+                 '^\s*([-+]?\d+(?:\.\d+)?)\s*(?:-|–|to)\s*([-+]?\d+(?:\.\d+)?)\s*$', 'i') AS rng,
+    regexp_match(replace(item->>'normalRange', ',', ''),
+                 '^\s*(<=|>=|<|>|≤|≥)\s*([-+]?\d+(?:\.\d+)?)\s*$') AS bnd,
+    -- parse_numeric_value; digit strings too long for a double are left NULL there too
+    substring(replace(item->>'value', ',', '') FROM '[-+]?\d+(?:\.\d+)?') AS num
+) AS parsed
+WHERE COALESCE(trim(item->>'parameter'), '') <> ''
+  AND NOT EXISTS (SELECT 1 FROM lab_results lr WHERE lr.report_id = r.id);
@@ -0,0 +1,54 @@
+-- Index of stored patient files, so "latest PDF for patient" never lists the bucket
+CREATE TABLE IF NOT EXISTS patient_documents (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    bucket VARCHAR(100) NOT NULL,
+    storage_path TEXT NOT NULL,
+    patient_id UUID NOT NULL,
+    file_name TEXT NOT NULL,
+    file_extension VARCHAR(10),
+    size_bytes BIGINT,
+    content_hash CHAR(64),
+    extraction_state VARCHAR(20) NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    indexed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    deleted_at TIMESTAMP WITH TIME ZONE,
+
+    CONSTRAINT uq_patient_documents_object UNIQUE (bucket, storage_path),
+    CONSTRAINT fk_patient_documents_patient
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+-- Latest (or all) live documents of a patient, newest first
+CREATE INDEX IF NOT EXISTS idx_patient_documents_patient_latest
+    ON patient_documents(patient_id, bucket, file_extension, created_at DESC)
+    WHERE deleted_at IS NULL;
+
+-- Keep extraction_state (and hash/size once known) in step with document_extractions
+CREATE OR REPLACE FUNCTION sync_patient_document_extraction()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE patient_documents
+    SET extraction_state = NEW.status,
+        content_hash = COALESCE(NEW.content_hash, content_hash),
+        size_bytes = COALESCE(NEW.size_bytes, size_bytes)
+    WHERE bucket = NEW.bucket AND storage_path = NEW.storage_path;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS sync_patient_document_extraction ON document_extractions;
+CREATE TRIGGER sync_patient_document_extraction
+    AFTER INSERT OR UPDATE OF status ON document_extractions
+    FOR EACH ROW EXECUTE FUNCTION sync_patient_document_extraction();
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE patient_documents ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view patient documents" ON patient_documents
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert patient documents" ON patient_documents
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Users can update patient documents" ON patient_documents
+    FOR UPDATE USING (true);
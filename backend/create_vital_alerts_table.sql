@@ -0,0 +1,32 @@
+-- Readings that deviated from the patient's own rolling baseline (see VitalsAnomalyService)
+CREATE TABLE IF NOT EXISTS vital_alerts (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    patient_id UUID NOT NULL,
+    vital_id UUID,
+    source VARCHAR(20) NOT NULL,
+    vital VARCHAR(40) NOT NULL,
+    value REAL NOT NULL,
+    baseline_mean REAL NOT NULL,
+    baseline_std REAL NOT NULL,
+    z_score REAL NOT NULL,
+    direction VARCHAR(4) NOT NULL CHECK (direction IN ('high', 'low')),
+    severity VARCHAR(10) NOT NULL CHECK (severity IN ('medium', 'high')),
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    acknowledged_at TIMESTAMP WITH TIME ZONE,
+
+    CONSTRAINT fk_vital_alerts_patient
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_vital_alerts_recorded_at ON vital_alerts(recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_vital_alerts_patient ON vital_alerts(patient_id, recorded_at DESC);
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE vital_alerts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view vital alerts" ON vital_alerts
+    FOR SELECT USING (true);
+
+CREATE POLICY "Users can insert vital alerts" ON vital_alerts
+    FOR INSERT WITH CHECK (true);
@@ -0,0 +1,250 @@
+-- Per-minute/hour/day min, max and running sum/count of every vital sign, so trend
+-- charts over long stays read a few hundred pre-aggregated rows instead of raw
+-- observations. Fed by both vital_uploads (charted rounds) and vital_samples
+-- (bedside monitors); buckets are UTC-aligned and temperature is in Fahrenheit,
+-- like vital_uploads. Rows are only written by the triggers below (the helper
+-- functions run as their owner, so RLS needs no write policies).
+CREATE TABLE IF NOT EXISTS vital_rollups (
+    patient_id UUID NOT NULL,
+    resolution VARCHAR(6) NOT NULL CHECK (resolution IN ('minute', 'hour', 'day')),
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    sample_count INTEGER NOT NULL DEFAULT 0,
+    heart_rate_min REAL,
+    heart_rate_max REAL,
+    heart_rate_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    heart_rate_count INTEGER NOT NULL DEFAULT 0,
+    respiratory_rate_min REAL,
+    respiratory_rate_max REAL,
+    respiratory_rate_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    respiratory_rate_count INTEGER NOT NULL DEFAULT 0,
+    oxygen_saturation_min REAL,
+    oxygen_saturation_max REAL,
+    oxygen_saturation_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    oxygen_saturation_count INTEGER NOT NULL DEFAULT 0,
+    blood_pressure_systolic_min REAL,
+    blood_pressure_systolic_max REAL,
+    blood_pressure_systolic_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    blood_pressure_systolic_count INTEGER NOT NULL DEFAULT 0,
+    blood_pressure_diastolic_min REAL,
+    blood_pressure_diastolic_max REAL,
+    blood_pressure_diastolic_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    blood_pressure_diastolic_count INTEGER NOT NULL DEFAULT 0,
+    temperature_min REAL,
+    temperature_max REAL,
+    temperature_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    temperature_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (patient_id, resolution, bucket_start),
+    CONSTRAINT fk_vital_rollups_patient
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+-- Normalised observation shape both source tables are folded through
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'vital_rollup_input') THEN
+        CREATE TYPE vital_rollup_input AS (
+            patient_id UUID,
+            recorded_at TIMESTAMP WITH TIME ZONE,
+            heart_rate REAL,
+            respiratory_rate REAL,
+            oxygen_saturation REAL,
+            blood_pressure_systolic REAL,
+            blood_pressure_diastolic REAL,
+            temperature REAL
+        );
+    END IF;
+END $$;
+
+-- Add a set of observations to every resolution in one statement. Sums and
+-- counts are additive and min/max only widen, so new rows can be merged into
+-- existing buckets without rereading them.
+CREATE OR REPLACE FUNCTION upsert_vital_rollups(observations vital_rollup_input[])
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO vital_rollups AS r (
+        patient_id, resolution, bucket_start, sample_count,
+        heart_rate_min, heart_rate_max, heart_rate_sum, heart_rate_count,
+        respiratory_rate_min, respiratory_rate_max, respiratory_rate_sum, respiratory_rate_count,
+        oxygen_saturation_min, oxygen_saturation_max, oxygen_saturation_sum, oxygen_saturation_count,
+        blood_pressure_systolic_min, blood_pressure_systolic_max, blood_pressure_systolic_sum, blood_pressure_systolic_count,
+        blood_pressure_diastolic_min, blood_pressure_diastolic_max, blood_pressure_diastolic_sum, blood_pressure_diastolic_count,
+        temperature_min, temperature_max, temperature_sum, temperature_count
+    )
+    SELECT
+        o.patient_id,
+        res.resolution,
+        date_trunc(res.resolution, o.recorded_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+        COUNT(*),
+        MIN(o.heart_rate), MAX(o.heart_rate), COALESCE(SUM(o.heart_rate), 0), COUNT(o.heart_rate),
+        MIN(o.respiratory_rate), MAX(o.respiratory_rate), COALESCE(SUM(o.respiratory_rate), 0), COUNT(o.respiratory_rate),
+        MIN(o.oxygen_saturation), MAX(o.oxygen_saturation), COALESCE(SUM(o.oxygen_saturation), 0), COUNT(o.oxygen_saturation),
+        MIN(o.blood_pressure_systolic), MAX(o.blood_pressure_systolic), COALESCE(SUM(o.blood_pressure_systolic), 0), COUNT(o.blood_pressure_systolic),
+        MIN(o.blood_pressure_diastolic), MAX(o.blood_pressure_diastolic), COALESCE(SUM(o.blood_pressure_diastolic), 0), COUNT(o.blood_pressure_diastolic),
+        MIN(o.temperature), MAX(o.temperature), COALESCE(SUM(o.temperature), 0), COUNT(o.temperature)
+    FROM unnest(observations) AS o
+    CROSS JOIN unnest(ARRAY['minute', 'hour', 'day']) AS res(resolution)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (patient_id, resolution, bucket_start) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        heart_rate_min = LEAST(r.heart_rate_min, EXCLUDED.heart_rate_min),
+        heart_rate_max = GREATEST(r.heart_rate_max, EXCLUDED.heart_rate_max),
+        heart_rate_sum = r.heart_rate_sum + EXCLUDED.heart_rate_sum,
+        heart_rate_count = r.heart_rate_count + EXCLUDED.heart_rate_count,
+        respiratory_rate_min = LEAST(r.respiratory_rate_min, EXCLUDED.respiratory_rate_min),
+        respiratory_rate_max = GREATEST(r.respiratory_rate_max, EXCLUDED.respiratory_rate_max),
+        respiratory_rate_sum = r.respiratory_rate_sum + EXCLUDED.respiratory_rate_sum,
+        respiratory_rate_count = r.respiratory_rate_count + EXCLUDED.respiratory_rate_count,
+        oxygen_saturation_min = LEAST(r.oxygen_saturation_min, EXCLUDED.oxygen_saturation_min),
+        oxygen_saturation_max = GREATEST(r.oxygen_saturation_max, EXCLUDED.oxygen_saturation_max),
+        oxygen_saturation_sum = r.oxygen_saturation_sum + EXCLUDED.oxygen_saturation_sum,
+        oxygen_saturation_count = r.oxygen_saturation_count + EXCLUDED.oxygen_saturation_count,
+        blood_pressure_systolic_min = LEAST(r.blood_pressure_systolic_min, EXCLUDED.blood_pressure_systolic_min),
+        blood_pressure_systolic_max = GREATEST(r.blood_pressure_systolic_max, EXCLUDED.blood_pressure_systolic_max),
+        blood_pressure_systolic_sum = r.blood_pressure_systolic_sum + EXCLUDED.blood_pressure_systolic_sum,
+        blood_pressure_systolic_count = r.blood_pressure_systolic_count + EXCLUDED.blood_pressure_systolic_count,
+        blood_pressure_diastolic_min = LEAST(r.blood_pressure_diastolic_min, EXCLUDED.blood_pressure_diastolic_min),
+        blood_pressure_diastolic_max = GREATEST(r.blood_pressure_diastolic_max, EXCLUDED.blood_pressure_diastolic_max),
+        blood_pressure_diastolic_sum = r.blood_pressure_diastolic_sum + EXCLUDED.blood_pressure_diastolic_sum,
+        blood_pressure_diastolic_count = r.blood_pressure_diastolic_count + EXCLUDED.blood_pressure_diastolic_count,
+        temperature_min = LEAST(r.temperature_min, EXCLUDED.temperature_min),
+        temperature_max = GREATEST(r.temperature_max, EXCLUDED.temperature_max),
+        temperature_sum = r.temperature_sum + EXCLUDED.temperature_sum,
+        temperature_count = r.temperature_count + EXCLUDED.temperature_count,
+        updated_at = NOW();
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+-- Recompute every bucket of a patient inside [p_from, p_to], widened to whole
+-- UTC days (minute and hour buckets nest inside days). Used when a charted
+-- observation is corrected or deleted, and for the one-off backfill below.
+CREATE OR REPLACE FUNCTION refresh_vital_rollups(p_patient_id UUID, p_from TIMESTAMP WITH TIME ZONE, p_to TIMESTAMP WITH TIME ZONE)
+RETURNS VOID AS $$
+DECLARE
+    range_start TIMESTAMP WITH TIME ZONE := date_trunc('day', p_from AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    range_end TIMESTAMP WITH TIME ZONE := (date_trunc('day', p_to AT TIME ZONE 'UTC') + INTERVAL '1 day') AT TIME ZONE 'UTC';
+BEGIN
+    DELETE FROM vital_rollups
+    WHERE patient_id = p_patient_id AND bucket_start >= range_start AND bucket_start < range_end;
+
+    PERFORM upsert_vital_rollups(ARRAY(
+        SELECT ROW(patient_id, recorded_at, heart_rate, respiratory_rate, oxygen_saturation,
+                   blood_pressure_systolic, blood_pressure_diastolic, temperature)::vital_rollup_input
+        FROM vital_uploads
+        WHERE patient_id = p_patient_id AND recorded_at >= range_start AND recorded_at < range_end
+        UNION ALL
+        SELECT ROW(patient_id, recorded_at, heart_rate, respiratory_rate, oxygen_saturation,
+                   blood_pressure_systolic, blood_pressure_diastolic, temperature_c * 9 / 5 + 32)::vital_rollup_input
+        FROM vital_samples
+        WHERE patient_id = p_patient_id AND recorded_at >= range_start AND recorded_at < range_end
+    ));
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+-- Statement-level triggers: a multi-row insert (batch upload, monitor writer)
+-- updates each touched bucket once, not once per row
+CREATE OR REPLACE FUNCTION rollup_inserted_vital_uploads()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM upsert_vital_rollups(ARRAY(
+        SELECT ROW(patient_id, recorded_at, heart_rate, respiratory_rate, oxygen_saturation,
+                   blood_pressure_systolic, blood_pressure_diastolic, temperature)::vital_rollup_input
+        FROM inserted_rows
+    ));
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS rollup_inserted_vital_uploads ON vital_uploads;
+CREATE TRIGGER rollup_inserted_vital_uploads
+    AFTER INSERT ON vital_uploads
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_inserted_vital_uploads();
+
+CREATE OR REPLACE FUNCTION rollup_inserted_vital_samples()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM upsert_vital_rollups(ARRAY(
+        SELECT ROW(patient_id, recorded_at, heart_rate, respiratory_rate, oxygen_saturation,
+                   blood_pressure_systolic, blood_pressure_diastolic, temperature_c * 9 / 5 + 32)::vital_rollup_input
+        FROM inserted_rows
+    ));
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS rollup_inserted_vital_samples ON vital_samples;
+CREATE TRIGGER rollup_inserted_vital_samples
+    AFTER INSERT ON vital_samples
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_inserted_vital_samples();
+
+-- Min/max cannot be "un-merged", so corrections and deletions recompute the
+-- affected days: once per (patient, day) per statement, whatever the row count.
+-- Patients that no longer exist are skipped; when a patient is deleted, the
+-- cascade removes their rollups and there is nothing left to recompute.
+CREATE OR REPLACE FUNCTION refresh_vital_rollup_days(changed vital_rollup_input[])
+RETURNS VOID AS $$
+DECLARE
+    day RECORD;
+BEGIN
+    FOR day IN
+        SELECT DISTINCT c.patient_id, date_trunc('day', c.recorded_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS day_start
+        FROM unnest(changed) AS c
+        WHERE EXISTS (SELECT 1 FROM patients WHERE patients.id = c.patient_id)
+    LOOP
+        PERFORM refresh_vital_rollups(day.patient_id, day.day_start, day.day_start);
+    END LOOP;
+END;
+$$ language 'plpgsql' SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION rollup_updated_vital_uploads()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_vital_rollup_days(ARRAY(
+        SELECT ROW(patient_id, recorded_at, NULL, NULL, NULL, NULL, NULL, NULL)::vital_rollup_input FROM old_rows
+        UNION ALL
+        SELECT ROW(patient_id, recorded_at, NULL, NULL, NULL, NULL, NULL, NULL)::vital_rollup_input FROM new_rows
+    ));
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION rollup_deleted_vital_uploads()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_vital_rollup_days(ARRAY(
+        SELECT ROW(patient_id, recorded_at, NULL, NULL, NULL, NULL, NULL, NULL)::vital_rollup_input FROM old_rows
+    ));
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Replaces the earlier per-row trigger
+DROP TRIGGER IF EXISTS rollup_changed_vital_upload ON vital_uploads;
+DROP FUNCTION IF EXISTS rollup_changed_vital_upload();
+
+DROP TRIGGER IF EXISTS rollup_updated_vital_uploads ON vital_uploads;
+CREATE TRIGGER rollup_updated_vital_uploads
+    AFTER UPDATE ON vital_uploads
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_updated_vital_uploads();
+
+DROP TRIGGER IF EXISTS rollup_deleted_vital_uploads ON vital_uploads;
+CREATE TRIGGER rollup_deleted_vital_uploads
+    AFTER DELETE ON vital_uploads
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_deleted_vital_uploads();
+
+-- One-off backfill of observations recorded before the rollups existed
+SELECT refresh_vital_rollups(id, '-infinity', 'infinity')
+FROM patients
+WHERE NOT EXISTS (SELECT 1 FROM vital_rollups WHERE vital_rollups.patient_id = patients.id);
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE vital_rollups ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view vital rollups" ON vital_rollups;
+CREATE POLICY "Users can view vital rollups" ON vital_rollups
+    FOR SELECT USING (true);
@@ -0,0 +1,45 @@
+-- Raw bedside monitor samples (high frequency), kept apart from the charted vital_uploads rows.
+-- Narrow rows without a surrogate key: SMALLINT/REAL values, append-only, BRIN on time.
+-- A reading is identified by (patient_id, recorded_at, device_id); resends and
+-- re-imports are inserted with ON CONFLICT DO NOTHING against that key.
+CREATE TABLE IF NOT EXISTS vital_samples (
+    patient_id UUID NOT NULL,
+    device_id VARCHAR(64) NOT NULL,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    heart_rate SMALLINT,
+    respiratory_rate SMALLINT,
+    oxygen_saturation SMALLINT,
+    blood_pressure_systolic SMALLINT,
+    blood_pressure_diastolic SMALLINT,
+    temperature_c REAL,
+
+    CONSTRAINT fk_vital_samples_patient
+        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+);
+
+-- Samples arrive in time order, so a BRIN index covers time-range scans at a tiny size
+CREATE INDEX IF NOT EXISTS idx_vital_samples_recorded_at_brin ON vital_samples USING BRIN (recorded_at);
+
+-- Earlier installs had a plain (patient_id, recorded_at) index and may hold
+-- repeated readings; keep one of each before adding the unique key
+DELETE FROM vital_samples a
+    USING vital_samples b
+    WHERE a.ctid < b.ctid
+      AND a.patient_id = b.patient_id
+      AND a.recorded_at = b.recorded_at
+      AND a.device_id = b.device_id
+      AND NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'idx_vital_samples_reading');
+-- Also serves the per-patient time-range lookups
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vital_samples_reading ON vital_samples(patient_id, recorded_at, device_id);
+DROP INDEX IF EXISTS idx_vital_samples_patient_time;
+
+-- Enable Row Level Security (RLS)
+ALTER TABLE vital_samples ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view vital samples" ON vital_samples;
+CREATE POLICY "Users can view vital samples" ON vital_samples
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Users can insert vital samples" ON vital_samples;
+CREATE POLICY "Users can insert vital samples" ON vital_samples
+    FOR INSERT WITH CHECK (true);
@@ -11,6 +11,7 @@ CREATE TABLE IF NOT EXISTS vital_uploads (
     notes TEXT DEFAULT '',
     recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     uploaded_by UUID NOT NULL,
     
     -- Foreign key constraints
@@ -26,3 +27,34 @@ CREATE INDEX IF NOT EXISTS idx_vital_uploads_uploaded_by ON vital_uploads(upload
 CREATE INDEX IF NOT EXISTS idx_vital_uploads_recorded_at ON vital_uploads(recorded_at);
 CREATE INDEX IF NOT EXISTS idx_vital_uploads_uploaded_at ON vital_uploads(uploaded_at);
 
+-- Row version column used for ETags on vitals list endpoints (existing installs)
+ALTER TABLE vital_uploads ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS idx_vital_uploads_updated_at ON vital_uploads(updated_at);
+
+-- Early-warning (NEWS2) inputs: ACVPU level and whether the patient is on oxygen
+ALTER TABLE vital_uploads ADD COLUMN IF NOT EXISTS consciousness CHAR(1) NOT NULL DEFAULT 'A'
+    CHECK (consciousness IN ('A', 'C', 'V', 'P', 'U'));
+ALTER TABLE vital_uploads ADD COLUMN IF NOT EXISTS supplemental_oxygen BOOLEAN NOT NULL DEFAULT FALSE;
+-- Ward view: all observations in a recent window, newest first
+CREATE INDEX IF NOT EXISTS idx_vital_uploads_recorded_at_patient ON vital_uploads(recorded_at DESC, patient_id);
+
+-- Newest observation per patient; lookups filter on patient_id, which Postgres
+-- pushes below the DISTINCT ON so each patient costs one index probe
+CREATE INDEX IF NOT EXISTS idx_vital_uploads_patient_latest ON vital_uploads(patient_id, recorded_at DESC);
+CREATE OR REPLACE VIEW latest_vital_uploads AS
+    SELECT DISTINCT ON (patient_id) *
+    FROM vital_uploads
+    ORDER BY patient_id, recorded_at DESC;
+
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_vital_uploads_updated_at ON vital_uploads;
+CREATE TRIGGER update_vital_uploads_updated_at
+    BEFORE UPDATE ON vital_uploads
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
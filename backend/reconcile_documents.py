@@ -0,0 +1,13 @@
+# Re-sync the patient_documents index with the documents bucket (run from cron)
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.services.ai_insight_service import AIInsightsService
+
+
+if __name__ == '__main__':
+    success, message, stats = AIInsightsService().reconcile_document_index()
+    print(f"{message}: {stats}")
+    raise SystemExit(0 if success else 1)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for resumable (tus-style) lab file uploads, run against a local
+directory standing in for the medical-files bucket.
+
+    python test_resumable_upload.py
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from werkzeug.exceptions import ClientDisconnected
+
+from app.services.lab_reports_service import hash_file, UPLOAD_COPY_CHUNK_BYTES
+from app.services.upload_service import ResumableUploadService
+
+
+class LocalStorage:
+    """Stands in for LabReportsService: stores finished uploads in a local directory."""
+
+    def __init__(self, bucket_dir):
+        self.bucket_dir = bucket_dir
+        self.stored = []
+
+    def store_file(self, local_path, filename, content_type, patient_id, user_id, file_hash=None):
+        file_hash = file_hash or hash_file(local_path)
+        file_path = os.path.join(self.bucket_dir, f'{file_hash}{os.path.splitext(filename)[1]}')
+        shutil.copyfile(local_path, file_path)
+        self.stored.append(file_path)
+        return {'success': True, 'data': {'filePath': file_path, 'fileHash': file_hash}}
+
+
+class RecordingStream:
+    """A request body that records read sizes and can drop the connection after `fail_after` bytes."""
+
+    def __init__(self, data, fail_after=None):
+        self.body = io.BytesIO(data)
+        self.fail_after = fail_after
+        self.sent = 0
+        self.largest_read = 0
+
+    def read(self, size=-1):
+        self.largest_read = max(self.largest_read, size)
+        if self.fail_after is not None:
+            if self.sent >= self.fail_after:
+                raise ClientDisconnected()
+            size = min(size, self.fail_after - self.sent)
+        chunk = self.body.read(size)
+        self.sent += len(chunk)
+        return chunk
+
+
+class ResumableUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.staging_dir = tempfile.mkdtemp()
+        self.bucket_dir = tempfile.mkdtemp()
+        self.storage = LocalStorage(self.bucket_dir)
+        self.service = ResumableUploadService(lab_reports_service=self.storage, staging_dir=self.staging_dir)
+        # Several copy chunks, with a ragged tail
+        self.data = os.urandom(3 * UPLOAD_COPY_CHUNK_BYTES + 17)
+        result = self.service.create_session('patient-1', 'scan.pdf', 'application/pdf', len(self.data), 'user-1')
+        self.assertTrue(result['success'])
+        self.upload_id = result['upload']['id']
+
+    def tearDown(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        shutil.rmtree(self.bucket_dir, ignore_errors=True)
+
+    def append(self, offset, data, **stream_options):
+        stream = RecordingStream(data, **stream_options)
+        return self.service.append_chunk(self.upload_id, offset, stream, 'user-1'), stream
+
+    def test_offset_mismatch_is_refused(self):
+        result, _ = self.append(0, self.data[:1000])
+        self.assertTrue(result['success'])
+        self.assertEqual(result['upload']['offset'], 1000)
+
+        # A replayed chunk at the old offset must not be appended again
+        result, _ = self.append(0, self.data[:1000])
+        self.assertFalse(result['success'])
+        self.assertEqual(result['status'], 409)
+        self.assertEqual(result['upload']['offset'], 1000)
+
+        result, _ = self.append(5000, self.data[5000:6000])
+        self.assertEqual(result['status'], 409)
+        self.assertEqual(self.service.get_session(self.upload_id, 'user-1')['upload']['offset'], 1000)
+
+    def test_resume_after_interruption(self):
+        dropped_at = UPLOAD_COPY_CHUNK_BYTES + 12345
+        result, _ = self.append(0, self.data, fail_after=dropped_at)
+        self.assertTrue(result['success'])
+        self.assertFalse(result['complete'])
+
+        # The client re-syncs (HEAD) and continues from the server's offset
+        offset = self.service.get_session(self.upload_id, 'user-1')['upload']['offset']
+        self.assertEqual(offset, dropped_at)
+        result, _ = self.append(offset, self.data[offset:])
+        self.assertTrue(result['success'])
+        self.assertTrue(result['complete'])
+        self.assertEqual(len(self.storage.stored), 1)
+
+    def test_final_assembly_and_hash(self):
+        reads = []
+        offset = 0
+        for size in (700000, UPLOAD_COPY_CHUNK_BYTES * 2, len(self.data)):
+            result, stream = self.append(offset, self.data[offset:offset + size])
+            reads.append(stream.largest_read)
+            self.assertTrue(result['success'])
+            offset = result['upload']['offset']
+            if result.get('complete'):
+                break
+
+        self.assertTrue(result['complete'])
+        with open(self.storage.stored[0], 'rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertEqual(result['data']['fileHash'], hash_file(self.storage.stored[0]))
+        # The request body is copied in bounded pieces, never read whole
+        self.assertLessEqual(max(reads), UPLOAD_COPY_CHUNK_BYTES)
+        # Staged bytes and metadata are gone once stored
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        self.assertFalse(self.service.get_session(self.upload_id, 'user-1')['success'])
+
+    def test_bytes_beyond_declared_length_are_refused(self):
+        result, _ = self.append(0, self.data + b'extra')
+        self.assertFalse(result['success'])
+        self.assertEqual(result['status'], 413)
+        self.assertEqual(self.service.get_session(self.upload_id, 'user-1')['upload']['offset'], len(self.data))
+        self.assertEqual(self.storage.stored, [])
+
+    def test_other_users_cannot_see_or_change_the_upload(self):
+        self.append(0, self.data[:1000])
+
+        self.assertFalse(self.service.get_session(self.upload_id, 'user-2')['success'])
+        result = self.service.append_chunk(self.upload_id, 1000, RecordingStream(self.data[1000:]), 'user-2')
+        self.assertEqual(result['status'], 404)
+        self.assertFalse(self.service.delete_session(self.upload_id, 'user-2')['success'])
+        self.assertEqual(self.service.get_session(self.upload_id, 'user-1')['upload']['offset'], 1000)
+
+        # Admins may inspect and abandon anyone's upload
+        self.assertEqual(self.service.get_session(self.upload_id, 'admin-1', is_admin=True)['upload']['offset'], 1000)
+        self.assertTrue(self.service.delete_session(self.upload_id, 'admin-1', is_admin=True)['success'])
+        self.assertFalse(self.service.get_session(self.upload_id, 'user-1')['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()